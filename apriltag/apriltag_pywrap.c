@@ -39,21 +39,43 @@
 // this flag and does the thing. Here I'm running C code, so SIGINT would set a
 // flag, but not quit, so I can't interrupt the solver. Thus I reset the SIGINT
 // handler to the default, and put it back to the python-specific version when
-// I'm done
-#define SET_SIGINT() struct sigaction sigaction_old;                    \
+// I'm done.
+//
+// The detector runs with the GIL released, so several Python threads can be
+// inside detect() at once. The handler is only swapped by the first of them and
+// restored by the last one; the counter is protected by the GIL, which is held
+// whenever these run
+static int              sigint_users = 0;
+static struct sigaction sigint_saved;
+
+static bool sigint_override(void)
+{
+    if( sigint_users == 0 &&
+        0 != sigaction(SIGINT,
+                       &(struct sigaction){ .sa_handler = SIG_DFL },
+                       &sigint_saved) )
+    {
+        PyErr_SetString(PyExc_RuntimeError, "sigaction() failed");
+        return false;
+    }
+    sigint_users++;
+    return true;
+}
+static void sigint_restore(void)
+{
+    if( --sigint_users == 0 &&
+        0 != sigaction(SIGINT, &sigint_saved, NULL) )
+        PyErr_SetString(PyExc_RuntimeError, "sigaction-restore failed");
+}
+
+#define SET_SIGINT() bool sigint_set = sigint_override();               \
 do {                                                                    \
-    if( 0 != sigaction(SIGINT,                                          \
-                       &(struct sigaction){ .sa_handler = SIG_DFL },    \
-                       &sigaction_old) )                                \
-    {                                                                   \
-        PyErr_SetString(PyExc_RuntimeError, "sigaction() failed");      \
+    if( !sigint_set )                                                   \
         goto done;                                                      \
-    }                                                                   \
 } while(0)
 #define RESET_SIGINT() do {                                             \
-    if( 0 != sigaction(SIGINT,                                          \
-                       &sigaction_old, NULL ))                          \
-        PyErr_SetString(PyExc_RuntimeError, "sigaction-restore failed"); \
+    if( sigint_set )                                                    \
+        sigint_restore();                                               \
 } while(0)
 
 #define PYMETHODDEF_ENTRY(function_prefix, name, args) {#name,          \
@@ -67,8 +89,45 @@ typedef struct {
     apriltag_family_t*   tf;
     apriltag_detector_t* td;
     void (*destroy_func)(apriltag_family_t *tf);
+
+    // apriltag_detector_detect() is not reentrant. Threads using the same
+    // detector object take turns; separate objects run concurrently
+    PyThread_type_lock   lock;
 } apriltag_py_t;
 
+// One detection in the arrays returned by detect_batch()
+typedef struct {
+    int32_t id;
+    int32_t hamming;
+    float   margin;
+    double  center[2];
+    double  lb_rb_rt_lt[4][2];
+} apriltag_record_t;
+
+static PyArray_Descr* record_dtype = NULL;
+
+static PyArray_Descr* make_record_dtype(void)
+{
+    PyArray_Descr* dtype = NULL;
+    PyObject*      spec  =
+        Py_BuildValue("{s:[sssss],s:[sssss],s:[nnnnn],s:n}",
+                      "names",   "id", "hamming", "margin", "center", "lb-rb-rt-lt",
+                      "formats", "<i4", "<i4", "<f4", "(2,)<f8", "(4,2)<f8",
+                      "offsets",
+                      (Py_ssize_t)offsetof(apriltag_record_t, id),
+                      (Py_ssize_t)offsetof(apriltag_record_t, hamming),
+                      (Py_ssize_t)offsetof(apriltag_record_t, margin),
+                      (Py_ssize_t)offsetof(apriltag_record_t, center),
+                      (Py_ssize_t)offsetof(apriltag_record_t, lb_rb_rt_lt),
+                      "itemsize", (Py_ssize_t)sizeof(apriltag_record_t));
+    if(spec == NULL)
+        return NULL;
+    if(!PyArray_DescrConverter(spec, &dtype))
+        dtype = NULL;
+    Py_DECREF(spec);
+    return dtype;
+}
+
 
 static PyObject *
 apriltag_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
@@ -78,8 +137,9 @@ apriltag_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
     apriltag_py_t* self = (apriltag_py_t*)type->tp_alloc(type, 0);
     if(self == NULL) goto done;
 
-    self->tf = NULL;
-    self->td = NULL;
+    self->tf   = NULL;
+    self->td   = NULL;
+    self->lock = NULL;
 
     const char* family          = NULL;
     int         Nthreads        = 1;
@@ -90,6 +150,10 @@ apriltag_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
     bool        debug           = false;
     PyObject*   py_refine_edges = NULL;
     PyObject*   py_debug        = NULL;
+    double      sharpening      = 0.25;
+    int         min_cluster     = 5;
+    float       max_line_mse    = 10.0;
+    int         min_contrast    = 5;
 
     char* keywords[] = {"family",
                         "threads",
@@ -98,9 +162,13 @@ apriltag_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
                         "blur",
                         "refine-edges",
                         "debug",
+                        "decode-sharpening",
+                        "min-cluster-pixels",
+                        "max-line-fit-mse",
+                        "min-white-black-diff",
                         NULL };
 
-    if(!PyArg_ParseTupleAndKeywords( args, kwargs, "s|iiffOO",
+    if(!PyArg_ParseTupleAndKeywords( args, kwargs, "s|iiffOOdifi",
                                      keywords,
                                      &family,
                                      &Nthreads,
@@ -108,7 +176,11 @@ apriltag_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
                                      &decimate,
                                      &blur,
                                      &py_refine_edges,
-                                     &py_debug ))
+                                     &py_debug,
+                                     &sharpening,
+                                     &min_cluster,
+                                     &max_line_mse,
+                                     &min_contrast ))
     {
         goto done;
     }
@@ -142,6 +214,17 @@ apriltag_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
     self->td->nthreads            = Nthreads;
     self->td->refine_edges        = refine_edges;
     self->td->debug               = debug;
+    self->td->decode_sharpening   = sharpening;
+    self->td->qtp.min_cluster_pixels   = min_cluster;
+    self->td->qtp.max_line_fit_mse     = max_line_mse;
+    self->td->qtp.min_white_black_diff = min_contrast;
+
+    self->lock = PyThread_allocate_lock();
+    if(self->lock == NULL)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "PyThread_allocate_lock() failed!");
+        goto done;
+    }
 
     success = true;
 
@@ -160,6 +243,11 @@ apriltag_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
                 self->destroy_func(self->tf);
                 self->tf = NULL;
             }
+            if(self->lock != NULL)
+            {
+                PyThread_free_lock(self->lock);
+                self->lock = NULL;
+            }
             Py_DECREF(self);
         }
         return NULL;
@@ -182,10 +270,27 @@ static void apriltag_dealloc(apriltag_py_t* self)
         self->destroy_func(self->tf);
         self->tf = NULL;
     }
+    if(self->lock != NULL)
+    {
+        PyThread_free_lock(self->lock);
+        self->lock = NULL;
+    }
 
     Py_TYPE(self)->tp_free((PyObject*)self);
 }
 
+// Runs the detector on each of the N images with the GIL released
+static void detect_images(apriltag_py_t* self, int N,
+                          image_u8_t* images, zarray_t** detections)
+{
+    Py_BEGIN_ALLOW_THREADS;
+    PyThread_acquire_lock(self->lock, WAIT_LOCK);
+    for(int i=0; i<N; i++)
+        detections[i] = apriltag_detector_detect(self->td, &images[i]);
+    PyThread_release_lock(self->lock);
+    Py_END_ALLOW_THREADS;
+}
+
 static PyObject* apriltag_detect(apriltag_py_t* self,
                                  PyObject* args)
 {
@@ -226,7 +331,8 @@ static PyObject* apriltag_detect(apriltag_py_t* self,
                      .stride = strides[0],
                      .buf    = PyArray_DATA(image)};
 
-    zarray_t* detections = apriltag_detector_detect(self->td, &im);
+    zarray_t* detections;
+    detect_images(self, 1, &im, &detections);
     int N = zarray_size(detections);
 
     detections_tuple = PyTuple_New(N);
@@ -288,16 +394,149 @@ static PyObject* apriltag_detect(apriltag_py_t* self,
     return result;
 }
 
+// Fills im with a view of a 2D uint8 buffer. The buffer is not copied; on
+// success view must be released with PyBuffer_Release()
+static bool image_from_buffer(PyObject* obj, Py_buffer* view, image_u8_t* im)
+{
+    if(0 != PyObject_GetBuffer(obj, view, PyBUF_RECORDS_RO))
+        return false;
+
+    const char* error = NULL;
+    if( view->ndim != 2 )
+        error = "Each image must have exactly 2 dims";
+    else if( view->itemsize != 1 ||
+             (view->format != NULL && 0 != strcmp(view->format, "B")) )
+        error = "Each image must contain 8-bit unsigned data";
+    else if( view->strides[1] != 1 || view->strides[0] < view->shape[1] )
+        error = "Image rows must live in contiguous memory";
+    if(error != NULL)
+    {
+        PyErr_SetString(PyExc_RuntimeError, error);
+        PyBuffer_Release(view);
+        return false;
+    }
+
+    // the fields of image_u8_t are const
+    memcpy(im, &(image_u8_t){.width  = view->shape[1],
+                             .height = view->shape[0],
+                             .stride = view->strides[0],
+                             .buf    = view->buf},
+           sizeof(*im));
+    return true;
+}
+
+static PyObject* records_from_detections(zarray_t* detections)
+{
+    npy_intp N = zarray_size(detections);
+
+    Py_INCREF(record_dtype);
+    PyArrayObject* records = (PyArrayObject*)
+        PyArray_NewFromDescr(&PyArray_Type, record_dtype, 1, &N, NULL, NULL, 0, NULL);
+    if(records == NULL)
+        return NULL;
+
+    apriltag_record_t* r = (apriltag_record_t*)PyArray_DATA(records);
+    for(int i=0; i < N; i++)
+    {
+        apriltag_detection_t* det;
+        zarray_get(detections, i, &det);
+
+        r[i].id        = det->id;
+        r[i].hamming   = det->hamming;
+        r[i].margin    = det->decision_margin;
+        r[i].center[0] = det->c[0];
+        r[i].center[1] = det->c[1];
+        for(int j=0; j<4; j++)
+        {
+            r[i].lb_rb_rt_lt[j][0] = det->p[j][0];
+            r[i].lb_rb_rt_lt[j][1] = det->p[j][1];
+        }
+    }
+    return (PyObject*)records;
+}
+
+static PyObject* apriltag_detect_batch(apriltag_py_t* self,
+                                       PyObject* args)
+{
+    PyObject*    result      = NULL;
+    PyObject*    images      = NULL;
+    PyObject*    records     = NULL;
+    Py_buffer*   views       = NULL;
+    image_u8_t*  ims         = NULL;
+    zarray_t**   detections  = NULL;
+    Py_ssize_t   N           = 0;
+    Py_ssize_t   Nviews      = 0;
+
+    SET_SIGINT();
+    PyObject* images_arg;
+    if(!PyArg_ParseTuple( args, "O", &images_arg ))
+        goto done;
+    images = PySequence_Fast(images_arg, "detect_batch() takes a sequence of images");
+    if(images == NULL)
+        goto done;
+
+    N          = PySequence_Fast_GET_SIZE(images);
+    views      = PyMem_Calloc(N > 0 ? N : 1, sizeof(Py_buffer));
+    ims        = PyMem_Calloc(N > 0 ? N : 1, sizeof(image_u8_t));
+    detections = PyMem_Calloc(N > 0 ? N : 1, sizeof(zarray_t*));
+    if(views == NULL || ims == NULL || detections == NULL)
+    {
+        PyErr_NoMemory();
+        goto done;
+    }
+
+    for(; Nviews < N; Nviews++)
+        if(!image_from_buffer(PySequence_Fast_GET_ITEM(images, Nviews),
+                              &views[Nviews], &ims[Nviews]))
+            goto done;
+
+    detect_images(self, N, ims, detections);
+
+    records = PyTuple_New(N);
+    if(records == NULL)
+        goto done;
+    for(int i=0; i < N; i++)
+    {
+        PyObject* r = records_from_detections(detections[i]);
+        if(r == NULL)
+            goto done;
+        PyTuple_SET_ITEM(records, i, r);
+    }
+
+    result  = records;
+    records = NULL;
+
+ done:
+    if(detections != NULL)
+        for(int i=0; i < N; i++)
+            if(detections[i] != NULL)
+                apriltag_detections_destroy(detections[i]);
+    for(int i=0; i < Nviews; i++)
+        PyBuffer_Release(&views[i]);
+    PyMem_Free(views);
+    PyMem_Free(ims);
+    PyMem_Free(detections);
+    Py_XDECREF(records);
+    Py_XDECREF(images);
+
+    RESET_SIGINT();
+    return result;
+}
+
 
 static const char apriltag_detect_docstring[] =
 #include "apriltag_detect.docstring.h"
     ;
+static const char apriltag_detect_batch_docstring[] =
+#include "apriltag_detect_batch.docstring.h"
+    ;
 static const char apriltag_type_docstring[] =
 #include "apriltag_py_type.docstring.h"
     ;
 
 static PyMethodDef apriltag_methods[] =
-    { PYMETHODDEF_ENTRY(apriltag_, detect, METH_VARARGS),
+    { PYMETHODDEF_ENTRY(apriltag_, detect,       METH_VARARGS),
+      PYMETHODDEF_ENTRY(apriltag_, detect_batch, METH_VARARGS),
       {}
     };
 
@@ -332,6 +571,8 @@ PyMODINIT_FUNC initapriltag(void)
     PyModule_AddObject(module, "apriltag", (PyObject *)&apriltagType);
 
     import_array();
+
+    record_dtype = make_record_dtype();
 }
 
 #else
@@ -358,6 +599,10 @@ PyMODINIT_FUNC PyInit_apriltag(void)
 
     import_array();
 
+    record_dtype = make_record_dtype();
+    if(record_dtype == NULL)
+        return NULL;
+
     return module;
 }
 
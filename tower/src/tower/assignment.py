@@ -0,0 +1,368 @@
+"""
+Cup to slot assignment and ordering for both arms together.
+
+Instead of each hand taking the cup with min(x) of its side, every cup and every target slot
+(sorting lane places or BuildTower steps) is considered at once:
+
+    1. the cost of every (cup, slot) pair is the time of a pick and place cycle of the hand serving
+       the slot, infinite if the reachability map says the hand cannot get there
+    2. the Hungarian algorithm finds the assignment with the least total time
+    3. a small local search (2-opt on the order of each hand, swaps of the cups of two steps)
+       reduces the makespan of both arms, the time until the last cup is placed
+
+Times are estimated from straight line distances at a constant gripper speed plus a fixed time per
+pick and per place, which is enough to compare assignments.
+
+    engine = AssignmentEngine(reach=reach)
+    picks, makespan = engine.assign_tower(plan, cup_positions)
+"""
+import numpy as np
+
+
+def hungarian(cost):
+    """
+    Minimum cost assignment of the rows of a cost matrix to its columns (Hungarian algorithm with
+    shortest augmenting paths, O(n^2 m)). Infinite costs are only used if nothing else is possible.
+
+        Args:
+            cost (array (n, m)) - cost of assigning row i to column j
+        Returns:
+            rows (array) - assigned rows, ascending
+            cols (array) - column of each assigned row, min(n, m) pairs in total
+    """
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    finite = np.isfinite(cost)
+    big = (np.abs(cost[finite]).max() + 1.0) * (n + 1) if finite.any() else 1.0
+    c = np.where(finite, cost, big)
+
+    # potentials of the rows and columns, column 0 is the virtual start of every augmenting path
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)    # column --> matched row (1-based), 0 if free
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            reduced = c[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[match[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        # flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    cols = np.nonzero(match[1:])[0]
+    rows = match[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+class AssignmentEngine():
+    def __init__(self, speed=0.25, pick_time=3.0, place_time=3.0, reach=None, max_rounds=20, center_y=0.0,
+                 cross_penalty=1e4):
+        """
+        Args:
+            speed (float) - mean gripper speed between two poses (m/s)
+            pick_time (float) - seconds of approach, grasp and retreat at a cup
+            place_time (float) - seconds of approach, release and retreat at a slot
+            reach (ReachMap) - reachability of each hand, every position is reachable if None
+            max_rounds (int) - max passes of the local search
+            center_y (float) - y of the centerline between the hands, the left hand works at y > center_y
+            cross_penalty (float) - cost added to a cup on the other side of the centerline when both
+                                    hands sort in lockstep, they would cross the centerline together
+        """
+        self.speed = speed
+        self.pick_time = pick_time
+        self.place_time = place_time
+        self.reach = reach
+        self.max_rounds = max_rounds
+        self.center_y = center_y
+        self.cross_penalty = cross_penalty
+
+    def cross_side(self, hand, points, eps=1e-6):
+        """ (n,) mask of the positions on the other side of the centerline than hand """
+        y = np.asarray(points, dtype=float).reshape(-1, 3)[:, 1]
+        if hand == "left_gripper":
+            return y < self.center_y - eps
+        if hand == "right_gripper":
+            return y > self.center_y + eps
+        return np.zeros(len(y), dtype=bool)
+
+    def travel(self, a, b):
+        """ seconds between every position of a (n, 3) and every position of b (m, 3), an (n, m) matrix """
+        a = np.asarray(a, dtype=float).reshape(-1, 3)
+        b = np.asarray(b, dtype=float).reshape(-1, 3)
+        return np.linalg.norm(a[:, None, :] - b[None, :, :], axis=2) / self.speed
+
+    def reachable(self, hand, points):
+        """ (n,) mask of the positions hand can reach """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if self.reach is None:
+            return np.ones(len(points), dtype=bool)
+        return self.reach.margins(hand, points) != 0
+
+    def cycles(self, start, cups, slots):
+        """
+        Seconds of each pick and place cycle of one hand going from start to cups[0], slots[0], cups[1] ...
+
+            Args:
+                start (x, y, z) - where the hand is before the first cycle
+                cups (array (k, 3)) - cups in pick order
+                slots (array (k, 3)) - place of each cup
+            Returns:
+                times (array (k,))
+        """
+        cups = np.asarray(cups, dtype=float).reshape(-1, 3)
+        slots = np.asarray(slots, dtype=float).reshape(-1, 3)
+        previous = np.vstack([np.asarray(start, dtype=float).reshape(1, 3), slots[:-1]])
+        return (np.linalg.norm(cups - previous, axis=1) + np.linalg.norm(slots - cups, axis=1)) / self.speed \
+            + self.pick_time + self.place_time
+
+    @staticmethod
+    def makespan(times, lockstep):
+        """
+        Time until both hands are done.
+
+            Args:
+                times (dict) - hand --> array of the cycle times of the hand, in order
+                lockstep (bool) - both hands start each cycle together (grab_and_place_two_hands), else
+                                  each hand runs on its own
+        """
+        times = [np.asarray(t, dtype=float) for t in times.values()]
+        if not lockstep:
+            return float(max([t.sum() for t in times] + [0.0]))
+        n = max([len(t) for t in times] + [0])
+        padded = np.zeros((len(times), n))
+        for k, t in enumerate(times):
+            padded[k, :len(t)] = t
+        return float(padded.max(axis=0).sum())
+
+    def assign_sorting(self, cups, lanes, starts=None, lockstep=True):
+        """
+        Which hand takes which cup, in which order. The k-th cup of a hand goes to the k-th slot of
+        its lane. Every split of the cups between the hands is solved with the Hungarian algorithm and
+        the one with the smallest makespan is kept. In lockstep both arms move at the same time, so a
+        hand only takes cups of the other side of the centerline if no split avoids it (lanes too short).
+
+            Args:
+                cups (array (n, 3)) - positions of the cups to sort
+                lanes (dict) - hand --> (k, 3) places of its lane, in the order they are filled
+                starts (dict) - hand --> (x, y, z) position of the hand, the first slot of its lane if None
+                lockstep (bool) - see makespan()
+            Returns:
+                jobs (dict) - hand --> [(cup index, slot index), ...] in execution order
+                makespan (float) - estimated seconds until the last cup is placed, inf if some cup
+                                   cannot be sorted
+        """
+        cups = np.asarray(cups, dtype=float).reshape(-1, 3)
+        hands = list(lanes)
+        lanes = {hand: np.asarray(lanes[hand], dtype=float).reshape(-1, 3) for hand in hands}
+        starts = starts or {hand: lanes[hand][0] for hand in hands if len(lanes[hand])}
+        n = len(cups)
+        best = ({hand: [] for hand in hands}, np.inf if n else 0.0)
+        if n == 0:
+            return best
+
+        # a cycle is approximated as a round trip from the start of the lane, which holds for
+        # any order since the slots of a lane are close to each other
+        round_trip = {hand: 2.0*self.travel(cups, starts[hand])[:, 0] + self.pick_time + self.place_time
+                      for hand in hands if hand in starts}
+        for hand in round_trip:
+            round_trip[hand][~self.reachable(hand, cups)] = np.inf
+        cross = {hand: self.cross_side(hand, cups) if lockstep else np.zeros(n, dtype=bool) for hand in hands}
+        best_crossings = np.inf
+
+        first = hands[0]
+        second = hands[1] if len(hands) > 1 else None
+        for k in range(n + 1):
+            counts = {first: k}
+            if second is not None:
+                counts[second] = n - k
+            elif k != n:
+                continue
+            if any(counts[hand] > len(lanes[hand]) or (counts[hand] and hand not in round_trip) for hand in hands):
+                continue
+            columns = [hand for hand in hands for _ in range(counts[hand])]
+            cost = np.stack([round_trip[hand] + self.cross_penalty*cross[hand] for hand in columns], axis=1)
+            rows, cols = hungarian(cost)
+            if not np.all(np.isfinite(cost[rows, cols])):
+                continue
+            crossings = sum(bool(cross[columns[col]][r]) for r, col in zip(rows, cols))
+            if crossings > best_crossings:
+                continue
+            taken = {hand: [r for r, col in zip(rows, cols) if columns[col] == hand] for hand in hands}
+            orders = {hand: self.order_sorting(taken[hand], cups, lanes[hand], starts.get(hand), round_trip.get(hand))
+                      for hand in hands}
+            orders = self.pair_orders(orders, cups, lanes, starts) if lockstep and second is not None else orders
+            span = self.makespan({hand: self.cycles(starts[hand], cups[orders[hand]], lanes[hand][:len(orders[hand])])
+                                  for hand in hands if hand in starts}, lockstep)
+            if crossings < best_crossings or span < best[1]:
+                best = ({hand: [(int(c), s) for s, c in enumerate(orders[hand])] for hand in hands}, span)
+                best_crossings = crossings
+        return best
+
+    def order_sorting(self, taken, cups, lane, start, round_trip):
+        """ pick order of the cups of one hand, longest cycles first then improved with 2-opt """
+        if not taken:
+            return []
+        order = sorted(taken, key=lambda c: -round_trip[c])
+        return self.two_opt(order, lambda o: self.cycles(start, cups[o], lane[:len(o)]).sum())
+
+    def pair_orders(self, orders, cups, lanes, starts):
+        """ in lockstep, improve the pick order of each hand against the makespan of both """
+        hands = list(orders)
+
+        def span(changed_hand, order):
+            times = {hand: self.cycles(starts[hand], cups[order if hand == changed_hand else orders[hand]],
+                                       lanes[hand][:len(orders[hand])]) for hand in hands}
+            return self.makespan(times, True)
+
+        for hand in hands:
+            orders[hand] = self.two_opt(orders[hand], lambda o, hand=hand: span(hand, o))
+        return orders
+
+    def two_opt(self, order, cost):
+        """ reverse segments of order while it lowers cost(order) """
+        order = list(order)
+        best = cost(order)
+        for _ in range(self.max_rounds):
+            improved = False
+            for i in range(len(order) - 1):
+                for j in range(i + 1, len(order)):
+                    candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                    value = cost(candidate)
+                    if value < best - 1e-9:
+                        order, best, improved = candidate, value, True
+            if not improved:
+                break
+        return order
+
+    def simulate(self, plan, picks, cups, starts):
+        """
+        Makespan of a tower plan run by DualArmScheduler: each hand works through its steps in order,
+        the place of a step waits for the cups it rests on.
+
+            Args:
+                plan (TowerPlan) - build plan
+                picks (list) - index of the cup of each step, None for no cup
+                cups (array (n, 3)) - cup positions
+                starts (dict) - hand --> (x, y, z) position of the hand before its first step
+            Returns:
+                makespan (float) - inf if a step has no cup
+        """
+        free = {hand: 0.0 for hand in starts}
+        where = {hand: np.asarray(start, dtype=float) for hand, start in starts.items()}
+        done = {}
+        for step in plan:
+            if picks[step.index] is None:
+                return np.inf
+            cup = cups[picks[step.index]]
+            slot = np.asarray(step.position, dtype=float)
+            grabbed = free[step.hand] + np.linalg.norm(cup - where[step.hand]) / self.speed + self.pick_time
+            ready = max([grabbed] + [done[d] for d in step.depends])
+            done[step.index] = ready + np.linalg.norm(slot - cup) / self.speed + self.place_time
+            free[step.hand] = done[step.index]
+            where[step.hand] = slot
+        return float(max(done.values())) if done else 0.0
+
+    def assign_tower(self, plan, cups, starts=None):
+        """
+        Which cup each step of a tower plan uses. The order and hands of the steps are given by the
+        plan, so the cost of a cup is known exactly for every step: from the slot of the previous step
+        of the same hand to the cup, then to the slot. The Hungarian assignment of the least total time
+        is then improved by swapping the cups of two steps while the simulated makespan goes down.
+
+            Args:
+                plan (TowerPlan) - build plan
+                cups (array (n, 3)) - positions of the available cups
+                starts (dict) - hand --> (x, y, z) position of the hand, its first slot if None
+            Returns:
+                picks (list) - index into cups of each step, None if no cup is left for the step
+                makespan (float) - estimated seconds until the last cup is placed
+        """
+        steps = list(plan)
+        cups = np.asarray(cups, dtype=float).reshape(-1, 3)
+        if not steps:
+            return [], 0.0
+        starts = dict(starts or {})
+        previous = []
+        last = {}
+        for step in steps:
+            if step.hand not in starts:
+                starts[step.hand] = step.position
+            previous.append(last.get(step.hand, starts[step.hand]))
+            last[step.hand] = step.position
+        previous = np.asarray(previous, dtype=float)
+        slots = np.asarray([step.position for step in steps], dtype=float)
+
+        cost = (np.linalg.norm(cups[:, None, :] - previous[None, :, :], axis=2)
+                + np.linalg.norm(cups[:, None, :] - slots[None, :, :], axis=2)) / self.speed \
+            + self.pick_time + self.place_time
+        for hand in set(step.hand for step in steps):
+            columns = [k for k, step in enumerate(steps) if step.hand == hand]
+            cost[np.ix_(~self.reachable(hand, cups), columns)] = np.inf
+
+        picks = [None]*len(steps)
+        rows, cols = hungarian(cost)
+        for r, k in zip(rows, cols):
+            if np.isfinite(cost[r, k]):
+                picks[steps[k].index] = int(r)
+
+        # swap the cups of two steps, or give a step an unused cup, while the makespan goes down
+        span = self.simulate(plan, picks, cups, starts)
+        unused = [c for c in range(len(cups)) if c not in picks]
+        for _ in range(self.max_rounds):
+            improved = False
+            for a in range(len(picks)):
+                options = [("swap", b) for b in range(a + 1, len(picks))] + [("unused", c) for c in unused]
+                for kind, other in options:
+                    candidate = list(picks)
+                    if kind == "swap":
+                        candidate[a], candidate[other] = candidate[other], candidate[a]
+                    else:
+                        candidate[a] = other
+                    if not self.feasible(plan, candidate, cups):
+                        continue
+                    value = self.simulate(plan, candidate, cups, starts)
+                    if value < span - 1e-9:
+                        if kind == "unused":
+                            unused.remove(other)
+                            if picks[a] is not None:
+                                unused.append(picks[a])
+                        picks, span, improved = candidate, value, True
+            if not improved:
+                break
+        return picks, span
+
+    def feasible(self, plan, picks, cups):
+        """ whether every hand can reach the cups it is given """
+        for step in plan:
+            c = picks[step.index]
+            if c is not None and not self.reachable(step.hand, cups[c])[0]:
+                return False
+        return True
@@ -0,0 +1,149 @@
+"""
+Headless benchmarks of the decision layer: Scene queries, the state 1 sorting loop and the
+BuildTower planner, on random cup layouts in a MemoryWorld. No ROS master, Gazebo or MoveIt needed.
+
+    python3 -m tower.benchmark --sizes 9 100 1000 --save bench.json
+    python3 -m tower.benchmark --baseline bench.json      # exit code 1 on a regression
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+from tower.simulator import Scene
+from tower.buildTower import BuildTower
+from tower.world import MemoryWorld
+
+# same values as config/scene_objects.yaml
+SCENE_PARAMS = {"radius": 0.02, "length": 0.05,
+                "table_x": 0.74, "table_y": 1.83, "table_z": 0.05,
+                "t_x": 1, "t_y": 0, "t_z": -0.22,
+                "world_ttl": 0.5}
+HANDS = ("left_gripper", "right_gripper")
+
+
+def make_scene(cup_n, seed):
+    """ return (Scene, MemoryWorld) with cup_n cups at random positions """
+    params = dict(SCENE_PARAMS, cup_n=cup_n)
+    world = MemoryWorld.random_layout(cup_n, params["table_x"], params["table_y"],
+                                      (params["t_x"], params["t_y"], params["t_z"]),
+                                      radius=params["radius"], seed=seed)
+    return Scene(None, False, world=world, params=params), world
+
+
+def bench_create_dictionary(scene, world):
+    """ one snapshot and the sorted/unsorted dictionaries of both hands, returns the number of operations """
+    scene.update_world()
+    scene.create_dictionary("InWorkspace")
+    scene.create_dictionary("OutWorkspace")
+    return 2
+
+
+def bench_sorting(scene, world):
+    """
+    The state 1 loop: each step both hands take the min(x) cup of their half of the sorting
+    workspace and put it at the next place position, until the workspace is empty.
+    Returns the number of cups moved.
+    """
+    scene.update_world()
+    moved = 0
+    while not scene.cups_sorted():
+        step = 0
+        for hand in HANDS:
+            side = hand.split('_')[0]
+            if scene.registry.count("InWorkspace", side) == 0:
+                continue
+            cup = scene.assign_cup_st1(hand)
+            place = scene.place_next_pos(hand)
+            world.move(cup, (place.x, place.y, place.z))
+            step += 1
+        if step == 0:
+            break
+        moved += step
+        scene.update_world()
+    return moved
+
+
+def bench_tower(scene, world):
+    """ plan the largest pyramid the cups of the scene allow and assign the picks, returns the number of cups """
+    rows = 1
+    while (rows+1)*(rows+2)//2 <= scene.cup_n:
+        rows += 1
+    planner = BuildTower()
+    plan = planner.pyramid(rows)
+    world_state = scene.update_world()
+    picks = [world_state.xyz(name) for name in scene.model_names() if name != "Table"]
+    planner.assign_picks(plan, picks)
+    return len(plan)
+
+
+BENCHMARKS = {"create_dictionary": bench_create_dictionary,
+              "sorting": bench_sorting,
+              "tower": bench_tower}
+
+
+def run(sizes, repeat=5, seed=0, names=None):
+    """
+    Run every benchmark on every size.
+
+        Returns:
+            results (dict) - "<benchmark>/<size>" --> {"median": s, "best": s, "ops": n, "throughput": ops/s}
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        bench = BENCHMARKS[name]
+        for size in sizes:
+            times = []
+            for r in range(repeat):
+                scene, world = make_scene(size, seed + r)
+                start = time.perf_counter()
+                ops = bench(scene, world)
+                times.append(time.perf_counter() - start)
+            median = statistics.median(times)
+            results[f"{name}/{size}"] = {"median": median, "best": min(times), "ops": ops,
+                                         "throughput": ops / median if median > 0 else float("inf")}
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """ return [(key, baseline median, median)] of the benchmarks more than tolerance slower than baseline """
+    slower = []
+    for key, result in results.items():
+        if key in baseline and result["median"] > baseline[key]["median"] * (1 + tolerance):
+            slower.append((key, baseline[key]["median"], result["median"]))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the Scene and BuildTower decision layer")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[9, 50, 100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS))
+    parser.add_argument("--save", help="write the results as json")
+    parser.add_argument("--baseline", help="json results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.seed, args.only)
+    for key, r in results.items():
+        print(f"{key:28s} median {r['median']*1000:9.2f} ms  best {r['best']*1000:9.2f} ms  "
+              f"{r['throughput']:10.1f} ops/s")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = regressions(results, baseline, args.tolerance)
+        for key, old, new in slower:
+            print(f"REGRESSION {key}: {old*1000:.2f} ms --> {new*1000:.2f} ms")
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,61 @@
 
 import rospy
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+
+# One cup of a build plan.
+#   index (int) - position of the step in the build schedule
+#   position (tuple) - (x, y, z) place position of the cup
+#   hand (str) - "left_gripper" or "right_gripper"
+#   level (int) - row of the tower, 0 is the row on the table
+#   depends (tuple of int) - indices of the steps whose cups this cup rests on
+TowerStep = namedtuple("TowerStep", ["index", "position", "hand", "level", "depends"])
+
+
+class TowerPlan():
+    """ Dependency ordered build schedule of a tower """
+    def __init__(self, steps):
+        self.steps = steps
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __getitem__(self, i):
+        return self.steps[i]
+
+    def as_lists(self):
+        """ Returns:
+                placePos (list of (x,y,z)) - places to put cups, in build order.
+                useHand (list of string) - "left_gripper" or "right_gripper" for each cup.
+        """
+        return [step.position for step in self.steps], [step.hand for step in self.steps]
+
+    def pairable(self, i):
+        """ step i (left hand) and step i+1 (right hand) can be placed at the same time,
+            the cup of step i+1 does not rest on the cup of step i """
+        return i + 1 < len(self.steps) and self.steps[i].hand == "left_gripper" \
+            and self.steps[i+1].hand == "right_gripper" and i not in self.steps[i+1].depends
+
+    def hand_steps(self, hand):
+        """ steps placed by one hand, in build order """
+        return [step for step in self.steps if step.hand == hand]
+
 
 class BuildTower():
-    def __init__(self):
+    def __init__(self, reach=None, feasibility=None):
+        """
+        Args:
+            reach (ReachMap) - reachability of each hand, cups go to the hand on their side if None
+            feasibility (Feasibility) - geometric checks of the place positions, not checked if None
+        """
         rospy.loginfo("position info of building")
+        self.reach = reach
+        self.feasibility = feasibility
         self.TOL = 0.03 # tolerance for cup
         self.TOL_table = 0.25 # tolerance for table
         #TODO: yaml
@@ -97,3 +149,198 @@ class BuildTower():
         placePos.append((self.towerX, y, z))       
 
         return placePos, useHand 
+
+
+    def pyramid_rows(self, num):
+        """ number of rows of a pyramid made of num cups, None if num is not a triangular number """
+        rows = 0
+        total = 0
+        while total < num:
+            rows += 1
+            total += rows
+        if total != num:
+            return None
+        return rows
+
+    def assign_picks(self, plan, picks, assigner=None):
+        """ gives each step of a plan the next pick position on the side of its hand
+
+            Args:
+                plan (TowerPlan) - build plan
+                picks (list of (x,y,z)) - positions of the cups to use, y > centerY for the left hand
+                assigner (AssignmentEngine) - picks the cups of all steps together for the shortest build instead
+            Returns:
+                pickPos (list of (x,y,z) or None) - pick position of each step, None once a side runs out of cups
+        """
+        if assigner is not None:
+            indices, makespan = assigner.assign_tower(plan, picks)
+            rospy.loginfo(f"pick assignment makespan {makespan:.1f} s")
+            return [picks[i] if i is not None else None for i in indices]
+        left = [p for p in picks if p[1] > self.centerY]
+        right = [p for p in picks if p[1] < self.centerY]
+        pickPos = []
+        for step in plan:
+            side = left if step.hand == "left_gripper" else right
+            pickPos.append(side.pop(0) if side else None)
+        return pickPos
+
+    def pyramid_slots(self, rows, x=None, z=None, spacing=None, height=None, lean=0.0):
+        """ place positions of a pyramid with rows cups on the table and one cup on top
+
+            Args:
+                rows (int) - number of rows of the pyramid
+                x (float) - x of the bottom row, defaults to towerX
+                z (float) - z of the bottom row, defaults to POS_Z
+                spacing (float) - distance between the centers of two cups of a row, defaults to the cup diameter
+                height (float) - distance between two rows, defaults to the cup height
+                lean (float) - x offset added at every row
+            Returns:
+                slots (list of (x,y,z)) - row by row, from the table up
+        """
+        x = self.towerX if x is None else x
+        z = self.POS_Z if z is None else z
+        spacing = self.radius*2 if spacing is None else spacing
+        height = self.height if height is None else height
+
+        slots = []
+        for level in range(rows):
+            n = rows - level
+            y0 = self.centerY - spacing*(n - 1)/2.0
+            for j in range(n):
+                slots.append((round(x + lean*level, 4), round(y0 + spacing*j, 4), round(z + height*level, 4)))
+        return slots
+
+    def pyramid(self, rows, first_hand="left_gripper", **kwargs):
+        """ build plan of an N-row pyramid, keyword arguments are passed to pyramid_slots
+
+            Returns:
+                plan (TowerPlan) - dependency ordered steps
+        """
+        rospy.loginfo(f"building tower with {rows} rows")
+        return self.plan_layout(self.pyramid_slots(rows, **kwargs), first_hand)
+
+    def plan_layout(self, slots, first_hand="left_gripper"):
+        """ Builds a schedule for any layout of cups.
+            A cup depends on every cup of the row below whose footprint it overlaps.
+            Cups with y > centerY are placed by the left hand, y < centerY by the right hand and cups
+            on the center line by the hand with fewer cups. With a reachability map, a cup the hand
+            of its side cannot reach goes to the other hand. The schedule alternates the hands,
+            placing lower rows and cups close to the center first.
+
+            Args:
+                slots (list of (x,y,z)) - place positions of the cups
+                first_hand (str) - hand that places the first cup
+            Returns:
+                plan (TowerPlan) - dependency ordered steps
+        """
+        n = len(slots)
+        EPS = 1e-6
+        other = {"left_gripper": "right_gripper", "right_gripper": "left_gripper"}
+
+        # group slots into rows by height
+        order = sorted(range(n), key=lambda i: slots[i][2])
+        level = [0]*n
+        rows = []
+        for i in order:
+            if rows and abs(slots[i][2] - slots[rows[-1][0]][2]) < self.height/2.0:
+                rows[-1].append(i)
+            else:
+                rows.append([i])
+            level[i] = len(rows) - 1
+
+        # supporting cups from the row below, found with a bisect on y
+        reach = self.radius*2 - EPS
+        supports = [()]*n
+        dependents = [[] for i in range(n)]
+        below_y = []
+        below_i = []
+        for row in rows:
+            for i in row:
+                x, y, z = slots[i]
+                lo = bisect_left(below_y, y - reach)
+                hi = bisect_right(below_y, y + reach)
+                supports[i] = tuple(j for j in below_i[lo:hi] if abs(slots[j][0] - x) < reach)
+                for j in supports[i]:
+                    dependents[j].append(i)
+            row_sorted = sorted(row, key=lambda i: slots[i][1])
+            below_y = [slots[i][1] for i in row_sorted]
+            below_i = row_sorted
+
+        # hand assignment
+        hand = [None]*n
+        count = {"left_gripper": 0, "right_gripper": 0}
+        for i in order:
+            y = slots[i][1]
+            if y > self.centerY + EPS:
+                h = "left_gripper"
+            elif y < self.centerY - EPS:
+                h = "right_gripper"
+            else:
+                continue
+            if self.reach is not None and not self.reach.reachable(h, slots[i]) \
+                    and self.reach.reachable(other[h], slots[i]):
+                h = other[h]
+            hand[i] = h
+            count[h] += 1
+        for i in order:
+            if hand[i] is None:
+                h = first_hand if count[first_hand] <= count[other[first_hand]] else other[first_hand]
+                if self.reach is not None and not self.reach.reachable(h, slots[i]):
+                    h = other[h]
+                hand[i] = h
+                count[h] += 1
+
+        # schedule, alternating hands among the cups whose supports are placed
+        missing = [len(supports[i]) for i in range(n)]
+        ready = {"left_gripper": [], "right_gripper": []}
+        for i in range(n):
+            if missing[i] == 0:
+                heapq.heappush(ready[hand[i]], (level[i], abs(slots[i][1] - self.centerY), i))
+
+        schedule = []
+        turn = first_hand
+        while len(schedule) < n:
+            if not ready[turn]:
+                turn = other[turn]
+            if not ready[turn]:
+                rospy.logerr("ERROR in plan_layout cups left without support")
+                break
+            i = heapq.heappop(ready[turn])[2]
+            schedule.append(i)
+            for k in dependents[i]:
+                missing[k] -= 1
+                if missing[k] == 0:
+                    heapq.heappush(ready[hand[k]], (level[k], abs(slots[k][1] - self.centerY), k))
+            turn = other[turn]
+
+        step_of = {slot: step for step, slot in enumerate(schedule)}
+        steps = []
+        for step, i in enumerate(schedule):
+            depends = tuple(sorted(step_of[j] for j in supports[i]))
+            steps.append(TowerStep(step, slots[i], hand[i], level[i], depends))
+        plan = TowerPlan(steps)
+        for step in self.unreachable(plan):
+            rospy.logerr(f"ERROR in plan_layout {step.hand} cannot reach cup {step.index} at {step.position}")
+        for step, code in self.infeasible(plan):
+            rospy.logerr(f"ERROR in plan_layout cup {step.index} at {step.position}: {self.feasibility.describe(code)}")
+        return plan
+
+    def unreachable(self, plan):
+        """ steps of a plan whose hand cannot reach the place position, empty without a reachability map """
+        if self.reach is None:
+            return []
+        return [step for step in plan if not self.reach.reachable(step.hand, step.position)]
+
+    def infeasible(self, plan, obstacles=()):
+        """ steps of a plan whose cup overlaps, is not supported or is off the table, empty without feasibility checks
+
+            Args:
+                plan (TowerPlan) - build plan
+                obstacles (list of (x,y,z)) - cups on the table that are not part of the tower
+            Returns:
+                steps (list of (TowerStep, int)) - failed step and its Feasibility code
+        """
+        if self.feasibility is None or not len(plan):
+            return []
+        codes = self.feasibility.check_layout([step.position for step in plan], obstacles)
+        return [(step, int(code)) for step, code in zip(plan, codes) if code]
@@ -0,0 +1,48 @@
+"""
+Relays one Baxter camera to the topic names older tools expect, with one subscription per topic.
+
+Messages are relayed as rospy.AnyMsg, so a frame is passed on as the serialized buffer it came in
+as, without being deserialized or serialized again in Python, and only to topics that currently
+have subscribers. The detector itself does not need the relay: launch/camera_relay.launch remaps
+apriltag_ros straight onto the camera topics.
+"""
+import rospy
+import tf2_ros
+import geometry_msgs.msg
+
+
+class CameraRelay():
+    def __init__(self, camera, image_topics, info_topics, frame="camera"):
+        """
+        Args:
+            camera (str) - Baxter camera name (ex. right_hand_camera)
+            image_topics (list of str) - topics that get the camera image
+            info_topics (list of str) - topics that get the camera info
+            frame (str) - frame placed on the camera frame for apriltag_ros
+        """
+        self.camera = camera
+        self.image_pubs = [rospy.Publisher(t, rospy.AnyMsg, queue_size=1) for t in image_topics]
+        self.info_pubs = [rospy.Publisher(t, rospy.AnyMsg, queue_size=1) for t in info_topics]
+        self.image_sub = rospy.Subscriber(f"/cameras/{camera}/image", rospy.AnyMsg,
+                                          self.relay, self.image_pubs, queue_size=1)
+        self.info_sub = rospy.Subscriber(f"/cameras/{camera}/camera_info_std", rospy.AnyMsg,
+                                         self.relay, self.info_pubs, queue_size=1)
+
+        # the camera frame does not move relative to the camera, publish it once
+        self.broadcaster = tf2_ros.StaticTransformBroadcaster()
+        self.broadcaster.sendTransform(self.camera_transform(frame))
+
+    def relay(self, msg, pubs):
+        """ pass the serialized message on to every publisher that has a subscriber """
+        for pub in pubs:
+            if pub.get_num_connections() > 0:
+                pub.publish(msg)
+
+    def camera_transform(self, frame):
+        """ identity transform from the Baxter camera frame to frame """
+        tf = geometry_msgs.msg.TransformStamped()
+        tf.header.stamp = rospy.Time.now()
+        tf.header.frame_id = self.camera
+        tf.child_frame_id = frame
+        tf.transform.rotation.w = 1
+        return tf
@@ -0,0 +1,185 @@
+"""
+Cup registry used by Scene to answer "which cup should this hand take next" queries.
+
+Cup positions are kept in flat lists indexed by cup. Every cup belongs to at most one
+partition (InWorkspace/OutWorkspace x left/right) and each partition keeps a heap ordered
+by x, so the cup with min(x) of a partition is found in O(log n). Heap entries are
+invalidated lazily with a per cup version counter instead of being removed.
+"""
+import heapq
+from geometry_msgs.msg import Point
+
+WORKSPACES = ("InWorkspace", "OutWorkspace")
+SIDES = ("left", "right")
+
+
+def hand_side(hand):
+    """ return the table side ("left" or "right") served by a gripper, None if unknown """
+    if hand == "left_gripper":
+        return "left"
+    elif hand == "right_gripper":
+        return "right"
+    return None
+
+
+class CupRegistry():
+    def __init__(self, names, condition):
+        """
+        Args:
+            names (list of str) - names of the cups to track (ex. Cup_1)
+            condition (float) - |y| below which a cup is inside the sorting workspace
+        """
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.condition = condition
+
+        n = len(self.names)
+        self.xs = [0.0]*n
+        self.ys = [0.0]*n
+        self.zs = [0.0]*n
+        self.known = [False]*n
+        self.held = [False]*n
+        self.partition = [None]*n
+        self.version = [0]*n
+
+        self.heaps = {}
+        self.members = {}
+        for workspace in WORKSPACES:
+            for side in SIDES:
+                self.heaps[(workspace, side)] = []
+                self.members[(workspace, side)] = set()
+
+    def __len__(self):
+        return len(self.names)
+
+    def partition_of(self, y):
+        """
+        Return the (workspace, side) partition of a cup at y.
+        Cups lying exactly on a boundary are not part of any partition,
+        same as the original create_dictionary.
+        """
+        if y > self.condition:
+            return ("OutWorkspace", "left")
+        elif y < -self.condition:
+            return ("OutWorkspace", "right")
+        elif -self.condition < y < self.condition:
+            if y > 0:
+                return ("InWorkspace", "left")
+            elif y < 0:
+                return ("InWorkspace", "right")
+        return None
+
+    def _set_partition(self, i, key):
+        """ move cup i to partition key (None removes it from every partition) """
+        old = self.partition[i]
+        if old is not None:
+            self.members[old].discard(i)
+        self.version[i] += 1
+        self.partition[i] = key
+        if key is not None:
+            self.members[key].add(i)
+            heap = self.heaps[key]
+            heapq.heappush(heap, (self.xs[i], i, self.version[i]))
+            # drop stale entries once they dominate the heap
+            if len(heap) > 2*len(self.members[key]) + 16:
+                self.heaps[key] = [e for e in heap if self.version[e[1]] == e[2]]
+                heapq.heapify(self.heaps[key])
+
+    def update(self, name, xyz):
+        """
+        Update the position of a cup, only touching the heaps when it moved.
+
+            Args:
+                name (str) - cup name
+                xyz (tuple) - (x, y, z) position in the base frame
+        """
+        i = self.index[name]
+        x, y, z = xyz
+        if self.known[i] and self.xs[i] == x and self.ys[i] == y and self.zs[i] == z:
+            return
+        self.xs[i], self.ys[i], self.zs[i] = x, y, z
+        self.known[i] = True
+        if not self.held[i]:
+            self._set_partition(i, self.partition_of(y))
+
+    def sync(self, world):
+        """
+        Update every cup that is not held by a gripper from a WorldState snapshot.
+        Cups missing from the snapshot keep their last position but leave their partition
+        until they are seen again, so no hand is sent to a stale position.
+        """
+        for i, name in enumerate(self.names):
+            if self.held[i]:
+                continue
+            if name in world:
+                self.update(name, world.xyz(name))
+            elif self.known[i]:
+                self.known[i] = False
+                self._set_partition(i, None)
+
+    def grabbed(self, name):
+        """ a gripper holds the cup, it is not available to any partition until placed """
+        i = self.index.get(name)
+        if i is None:
+            return
+        self.held[i] = True
+        self._set_partition(i, None)
+
+    def placed(self, name, xyz=None):
+        """
+        The cup was released. Without a position it waits for the next sync.
+
+            Args:
+                name (str) - cup name
+                xyz (tuple) - (x, y, z) where the cup was placed
+        """
+        i = self.index.get(name)
+        if i is None:
+            return
+        self.held[i] = False
+        if xyz is None:
+            self.known[i] = False
+        else:
+            self.update(name, xyz)
+
+    def min_x(self, workspace, side, accept=None):
+        """
+        Return the name of the cup with min(x) in a partition, None if it is empty.
+
+            Args:
+                accept (function) - (x, y, z) --> bool, cups it rejects are skipped
+        """
+        key = (workspace, side)
+        heap = self.heaps[key]
+        while heap:
+            x, i, version = heap[0]
+            if self.version[i] == version:
+                break
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        i = heap[0][1]
+        if accept is None or accept((self.xs[i], self.ys[i], self.zs[i])):
+            return self.names[i]
+        # the first cup was rejected, look at the others in x order
+        for x, i, version in sorted(heap):
+            if self.version[i] == version and accept((self.xs[i], self.ys[i], self.zs[i])):
+                return self.names[i]
+        return None
+
+    def count(self, workspace, side):
+        """ number of cups in a partition """
+        return len(self.members[(workspace, side)])
+
+    def position(self, name):
+        """ return a new Point with the last known position of a cup """
+        i = self.index[name]
+        return Point(self.xs[i], self.ys[i], self.zs[i])
+
+    def resting(self):
+        """ (x, y, z) of every known cup not held by a gripper """
+        return [(self.xs[i], self.ys[i], self.zs[i]) for i in range(len(self.names)) if self.known[i] and not self.held[i]]
+
+    def partition_dict(self, workspace, side):
+        """ return {cup name: Point} of every cup in a partition """
+        return {self.names[i]: Point(self.xs[i], self.ys[i], self.zs[i]) for i in self.members[(workspace, side)]}
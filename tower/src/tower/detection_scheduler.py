@@ -0,0 +1,169 @@
+"""
+Rate policy of the tag detection, so detection does not compete with planning for the CPU.
+
+    paused - no consumer and no request, frames are skipped
+    background - someone subscribes to the detections, frames are detected at background_rate
+    full - a request (Scene needs fresh poses before a grab) asked for every frame for a while
+
+The CPU time and the wall time of the process doing the detection are attributed to the mode
+that was active, so the cost of each mode can be reported.
+
+    scheduler = DetectionScheduler(background_rate=2.0)
+    if scheduler.accept():
+        detect(frame)
+"""
+import os
+import time
+import threading
+import rospy
+import rosgraph
+
+MODES = ("paused", "background", "full")
+
+
+def process_cpu(pid=None):
+    """ user + system CPU seconds of a process (this one if None), read from /proc """
+    if pid is None:
+        return time.process_time()
+    with open(f"/proc/{pid}/stat") as f:
+        # the command name may contain spaces, the fields start after its closing parenthesis
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class DetectionScheduler():
+    def __init__(self, background_rate=1.0, full_rate=0.0, cpu=process_cpu, clock=time.monotonic):
+        """
+        Args:
+            background_rate (float) - detections per second while only subscribers are waiting (Hz)
+            full_rate (float) - detections per second during a request, 0 for every frame (Hz)
+            cpu (function) - returns the CPU seconds used so far by the detection
+            clock (function) - returns the current time in seconds
+        """
+        self.rates = {"paused": None, "background": background_rate, "full": full_rate}
+        self.cpu = cpu
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.consumers = 0
+        self.burst_until = 0.0
+        self.last_accept = {}   # stream --> time of the last detected frame
+
+        self.current = None
+        self.sample = (clock(), cpu())
+        self.stats = {mode: {"wall": 0.0, "cpu": 0.0, "frames": 0, "skipped": 0} for mode in MODES}
+
+    def request(self, duration):
+        """ detect every frame for the next duration seconds """
+        with self.lock:
+            self.burst_until = max(self.burst_until, self.clock() + duration)
+
+    def set_consumers(self, n):
+        """ number of subscribers to the detections """
+        self.consumers = n
+
+    def mode(self, now=None):
+        now = self.clock() if now is None else now
+        if now < self.burst_until:
+            return "full"
+        if self.consumers > 0:
+            return "background"
+        return "paused"
+
+    def rate(self, mode=None):
+        """ detections per second of a mode (the current one if None), 0 for every frame, None when paused """
+        return self.rates[mode or self.mode()]
+
+    def _account(self, now, mode):
+        """ attribute the time and CPU since the last sample to the mode that was active """
+        cpu = self.cpu()
+        if self.current is not None:
+            stats = self.stats[self.current]
+            stats["wall"] += now - self.sample[0]
+            stats["cpu"] += cpu - self.sample[1]
+        self.sample = (now, cpu)
+        self.current = mode
+
+    def accept(self, now=None, stream=None):
+        """
+        Return True if the frame arriving now should be detected.
+
+            Args:
+                stream (str) - camera of the frame, the rate applies to each camera separately
+        """
+        with self.lock:
+            now = self.clock() if now is None else now
+            mode = self.mode(now)
+            if mode != self.current:
+                self._account(now, mode)
+            rate = self.rates[mode]
+            last = self.last_accept.get(stream)
+            accepted = rate is not None and (rate <= 0 or last is None or now - last >= 1.0/rate)
+            if accepted:
+                self.last_accept[stream] = now
+                self.stats[mode]["frames"] += 1
+            else:
+                self.stats[mode]["skipped"] += 1
+            return accepted
+
+    def report(self):
+        """ return {mode: {"wall": s, "cpu": s, "cpu_percent": %, "frames": n, "skipped": n, "rate": Hz}} """
+        with self.lock:
+            self._account(self.clock(), self.current)
+            report = {}
+            for mode, stats in self.stats.items():
+                wall = stats["wall"]
+                report[mode] = dict(stats, rate=self.rates[mode],
+                                    cpu_percent=100.0*stats["cpu"]/wall if wall > 0 else 0.0)
+            return report
+
+    def report_text(self):
+        """ report() as one line per mode """
+        lines = []
+        for mode, r in self.report().items():
+            rate = "off" if r["rate"] is None else ("every frame" if r["rate"] <= 0 else f"{r['rate']:g} Hz")
+            lines.append(f"{mode} ({rate}): {r['wall']:.1f} s, cpu {r['cpu']:.2f} s ({r['cpu_percent']:.1f}%), "
+                         f"{r['frames']} frames detected, {r['skipped']} skipped")
+        return "\n".join(lines)
+
+
+class SchedulerService():
+    """
+    ROS side of a DetectionScheduler: the /request_tags service and a timer that counts the
+    subscribers of consumer_topics on the master.
+    """
+    def __init__(self, scheduler, consumer_topics, period=1.0, name="/request_tags"):
+        """
+        Args:
+            scheduler (DetectionScheduler) - scheduler of the detection of this node
+            consumer_topics (list of str) - topics whose subscribers need the detections
+            period (float) - seconds between two looks at the subscribers
+            name (str) - service name
+        """
+        from tower.srv import RequestTags, RequestTagsResponse
+        self.response = RequestTagsResponse
+        self.scheduler = scheduler
+        self.consumer_topics = set(consumer_topics)
+        self.master = rosgraph.Master(rospy.get_name())
+        self.service = rospy.Service(name, RequestTags, self.request_callback)
+        self.timer = rospy.Timer(rospy.Duration(period), self.count_consumers)
+
+    def count_consumers(self, event=None):
+        try:
+            pubs, subs, srvs = self.master.getSystemState()
+        except (rosgraph.MasterError, OSError):
+            return
+        nodes = set()
+        for topic, subscribers in subs:
+            if topic in self.consumer_topics:
+                nodes.update(subscribers)
+        nodes.discard(rospy.get_name())
+        self.scheduler.set_consumers(len(nodes))
+
+    def request_callback(self, req):
+        """ full rate detection for req.duration seconds, returns the modes before and after and the report """
+        previous = self.scheduler.mode()
+        if req.duration > 0:
+            self.scheduler.request(req.duration)
+        mode = self.scheduler.mode()
+        rate = self.scheduler.rate(mode)
+        return self.response(previous, mode, -1.0 if rate is None else rate, self.scheduler.report_text())
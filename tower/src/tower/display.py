@@ -0,0 +1,232 @@
+"""
+Rendering of the Baxter head display (/robot/xdisplay, 1024x600 bgr8).
+
+The display is fed from the tag detection image without slowing the detection down:
+    - the image callback only keeps the latest frame, older ones are dropped unread
+    - frames are letterboxed to the display in one gather from the message buffer, with an index
+      table computed once per input format (cv2.resize when OpenCV is installed)
+    - the build progress overlay is drawn once per change and copied onto each frame
+    - the node renders and publishes at a capped rate, only when a frame or the overlay changed
+
+Build progress comes from the tower_progress topic (std_msgs/String, see progress_message),
+published by arm_control at every tower step.
+"""
+import json
+import threading
+import numpy as np
+from tower.roi_detector import CHANNELS
+
+XDISPLAY = (1024, 600)    # width, height of the head display
+
+
+def progress_message(step, total, cup):
+    """ text of a tower_progress message: the step being built, the number of steps and its cup """
+    return json.dumps({"step": step, "total": total, "cup": cup})
+
+
+def image_to_bgr(msg):
+    """
+    (height, width, 3) bgr view of a sensor_msgs/Image (mono8, bgr8, bgra8, rgb8 or rgba8).
+    bgr8 and bgra8 images are not copied.
+    """
+    data = np.frombuffer(msg.data, dtype=np.uint8).reshape(msg.height, msg.step)
+    if msg.encoding == "mono8":
+        return np.repeat(data[:, :msg.width, None], 3, axis=2)
+    n, r, g, b = CHANNELS[msg.encoding]
+    pixels = data[:, :msg.width*n].reshape(msg.height, msg.width, n)
+    if (b, g, r) == (0, 1, 2):
+        return pixels[..., :3]
+    return pixels[..., [b, g, r]]
+
+
+def bgr_to_image(pixels, header=None):
+    """ sensor_msgs/Image of a (height, width, 3) uint8 bgr array """
+    from sensor_msgs.msg import Image
+    msg = Image()
+    if header is not None:
+        msg.header = header
+    msg.height, msg.width = pixels.shape[:2]
+    msg.encoding = "bgr8"
+    msg.step = msg.width*3
+    msg.data = np.ascontiguousarray(pixels).tobytes()
+    return msg
+
+
+class LatestFrame():
+    """ one slot holding the newest frame, a frame not taken before the next one arrives is dropped """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frame = None
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self.lock:
+            if self.frame is not None:
+                self.dropped += 1
+            self.frame = frame
+            self.received += 1
+
+    def take(self):
+        """ the newest frame, None if there was none since the last take """
+        with self.lock:
+            frame, self.frame = self.frame, None
+            return frame
+
+
+class Resizer():
+    """ Letterboxes sensor_msgs/Image frames into the display as bgr, keeping their aspect ratio """
+    def __init__(self, size=XDISPLAY):
+        """
+        Args:
+            size (tuple) - (width, height) of the output
+        """
+        self.size = size
+        self.format = None      # (height, width, step, encoding) the table was computed for
+        self.box = None         # (x0, y0, width, height) of the frame in the output
+        self.table = None       # byte of the message data of every channel of the frame in the output
+        self.canvas = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        try:
+            import cv2
+            self.cv2 = cv2
+        except ImportError:
+            self.cv2 = None
+
+    def _tables(self, msg):
+        h, w = msg.height, msg.width
+        W, H = self.size
+        scale = min(W/w, H/h)
+        bw, bh = max(1, int(round(w*scale))), max(1, int(round(h*scale)))
+        self.box = ((W - bw)//2, (H - bh)//2, bw, bh)
+        # nearest source pixel of the center of every output pixel
+        rows = np.minimum(((np.arange(bh) + 0.5)/scale).astype(np.intp), h - 1)
+        cols = np.minimum(((np.arange(bw) + 0.5)/scale).astype(np.intp), w - 1)
+        n, r, g, b = CHANNELS[msg.encoding] if msg.encoding != "mono8" else (1, 0, 0, 0)
+        self.table = rows[:, None, None]*msg.step + cols[None, :, None]*n + np.array([b, g, r])
+        self.format = (msg.height, msg.width, msg.step, msg.encoding)
+        self.canvas[:] = 0
+
+    def __call__(self, msg):
+        """
+        Args:
+            msg (sensor_msgs/Image) - mono8, bgr8, bgra8, rgb8 or rgba8 frame
+        Returns:
+            canvas (array (height, width, 3)) - bgr, reused between calls, copy it to keep it
+        """
+        if (msg.height, msg.width, msg.step, msg.encoding) != self.format:
+            self._tables(msg)
+        x0, y0, bw, bh = self.box
+        target = self.canvas[y0:y0+bh, x0:x0+bw]
+        if self.cv2 is not None:
+            target[:] = self.cv2.resize(image_to_bgr(msg), (bw, bh), interpolation=self.cv2.INTER_AREA)
+        else:
+            # one gather from the message buffer, scaling and channel order at once
+            target[:] = np.frombuffer(msg.data, dtype=np.uint8).take(self.table)
+        return self.canvas
+
+
+class Overlay():
+    """ Build progress bar and next cup, drawn once per change and copied onto every frame """
+    def __init__(self, size=XDISPLAY, bar=24, color=(0, 200, 0)):
+        """
+        Args:
+            size (tuple) - (width, height) of the display
+            bar (int) - height of the progress bar at the bottom of the display in pixels
+            color (tuple) - bgr color of the bar and the text
+        """
+        self.size = size
+        self.bar = bar
+        self.color = np.array(color, dtype=np.uint8)
+        self.state = None
+        self.index = np.zeros(0, dtype=np.intp)     # flat pixel indices of the overlay
+        self.pixels = np.zeros((0, 3), dtype=np.uint8)
+        self.stale = self.index                     # pixels of the overlay drawn before the last change
+        self.renders = 0
+
+    def update(self, step, total, cup):
+        """ set the progress, returns True if the overlay changed """
+        state = (step, total, cup)
+        if state == self.state:
+            return False
+        self.state = state
+        self.stale = np.union1d(self.stale, self.index)
+        self._render()
+        return True
+
+    def update_message(self, data):
+        """ set the progress from a tower_progress message """
+        progress = json.loads(data)
+        return self.update(progress["step"], progress["total"], progress["cup"])
+
+    def _render(self):
+        W, H = self.size
+        image = np.zeros((H, W, 3), dtype=np.uint8)
+        mask = np.zeros((H, W), dtype=bool)
+        step, total, cup = self.state
+        # frame of the bar, filled up to the steps done
+        mask[H - self.bar:, :] = True
+        image[H - self.bar:, :] = 40
+        done = int(W*min(step, total)/total) if total else 0
+        image[H - self.bar + 2:H - 2, :done] = self.color
+        try:
+            import cv2
+            text = f"step {step + 1}/{total}  next {cup}" if cup else f"step {step + 1}/{total}"
+            cv2.putText(image, text, (10, H - self.bar - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
+                        tuple(int(c) for c in self.color), 2, cv2.LINE_AA)
+            mask |= image.any(axis=2)
+        except ImportError:
+            pass
+        self.index = np.flatnonzero(mask)
+        self.pixels = image.reshape(-1, 3)[self.index]
+        self.renders += 1
+
+    def clear(self, canvas):
+        """ blank the pixels of the replaced overlays on a canvas they were drawn on """
+        if len(self.stale):
+            canvas.reshape(-1, 3)[self.stale] = 0
+            self.stale = np.zeros(0, dtype=np.intp)
+
+    def apply(self, canvas):
+        """ draw the overlay onto a (height, width, 3) canvas in place """
+        if len(self.index):
+            canvas.reshape(-1, 3)[self.index] = self.pixels
+        return canvas
+
+
+class DisplayPipeline():
+    def __init__(self, size=XDISPLAY):
+        """
+        Args:
+            size (tuple) - (width, height) of the display
+        """
+        self.frames = LatestFrame()
+        self.resizer = Resizer(size)
+        self.overlay = Overlay(size)
+        self.lock = threading.Lock()    # the progress callback runs on another thread than render
+        self.changed = False    # the overlay changed since the last render
+        self.last = None        # newest frame rendered
+        self.rendered = 0
+
+    def image_callback(self, msg):
+        """ subscriber callback, only keeps the message """
+        self.frames.put(msg)
+
+    def progress_callback(self, msg):
+        with self.lock:
+            if self.overlay.update_message(msg.data):
+                self.changed = True
+
+    def render(self):
+        """ sensor_msgs/Image of the newest frame with the overlay, None if nothing changed since the last one """
+        msg = self.frames.take()
+        with self.lock:
+            if msg is None and not (self.changed and self.last is not None):
+                return None
+            if msg is not None:
+                self.last = msg
+            # a changed overlay is drawn again on the last frame
+            self.overlay.clear(self.resizer.canvas)
+            canvas = self.overlay.apply(self.resizer(self.last))
+            self.changed = False
+        self.rendered += 1
+        return bgr_to_image(canvas, self.last.header)
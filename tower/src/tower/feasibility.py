@@ -0,0 +1,169 @@
+"""
+Geometric feasibility of cup place targets, checked on a whole batch of targets at once before
+any of them is sent to the planner.
+
+Cups are vertical cylinders and the table a box (config/scene_objects.yaml). A target fails when
+    OFF_TABLE    - the cup footprint is not on the table top
+    BELOW_TABLE  - the target is under the table top
+    OVERLAP      - the cup intersects a cup of its row (layout cups) or a cup on the table (world cups)
+    UNSUPPORTED  - the cup is above the bottom row and the cups of the row below do not hold it
+    NO_CLEARANCE - a cup of the same row or above is in the way of the gripper approaching along +x
+
+    feasibility = Feasibility.from_params(rospy.get_param)
+    codes = feasibility.check_layout(placePosList, obstacles=scene.obstacles())
+    for i in np.flatnonzero(codes):
+        rospy.logwarn(f"step {i}: {feasibility.describe(codes[i])}")
+
+All distances are in meters. Layout targets share one z convention (the place height of the
+gripper) so rows are found from z differences. World cups come from the tags or gazebo and are
+only compared horizontally, with the targets of the bottom row.
+"""
+import numpy as np
+
+OFF_TABLE = 1
+BELOW_TABLE = 2
+OVERLAP = 4
+UNSUPPORTED = 8
+NO_CLEARANCE = 16
+REASONS = ((OFF_TABLE, "off the table"), (BELOW_TABLE, "below the table"), (OVERLAP, "overlaps a cup"),
+           (UNSUPPORTED, "not supported"), (NO_CLEARANCE, "no gripper clearance"))
+
+
+class Feasibility():
+    def __init__(self, radius, height, table_min, table_max, support=None, approach=0.07, gripper_width=0.1, tol=0.002):
+        """
+        Args:
+            radius (float) - cup radius
+            height (float) - distance between two rows of cups
+            table_min (tuple) - (x, y) of the corner of the table top with the lowest coordinates
+            table_max (tuple) - (x, y, z) of the opposite corner, z is the height of the table top
+            support (float) - max horizontal distance of a cup of the row below holding a cup, 2*radius if None
+            approach (float) - length of the gripper approach in front of a cup (-x)
+            gripper_width (float) - width of the open gripper
+            tol (float) - distances closer than this to a limit are accepted
+        """
+        self.radius = radius
+        self.height = height
+        self.table_min = np.array(table_min[:2], dtype=float)
+        self.table_max = np.array(table_max[:2], dtype=float)
+        self.table_top = float(table_max[2])
+        self.support = 2*radius if support is None else support
+        self.approach = approach
+        self.gripper_width = gripper_width
+        self.tol = tol
+
+    @classmethod
+    def from_params(cls, param, tol=0.03, **kwargs):
+        """
+        Geometry of config/scene_objects.yaml, with the tolerance BuildTower adds to the cups.
+
+            Args:
+                param (function) - param(name) returns a scene parameter, ex. rospy.get_param
+                tol (float) - added to the cup radius and height for the rows and the supports
+        """
+        radius = param("radius")
+        t_x, t_y, t_z = param("t_x"), param("t_y"), param("t_z")
+        table_x, table_y, table_z = param("table_x"), param("table_y"), param("table_z")
+        return cls(radius, param("length") + tol, (t_x - table_x/2.0, t_y - table_y/2.0),
+                   (t_x + table_x/2.0, t_y + table_y/2.0, t_z + table_z/2.0), support=2*(radius + tol), **kwargs)
+
+    @staticmethod
+    def describe(code):
+        """ reasons of a check code as text """
+        return ", ".join(text for bit, text in REASONS if code & bit) or "feasible"
+
+    def check(self, targets, placed=(), obstacles=(), base=None):
+        """
+        Check independent candidate targets against the cups already there.
+
+            Args:
+                targets (array (n, 3)) - candidate places
+                placed (array (m, 3)) - cups of the layout already placed, same z convention as the targets
+                obstacles (array (k, 3)) - other cups on the table, compared horizontally with the bottom row
+                base (float) - z of the bottom row, the lowest target or placed cup if None
+            Returns:
+                codes (array (n,) of uint8) - 0 if feasible, else the OR of the failed checks
+        """
+        targets = np.asarray(targets, dtype=float).reshape(-1, 3)
+        placed = np.asarray(placed, dtype=float).reshape(-1, 3)
+        if base is None:
+            base = min(targets[:, 2].min(initial=np.inf), placed[:, 2].min(initial=np.inf))
+        codes = self._table(targets)
+        codes |= self._neighbors(targets, placed, np.ones((len(targets), len(placed)), dtype=bool))
+        codes |= self._supports(targets, placed, np.ones((len(targets), len(placed)), dtype=bool), base)
+        codes |= self._obstacles(targets, obstacles, base)
+        return codes
+
+    def check_layout(self, slots, obstacles=()):
+        """
+        Check every cup of a layout in build order, each one against the world cups and the
+        cups of the layout placed before it.
+
+            Args:
+                slots (array (n, 3)) - place positions in build order, ex. TowerPlan.as_lists()[0]
+                obstacles (array (k, 3)) - cups on the table besides the layout
+            Returns:
+                codes (array (n,) of uint8) - 0 if feasible, else the OR of the failed checks
+        """
+        slots = np.asarray(slots, dtype=float).reshape(-1, 3)
+        before = np.tri(len(slots), k=-1, dtype=bool)   # before[i, j]: j is placed before i
+        base = slots[:, 2].min(initial=0.0)
+        codes = self._table(slots)
+        codes |= self._neighbors(slots, slots, before)
+        codes |= self._supports(slots, slots, before, base)
+        codes |= self._obstacles(slots, obstacles, base)
+        # two cups of the layout at the same place overlap whichever comes first
+        codes |= np.where((self._overlaps(slots, slots) & before.T).any(axis=1), OVERLAP, 0).astype(np.uint8)
+        return codes
+
+    def feasible(self, targets, placed=(), obstacles=(), base=None):
+        """ boolean mask of the targets passing every check """
+        return self.check(targets, placed, obstacles, base) == 0
+
+    def _table(self, targets):
+        xy = targets[:, :2]
+        inside = ((xy - self.radius >= self.table_min - self.tol) & (xy + self.radius <= self.table_max + self.tol)).all(axis=1)
+        codes = np.where(inside, 0, OFF_TABLE).astype(np.uint8)
+        codes |= np.where(targets[:, 2] < self.table_top - self.tol, BELOW_TABLE, 0).astype(np.uint8)
+        return codes
+
+    def _overlaps(self, a, b):
+        """ (n, m) cups of a and b of the same row whose footprints intersect """
+        d = a[:, None, :] - b[None, :, :]
+        same_row = np.abs(d[..., 2]) < self.height/2.0
+        return same_row & (np.hypot(d[..., 0], d[..., 1]) < 2*self.radius - self.tol)
+
+    def _neighbors(self, targets, placed, mask):
+        """ overlap with placed cups and gripper clearance, mask (n, m) selects the placed cups of each target """
+        d = placed[None, :, :] - targets[:, None, :]
+        overlap = (self._overlaps(targets, placed) & mask).any(axis=1)
+        # cups of the same row or above in the box swept by the gripper before it reaches the cup
+        in_box = (d[..., 0] < 0) & (d[..., 0] > -(self.approach + 2*self.radius)) \
+            & (np.abs(d[..., 1]) < self.gripper_width/2.0 + self.radius) & (d[..., 2] > -self.height/2.0)
+        blocked = (in_box & mask).any(axis=1)
+        return (np.where(overlap, OVERLAP, 0) | np.where(blocked & ~overlap, NO_CLEARANCE, 0)).astype(np.uint8)
+
+    def _supports(self, targets, placed, mask, base):
+        """ a cup above the bottom row needs cups of the row below around its center """
+        d = placed[None, :, :] - targets[:, None, :]
+        below = mask & (d[..., 2] < -self.height/2.0) & (d[..., 2] > -1.5*self.height) \
+            & (np.hypot(d[..., 0], d[..., 1]) < self.support - self.tol)
+        count = below.sum(axis=1)
+        # center of the holding cups, it has to be under the cup
+        center = (below[..., None]*d[..., :2]).sum(axis=1)/np.maximum(count, 1)[:, None]
+        held = (count > 0) & (np.hypot(center[:, 0], center[:, 1]) < self.radius)
+        upper = targets[:, 2] - base > self.height/2.0
+        return np.where(upper & ~held, UNSUPPORTED, 0).astype(np.uint8)
+
+    def _obstacles(self, targets, obstacles, base):
+        """ world cups: horizontal overlap and clearance of the bottom row targets """
+        obstacles = np.asarray(obstacles, dtype=float).reshape(-1, 3)
+        if not len(obstacles):
+            return np.zeros(len(targets), dtype=np.uint8)
+        flat = obstacles.copy()
+        flat[:, 2] = base
+        bottom = targets[:, 2] - base <= self.height/2.0
+        level = targets.copy()
+        level[:, 2] = base
+        mask = np.broadcast_to(bottom[:, None], (len(targets), len(flat)))
+        return self._neighbors(level, flat, mask)
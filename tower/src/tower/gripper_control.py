@@ -0,0 +1,209 @@
+"""
+Non-blocking commands of the Baxter grippers.
+
+Every command returns a Future resolved from the gripper feedback: the gripper stopped moving at
+the commanded position, or holds an object for a close. Commands of one gripper run in order,
+the two grippers run in parallel, so both can open while the arms move:
+
+    grippers = GripperController({"left_gripper": left, "right_gripper": right})
+    opening = grippers.open("both")     # pre-open during the approach
+    ... execute the approach ...
+    opening.result()
+    grippers.close("left_gripper").result()
+
+FakeGripper has the baxter_interface.Gripper interface for running without a robot.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+import rospy
+
+OPEN = 100.0
+CLOSED = 0.0
+
+
+def gather(futures):
+    """ a Future resolved when all futures are, with the list of their results """
+    futures = list(futures)
+    combined = Future()
+    if not futures:
+        combined.set_result([])
+        return combined
+    lock = threading.Lock()
+    remaining = [len(futures)]
+
+    def done(future):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            try:
+                combined.set_result([f.result() for f in futures])
+            except Exception as e:
+                combined.set_exception(e)
+
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
+
+
+class GripperController():
+    def __init__(self, grippers, timeout=2.0, tol=5.0, period=0.01, tracer=None):
+        """
+        Args:
+            grippers (dict) - hand ("left_gripper", "right_gripper") --> baxter_interface.Gripper
+            timeout (float) - max seconds a command waits for the gripper feedback
+            tol (float) - position tolerance (0-100)
+            period (float) - polling period of the gripper state
+            tracer (Tracer) - records every command as a "wait" span, None to skip
+        """
+        self.grippers = grippers
+        self.timeout = timeout
+        self.tol = tol
+        self.period = period
+        self.tracer = tracer
+        # one thread per gripper keeps its commands in order
+        self.executors = {hand: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"gripper_{hand}")
+                          for hand in grippers}
+        self.waits = []     # (label, seconds, success)
+
+    def hands(self, hand):
+        """ hands of "both", a hand name or a list of them """
+        if hand == "both":
+            return list(self.grippers)
+        if isinstance(hand, str):
+            return [hand]
+        return list(hand)
+
+    def _submit(self, hand, label, send, position, grip=False):
+        futures = [self.executors[h].submit(self._run, h, f"{h} {label}", send, position, grip)
+                   for h in self.hands(hand)]
+        return futures[0] if len(futures) == 1 else gather(futures)
+
+    def _run(self, hand, label, send, position, grip):
+        gripper = self.grippers[hand]
+        start = time.time()
+        send(gripper)
+        success = self._wait(gripper, position, grip, start)
+        end = time.time()
+        elapsed = end - start
+        self.waits.append((label, elapsed, success))
+        if self.tracer is not None:
+            self.tracer.record("wait", start, end, label, success=success)
+        if success:
+            rospy.logdebug(f"{label} done in {elapsed:.3f} s")
+        else:
+            rospy.logwarn(f"{label} timed out after {elapsed:.3f} s")
+        return success
+
+    def _wait(self, gripper, position, grip, start):
+        """
+        Poll until the gripper stopped at position, or holds an object if grip, False after timeout.
+        The state read right after a non-blocking command can be the one before it, so a command
+        only resolves on the position it asked for (a gripper holding a cup still grips before a release).
+        """
+        while not rospy.is_shutdown():
+            if not gripper.moving():
+                if (grip and gripper.gripping()) or abs(gripper.position() - position) <= self.tol:
+                    return True
+            if time.time() - start >= self.timeout:
+                return False
+            time.sleep(self.period)
+        return False
+
+    def open(self, hand):
+        """ open a gripper ("left_gripper", "right_gripper" or "both"), returns a Future of the success """
+        return self._submit(hand, "open", lambda g: g.open(block=False), OPEN)
+
+    def close(self, hand):
+        """ close a gripper, resolved once it holds the cup or is fully closed """
+        return self._submit(hand, "close", lambda g: g.close(block=False), CLOSED, grip=True)
+
+    def command(self, hand, position, label="command"):
+        """ move a gripper to position (0 closed - 100 open) """
+        return self._submit(hand, label, lambda g: g.command_position(position, block=False), position)
+
+    def release(self, hand, position=55.0):
+        """ open a gripper just enough to let the cup go """
+        return self.command(hand, position, "release")
+
+    def summary(self):
+        """ return {label: (count, total seconds, max seconds, timeouts)} of the commands """
+        stats = {}
+        for label, seconds, success in list(self.waits):
+            count, total, worst, timeouts = stats.get(label, (0, 0.0, 0.0, 0))
+            stats[label] = (count + 1, total + seconds, max(worst, seconds), timeouts + (not success))
+        return stats
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
+
+
+class FakeGripper():
+    """ baxter_interface.Gripper moving at a constant speed, optionally stopped by an object """
+    def __init__(self, side="left", speed=400.0, obj=None, clock=time.time):
+        """
+        Args:
+            side (str) - left or right
+            speed (float) - position change per second (0-100 range)
+            obj (float) - position at which a closing gripper stops on an object, nothing to grip if None
+            clock (function) - returns the current time in seconds
+        """
+        self.side = side
+        self.speed = speed
+        self.obj = obj
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.start = OPEN
+        self.target = OPEN
+        self.stamp = clock()
+        self.commands = []      # (time, target)
+        self.is_calibrated = True
+
+    def _position(self, now):
+        travel = self.speed*(now - self.stamp)
+        if self.target < self.start:
+            return max(self.target, self.start - travel)
+        return min(self.target, self.start + travel)
+
+    def _command(self, target, block, timeout=5.0):
+        with self.lock:
+            now = self.clock()
+            self.start = self._position(now)
+            if self.obj is not None and target < self.obj <= self.start:
+                target = self.obj
+            self.target = target
+            self.stamp = now
+            self.commands.append((now, target))
+        if block:
+            end = time.time() + timeout
+            while self.moving() and time.time() < end:
+                time.sleep(0.005)
+        return True
+
+    def position(self):
+        with self.lock:
+            return self._position(self.clock())
+
+    def moving(self):
+        return abs(self.position() - self.target) > 1e-6
+
+    def gripping(self):
+        return self.obj is not None and abs(self.target - self.obj) < 1e-6 and not self.moving()
+
+    def open(self, block=False, timeout=5.0):
+        return self._command(OPEN, block, timeout)
+
+    def close(self, block=False, timeout=5.0):
+        return self._command(CLOSED, block, timeout)
+
+    def command_position(self, position, block=False, timeout=5.0):
+        return self._command(float(position), block, timeout)
+
+    def calibrated(self):
+        return self.is_calibrated
+
+    def calibrate(self, block=True, timeout=2.0):
+        self.is_calibrated = True
+        return True
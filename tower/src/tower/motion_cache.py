@@ -0,0 +1,185 @@
+"""
+Persistent cache of planned trajectories for the pick and place motions that repeat run after run.
+
+Plans are keyed by (move group, bucketed start joint state, goal). They are stored on disk as
+serialized RobotTrajectory messages, checked against the current planning scene before reuse
+and evicted least recently used first.
+"""
+import os
+import json
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+import rospy
+import genpy
+from moveit_msgs.msg import RobotTrajectory, RobotState
+from moveit_msgs.srv import GetStateValidity, GetStateValidityRequest
+
+
+class TrajectoryValidator():
+    """ Checks a trajectory against the current planning scene with /check_state_validity """
+    def __init__(self, service="/check_state_validity", samples=10):
+        """
+        Args:
+            service (str) - state validity service of move_group
+            samples (int) - max number of waypoints checked per trajectory
+        """
+        self.samples = samples
+        self.check = rospy.ServiceProxy(service, GetStateValidity)
+
+    def valid(self, group, plan):
+        """ return True if the sampled waypoints of plan are collision free for group """
+        traj = plan.joint_trajectory
+        n = len(traj.points)
+        if n == 0:
+            return False
+        stride = max(1, n // self.samples)
+        indices = list(range(0, n, stride))
+        if indices[-1] != n - 1:
+            indices.append(n - 1)
+        try:
+            for i in indices:
+                req = GetStateValidityRequest()
+                req.group_name = group
+                req.robot_state = RobotState()
+                req.robot_state.is_diff = True
+                req.robot_state.joint_state.name = traj.joint_names
+                req.robot_state.joint_state.position = traj.points[i].positions
+                if not self.check(req).valid:
+                    return False
+        except rospy.ServiceException as e:
+            rospy.logwarn(f"TrajectoryValidator check failed: {e}")
+            return False
+        return True
+
+
+class MotionCache():
+    def __init__(self, path="~/.ros/tower_motion_cache", capacity=256, bucket=0.02, validator=None):
+        """
+        Args:
+            path (str) - directory holding the cached trajectories
+            capacity (int) - max number of trajectories kept
+            bucket (float) - size (rad) of the start joint state buckets
+            validator (TrajectoryValidator) - checks a plan before it is reused, None to skip
+        """
+        self.path = os.path.expanduser(path)
+        self.capacity = capacity
+        self.bucket = bucket
+        self.validator = validator
+        self.hits = 0
+        self.misses = 0
+        # both arm pipelines may use the cache at the same time
+        self.lock = threading.RLock()
+
+        os.makedirs(self.path, exist_ok=True)
+        self.index_file = os.path.join(self.path, "index.json")
+        self.entries = OrderedDict()   # key hash --> key, least recently used first
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file) as f:
+                    for h, key in json.load(f):
+                        if os.path.exists(self._file(h)):
+                            self.entries[h] = key
+            except (ValueError, OSError) as e:
+                rospy.logwarn(f"MotionCache index unreadable, starting empty: {e}")
+
+    def _file(self, h):
+        return os.path.join(self.path, h + ".traj")
+
+    def _save_index(self):
+        tmp = self.index_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(list(self.entries.items()), f)
+        os.replace(tmp, self.index_file)
+
+    def key(self, group, start_joints, goal):
+        """
+        Return the (hash, key) of a motion.
+
+            Args:
+                group (str) - move group name
+                start_joints (list of float) - current joint values of the group
+                goal (Pose or list of float) - pose goal of the end effector or joint goal
+        """
+        if hasattr(goal, "position"):
+            goal = [goal.position.x, goal.position.y, goal.position.z,
+                    goal.orientation.x, goal.orientation.y, goal.orientation.z, goal.orientation.w]
+        start = [int(round(j / self.bucket)) for j in start_joints]
+        # goals are rounded to 1 mm / 1 mrad
+        goal = [int(round(g * 1000)) for g in goal]
+        key = [group, start, goal]
+        h = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return h, key
+
+    def get(self, group, start_joints, goal):
+        """
+        Return a cached RobotTrajectory for the motion, None on a miss or if the plan is no longer valid.
+        The first waypoint is moved to start_joints so the plan starts exactly at the current state.
+        """
+        h, key = self.key(group, start_joints, goal)
+        with self.lock:
+            if h not in self.entries:
+                self.misses += 1
+                return None
+            try:
+                plan = RobotTrajectory()
+                with open(self._file(h), "rb") as f:
+                    plan.deserialize(f.read())
+            except (OSError, genpy.DeserializationError) as e:
+                rospy.logwarn(f"MotionCache dropping unreadable entry: {e}")
+                self._remove(h)
+                self.misses += 1
+                return None
+
+        if self.validator is not None and not self.validator.valid(group, plan):
+            rospy.logdebug("MotionCache entry collides with the current scene")
+            with self.lock:
+                self._remove(h)
+                self.misses += 1
+            return None
+
+        if plan.joint_trajectory.points and len(start_joints) == len(plan.joint_trajectory.points[0].positions):
+            plan.joint_trajectory.points[0].positions = list(start_joints)
+        with self.lock:
+            # the recency is saved too, so the next run evicts by the use of this one
+            if h in self.entries and next(reversed(self.entries)) != h:
+                self.entries.move_to_end(h)
+                self._save_index()
+            self.hits += 1
+        return plan
+
+    def put(self, group, start_joints, goal, plan):
+        """ store a planned RobotTrajectory, evicting the least recently used entries """
+        if not plan.joint_trajectory.points:
+            return
+        h, key = self.key(group, start_joints, goal)
+        buff = BytesIO()
+        plan.serialize(buff)
+        with self.lock:
+            with open(self._file(h), "wb") as f:
+                f.write(buff.getvalue())
+            self.entries[h] = key
+            self.entries.move_to_end(h)
+            while len(self.entries) > self.capacity:
+                old, _ = self.entries.popitem(last=False)
+                self._delete(old)
+            self._save_index()
+
+    def _delete(self, h):
+        try:
+            os.remove(self._file(h))
+        except OSError:
+            pass
+
+    def _remove(self, h):
+        self.entries.pop(h, None)
+        self._delete(h)
+        self._save_index()
+
+    def clear(self):
+        with self.lock:
+            for h in list(self.entries):
+                self._delete(h)
+            self.entries.clear()
+            self._save_index()
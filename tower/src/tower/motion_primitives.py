@@ -0,0 +1,277 @@
+"""
+Plans a pick or place as a few continuous, time-parameterized trajectories.
+
+The waypoints between two gripper events (approach and descend, lift and transfer and descend,
+retreat and ready) are planned as one path and retimed with time-optimal trajectory generation,
+so the arm only stops where the gripper has to open or close. Velocity and acceleration are
+scaled so no joint exceeds the Baxter hardware limits in baxter_moveit_config/config/joint_limits_true.yaml.
+"""
+import os
+import copy
+import yaml
+import rospy
+import rospkg
+from collections import namedtuple
+from moveit_msgs.msg import RobotTrajectory, RobotState
+
+# one continuous trajectory, followed by a gripper event ("close", "release", "open" or None)
+Segment = namedtuple("Segment", ["plan", "event"])
+
+
+def load_joint_limits(path):
+    """
+    Read a MoveIt joint_limits yaml file.
+
+        Args:
+            path (str) - yaml file with a joint_limits entry
+        Returns:
+            limits (dict) - joint name --> (max velocity, max acceleration), None where there is no limit
+    """
+    with open(path) as f:
+        return parse_joint_limits(yaml.safe_load(f).get("joint_limits", {}))
+
+
+def parse_joint_limits(entries):
+    """ convert a joint_limits dictionary to joint name --> (max velocity, max acceleration) """
+    limits = {}
+    for joint, entry in entries.items():
+        vel = entry.get("max_velocity") if entry.get("has_velocity_limits") else None
+        acc = entry.get("max_acceleration") if entry.get("has_acceleration_limits") else None
+        limits[joint] = (vel, acc)
+    return limits
+
+
+def scaling_factors(joints, hardware, planning):
+    """
+    Velocity and acceleration scaling factors that keep every joint within its hardware limits
+    when the planner limits are the planning ones.
+
+        Args:
+            joints (list of str) - joints of the move group
+            hardware (dict) - joint --> (max velocity, max acceleration) the robot can follow
+            planning (dict) - joint --> (max velocity, max acceleration) MoveIt times trajectories with
+        Returns:
+            (velocity scaling, acceleration scaling) (tuple of float) - both in (0, 1]
+    """
+    vel, acc = 1.0, 1.0
+    for joint in joints:
+        hw_vel, hw_acc = hardware.get(joint, (None, None))
+        plan_vel, plan_acc = planning.get(joint, (None, None))
+        if hw_vel and plan_vel:
+            vel = min(vel, hw_vel / plan_vel)
+        if hw_acc and plan_acc:
+            acc = min(acc, hw_acc / plan_acc)
+    return vel, acc
+
+
+def stitch(plans):
+    """
+    Join trajectories that follow each other into one, dropping the velocities and accelerations
+    so it can be retimed. The times of each plan are offset to follow the end of the previous one.
+
+        Args:
+            plans (list of RobotTrajectory) - plans of the same joints, each starting where the previous ends
+        Returns:
+            plan (RobotTrajectory) - the joined path
+    """
+    merged = RobotTrajectory()
+    merged.joint_trajectory.joint_names = list(plans[0].joint_trajectory.joint_names)
+    for plan in plans:
+        points = plan.joint_trajectory.points
+        offset = None
+        if merged.joint_trajectory.points and points:
+            # the first point repeats the end of the previous plan
+            offset = merged.joint_trajectory.points[-1].time_from_start - points[0].time_from_start
+            points = points[1:]
+        for p in points:
+            point = copy.deepcopy(p)
+            point.velocities = []
+            point.accelerations = []
+            if offset is not None:
+                point.time_from_start = p.time_from_start + offset
+            merged.joint_trajectory.points.append(point)
+    return merged
+
+
+class MotionPrimitives():
+    def __init__(self, robot, groups, limits_file=None, eef_step=0.01, cache=None):
+        """
+        Args:
+            robot (RobotCommander) - used for the reference state of the retiming
+            groups (dict) - hand ("left_gripper"/"right_gripper") --> MoveGroupCommander of its arm
+            limits_file (str) - hardware joint limits, joint_limits_true.yaml of baxter_moveit_config if None
+            eef_step (float) - cartesian path resolution
+            cache (MotionCache) - reuses retimed plans between runs, None to always plan
+        """
+        self.robot = robot
+        self.groups = groups
+        self.eef_step = eef_step
+        self.cache = cache
+        self.speed = rospy.get_param("motion_speed", 1.0)
+        self.algorithm = rospy.get_param("retime_algorithm", "time_optimal_trajectory_generation")
+
+        if limits_file is None:
+            limits_file = os.path.join(rospkg.RosPack().get_path("baxter_moveit_config"),
+                                       "config", "joint_limits_true.yaml")
+        self.hardware_limits = load_joint_limits(limits_file)
+        # limits move_group plans with, loaded from joint_limits.yaml by planning_context.launch
+        self.planning_limits = parse_joint_limits(rospy.get_param("robot_description_planning/joint_limits", {}))
+
+        self.scaling = {}
+        for hand, group in groups.items():
+            vel, acc = scaling_factors(group.get_active_joints(), self.hardware_limits, self.planning_limits)
+            self.scaling[hand] = (min(1.0, vel * self.speed), min(1.0, acc * self.speed))
+            rospy.logdebug(f"{hand} velocity scaling {self.scaling[hand][0]:.3f}, acceleration scaling {self.scaling[hand][1]:.3f}")
+
+    def _state(self, group, joints):
+        """ RobotState of the current robot with the joints of group set to joints """
+        state = self.robot.get_current_state()
+        names = list(state.joint_state.name)
+        positions = list(state.joint_state.position)
+        for name, value in zip(group.get_active_joints(), joints):
+            if name in names:
+                positions[names.index(name)] = value
+            else:
+                names.append(name)
+                positions.append(value)
+        state.joint_state.name = names
+        state.joint_state.position = positions
+        return state
+
+    def _plan_piece(self, group, start, goals):
+        """ plan goals (all Poses or one joint target) from start, return the RobotTrajectory or None.
+            Several poses are only followed as a cartesian path, a single pose falls back to a joint space plan """
+        state = RobotState()
+        state.is_diff = True
+        state.joint_state.name = group.get_active_joints()
+        state.joint_state.position = list(start)
+        group.set_start_state(state)
+        try:
+            if hasattr(goals[0], "position"):
+                plan, frac = group.compute_cartesian_path(goals, self.eef_step, 0.0)
+                if frac > 0.99:
+                    return plan
+                if len(goals) > 1:
+                    # a joint space plan to the last pose would skip the approach waypoints,
+                    # the caller moves step by step instead
+                    rospy.logdebug(f"cartesian frac = {frac} through {len(goals)} waypoints")
+                    return None
+                rospy.logdebug(f"cartesian frac = {frac}, planning to the pose")
+                group.set_pose_target(goals[0])
+            else:
+                group.set_joint_value_target(goals[0])
+            (result, plan, frac, errCode) = group.plan()
+            if not result:
+                rospy.logerr(f"ERROR segment plan failed, err code = {errCode}")
+                return None
+            return plan
+        finally:
+            group.clear_pose_targets()
+            group.set_start_state_to_current_state()
+
+    def _key_goal(self, goals):
+        flat = []
+        for goal in goals:
+            if hasattr(goal, "position"):
+                flat += [goal.position.x, goal.position.y, goal.position.z,
+                         goal.orientation.x, goal.orientation.y, goal.orientation.z, goal.orientation.w]
+            else:
+                flat += list(goal)
+        return flat
+
+    def plan(self, hand, start, goals):
+        """
+        Plan one continuous trajectory through goals, starting at joint values start.
+        Consecutive poses are followed with a cartesian path, a joint list is a joint space target.
+
+            Args:
+                hand (str) - "left_gripper" or "right_gripper"
+                start (list of float) - joint values of the arm at the start of the motion
+                goals (list of Pose or list of float) - waypoints of the motion
+            Returns:
+                (plan, end) (RobotTrajectory, list of float) - retimed plan and its final joint values,
+                                                                (None, start) if planning failed
+        """
+        group = self.groups[hand]
+        key_goal = self._key_goal(goals)
+        if self.cache is not None:
+            plan = self.cache.get(group.get_name(), start, key_goal)
+            if plan is not None:
+                return plan, list(plan.joint_trajectory.points[-1].positions)
+
+        pieces = []
+        joints = start
+        i = 0
+        while i < len(goals):
+            if hasattr(goals[i], "position"):
+                j = i
+                while j < len(goals) and hasattr(goals[j], "position"):
+                    j += 1
+            else:
+                j = i + 1
+            piece = self._plan_piece(group, joints, goals[i:j])
+            if piece is None or not piece.joint_trajectory.points:
+                return None, start
+            pieces.append(piece)
+            joints = list(piece.joint_trajectory.points[-1].positions)
+            i = j
+
+        plan = self.retime(hand, start, stitch(pieces))
+        if plan is None:
+            return None, start
+        if self.cache is not None:
+            self.cache.put(group.get_name(), start, key_goal, plan)
+        return plan, joints
+
+    def retime(self, hand, start, plan):
+        """ time-parameterize plan within the hardware limits of the arm, None on failure """
+        vel, acc = self.scaling[hand]
+        group = self.groups[hand]
+        try:
+            return group.retime_trajectory(self._state(group, start), plan, vel, acc, algorithm=self.algorithm)
+        except Exception as e:
+            rospy.logerr(f"ERROR retiming failed: {e}")
+            return None
+
+    def pick(self, hand, start, above, pos):
+        """
+        Segments of a pick: approach and descend, close, lift.
+
+            Args:
+                hand (str) - "left_gripper" or "right_gripper"
+                start (list of float) - current joint values of the arm
+                above (Pose) - pose above the cup
+                pos (Pose) - grasp pose
+            Returns:
+                segments (list of Segment) - None if a segment could not be planned
+        """
+        return self.segments(hand, start, [([above, pos], "close"), ([above], None)])
+
+    def place(self, hand, start, lift, above, pos, retreat=None):
+        """
+        Segments of a place: lift, transfer and descend, release, retreat, open.
+
+            Args:
+                hand (str) - "left_gripper" or "right_gripper"
+                start (list of float) - current joint values of the arm
+                lift (Pose) - pose above the current position, None to go straight to above
+                above (Pose) - pose above the place position
+                pos (Pose) - place pose
+                retreat (list of float) - joint target after leaving the tower, None to stay above
+            Returns:
+                segments (list of Segment) - None if a segment could not be planned
+        """
+        transfer = [lift, above, pos] if lift is not None else [above, pos]
+        leave = [above, retreat] if retreat is not None else [above]
+        return self.segments(hand, start, [(transfer, "release"), (leave, "open")])
+
+    def segments(self, hand, start, motions):
+        """ plan every (goals, event) of motions from start, each segment starting where the last ended """
+        result = []
+        joints = start
+        for goals, event in motions:
+            plan, joints = self.plan(hand, joints, goals)
+            if plan is None:
+                return None
+            result.append(Segment(plan, event))
+        return result
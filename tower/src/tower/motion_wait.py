@@ -0,0 +1,126 @@
+"""
+Waits for motions to really be finished instead of sleeping a fixed time.
+
+A MotionMonitor watches /robot/joint_states and returns as soon as the joints of an arm are
+still or a gripper reached its target. Every wait has a timeout
+and its measured duration is recorded so the idle time of a build can be reviewed.
+"""
+import threading
+import time
+import rospy
+from sensor_msgs.msg import JointState
+
+ARM_JOINTS = ["s0", "s1", "e0", "e1", "w0", "w1", "w2"]
+
+
+def arm_joints(hand):
+    """ joint names of the arm of a gripper ("left_gripper" or "right_gripper") """
+    side = hand.split('_')[0]
+    return [side + "_" + j for j in ARM_JOINTS]
+
+
+class MotionMonitor():
+    def __init__(self, topic="/robot/joint_states", velocity_tol=None, timeout=None, hold=None, tracer=None):
+        """
+        Args:
+            topic (str) - joint state topic
+            velocity_tol (float) - rad/s below which a joint is considered still (settle_velocity param)
+            timeout (float) - default max seconds of a wait (settle_timeout param)
+            hold (float) - seconds the joints have to stay still (settle_hold param)
+            tracer (Tracer) - records every wait as a "wait" span, None to skip
+        """
+        self.velocity_tol = rospy.get_param("settle_velocity", 0.02) if velocity_tol is None else velocity_tol
+        self.timeout = rospy.get_param("settle_timeout", 2.0) if timeout is None else timeout
+        self.hold = rospy.get_param("settle_hold", 0.05) if hold is None else hold
+        self.tracer = tracer
+
+        self.cond = threading.Condition()
+        self.velocity = {}
+        self.waits = []   # (label, seconds, success)
+        self.sub = rospy.Subscriber(topic, JointState, self.joint_states_callback, queue_size=1)
+
+    def joint_states_callback(self, msg):
+        with self.cond:
+            for name, vel in zip(msg.name, msg.velocity):
+                self.velocity[name] = vel
+            self.cond.notify_all()
+
+    def _record(self, label, start, success):
+        end = time.time()
+        elapsed = end - start
+        self.waits.append((label, elapsed, success))
+        if self.tracer is not None:
+            self.tracer.record("wait", start, end, label, success=success)
+        if success:
+            rospy.logdebug(f"{label} done in {elapsed:.3f} s")
+        else:
+            rospy.logwarn(f"{label} timed out after {elapsed:.3f} s")
+        return success
+
+    def _still(self, joints):
+        vel = [abs(self.velocity[j]) for j in joints if j in self.velocity]
+        return len(vel) == len(joints) and max(vel) < self.velocity_tol
+
+    def wait_settled(self, hand, label=None, timeout=None):
+        """
+        Block until every joint of the arm moved slower than velocity_tol for hold seconds.
+
+            Args:
+                hand (str) - "left_gripper" or "right_gripper"
+                label (str) - name of the wait in the record
+                timeout (float) - max seconds to wait, default timeout if None
+            Returns:
+                success (bool) - False if the timeout was reached
+        """
+        joints = arm_joints(hand)
+        timeout = self.timeout if timeout is None else timeout
+        label = label or f"{hand} settle"
+        start = time.time()
+        still_since = None
+        with self.cond:
+            while not rospy.is_shutdown():
+                now = time.time()
+                if self._still(joints):
+                    still_since = still_since or now
+                    if now - still_since >= self.hold:
+                        return self._record(label, start, True)
+                else:
+                    still_since = None
+                remaining = start + timeout - now
+                if remaining <= 0:
+                    return self._record(label, start, False)
+                self.cond.wait(min(remaining, self.hold) if still_since else remaining)
+        return False
+
+    def wait_gripper(self, gripper, position=None, tol=5.0, label="gripper", timeout=None, period=0.01):
+        """
+        Block until a gripper stopped moving and either holds an object or reached position.
+
+            Args:
+                gripper (baxter_interface.Gripper) - gripper to watch
+                position (float) - target position (0-100), None to only wait for the motion to end
+                tol (float) - position tolerance
+                label (str) - name of the wait in the record
+                timeout (float) - max seconds to wait, default timeout if None
+                period (float) - polling period of the gripper state
+            Returns:
+                success (bool) - False if the timeout was reached
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.time()
+        while not rospy.is_shutdown():
+            if not gripper.moving():
+                if position is None or gripper.gripping() or abs(gripper.position() - position) <= tol:
+                    return self._record(label, start, True)
+            if time.time() - start >= timeout:
+                return self._record(label, start, False)
+            rospy.sleep(period)
+        return False
+
+    def summary(self):
+        """ return {label: (count, total seconds, max seconds, timeouts)} of the recorded waits """
+        stats = {}
+        for label, seconds, success in self.waits:
+            count, total, worst, timeouts = stats.get(label, (0, 0.0, 0.0, 0))
+            stats[label] = (count + 1, total + seconds, max(worst, seconds), timeouts + (0 if success else 1))
+        return stats
@@ -0,0 +1,147 @@
+"""
+April tag detection on several cameras at once (head and both hand cameras) fused into one
+position per tag.
+
+Every camera has its own RoiTagDetector. The apriltag binding releases the GIL while it runs, so
+the cameras are processed concurrently by a thread pool. Each detection is moved to the base
+frame and fused in a TagTracker with a noise that grows with the distance to the camera and the
+reprojection error of the tag corners, so a close, clean view counts more than a far or skewed one.
+"""
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from tower.roi_detector import RoiTagDetector, tag_pose
+from tower.tag_tracker import TagTracker
+
+
+def project_corners(K, R, t, tag_size):
+    """ pixel corners (lb, rb, rt, lt) of a tag at pose (R, t) in the camera frame """
+    s = tag_size / 2.0
+    obj = np.array([[-s, s, 0], [s, s, 0], [s, -s, 0], [-s, -s, 0]])
+    cam = obj @ R.T + t
+    pix = cam @ K.T
+    return pix[:, :2] / pix[:, 2:]
+
+
+def reprojection_error(corners, K, R, t, tag_size):
+    """ rms distance (pixels) between the detected corners and the corners of the pose """
+    diff = project_corners(K, R, t, tag_size) - corners
+    return float(np.sqrt((diff**2).sum(axis=1).mean()))
+
+
+def detection_noise(t, reprojection, focal, pixel_noise):
+    """
+    Std (m) of a tag position seen at t in the camera frame: the pixel noise plus the reprojection
+    error, scaled by the distance over the focal length.
+    """
+    return float(np.linalg.norm(t)) * (pixel_noise + reprojection) / focal
+
+
+class CameraDetector():
+    """ Tag poses in one camera """
+    def __init__(self, name, K, tag_size=0.0381, detector=None, **detector_args):
+        """
+        Args:
+            name (str) - camera name (ex. head_camera)
+            K (3x3 array) - camera matrix
+            tag_size (float) - side of the black square of the tags (m)
+            detector (RoiTagDetector) - a new one with detector_args if None
+        """
+        self.name = name
+        self.K = np.asarray(K, dtype=float)
+        self.tag_size = tag_size
+        self.detector = detector or RoiTagDetector(**detector_args)
+
+    def poses(self, gray):
+        """ return [(tag id, R, t, reprojection error)] of the tags in a grayscale frame """
+        poses = []
+        for tag_id, corners in self.detector.detect(gray).items():
+            pose = tag_pose(corners, self.K, self.tag_size)
+            if pose is None:
+                continue
+            R, t = pose
+            poses.append((tag_id, R, t, reprojection_error(corners, self.K, R, t, self.tag_size)))
+        return poses
+
+
+class MultiCameraFusion():
+    def __init__(self, cameras, lookup, tracker=None, pixel_noise=0.5, max_reprojection=3.0):
+        """
+        Args:
+            cameras (list of CameraDetector) - one per camera
+            lookup (function) - (camera frame, stamp) --> (R, t) of the camera in the base frame,
+                                None if unknown
+            tracker (TagTracker) - fused tag positions in the base frame
+            pixel_noise (float) - std of a corner (pixels)
+            max_reprojection (float) - detections with a larger reprojection error (pixels) are dropped
+        """
+        self.cameras = {c.name: c for c in cameras}
+        self.lookup = lookup
+        self.tracker = tracker or TagTracker(late=0.1)
+        self.pixel_noise = pixel_noise
+        self.max_reprojection = max_reprojection
+        self.executor = ThreadPoolExecutor(max_workers=len(self.cameras), thread_name_prefix="tag_detection")
+        self.busy = {name: False for name in self.cameras}
+        self.lock = threading.Lock()
+        self.orientations = {}   # tag id --> rotation in the base frame of the best recent detection
+        self.stats = {name: {"frames": 0, "dropped": 0, "detections": 0} for name in self.cameras}
+
+    def submit(self, camera, gray, frame, stamp, done=None):
+        """
+        Queue a frame of a camera on the pool. A frame arriving while the previous frame of the same
+        camera is still processed is dropped, the pool only works on the latest frames.
+
+            Args:
+                camera (str) - camera name
+                gray (2d uint8 array) - frame
+                frame (str) - TF frame of the camera image
+                stamp (float) - time of the frame
+                done (function) - called with the list of updated tag ids once the frame is fused
+            Returns:
+                future (Future) - None if the frame was dropped
+        """
+        with self.lock:
+            if self.busy[camera]:
+                self.stats[camera]["dropped"] += 1
+                return None
+            self.busy[camera] = True
+        return self.executor.submit(self._process, camera, gray, frame, stamp, done)
+
+    def _process(self, camera, gray, frame, stamp, done):
+        try:
+            updated = self.process(camera, gray, frame, stamp)
+        finally:
+            with self.lock:
+                self.busy[camera] = False
+        if done is not None:
+            done(updated)
+        return updated
+
+    def process(self, camera, gray, frame, stamp):
+        """ detect the tags of one frame and fuse them, returns the updated tag ids """
+        cam = self.cameras[camera]
+        self.stats[camera]["frames"] += 1
+        poses = cam.poses(gray)
+        if not poses:
+            return []
+        base = self.lookup(frame, stamp)
+        if base is None:
+            return []
+        R_base, t_base = base
+
+        updated = []
+        for tag_id, R, t, reprojection in poses:
+            if reprojection > self.max_reprojection:
+                continue
+            noise = detection_noise(t, reprojection, cam.K[0, 0], self.pixel_noise)
+            xyz = R_base @ t + t_base
+            if self.tracker.update(tag_id, tuple(xyz), stamp, noise):
+                best = self.orientations.get(tag_id)
+                if best is None or noise <= best[1] or stamp - best[2] > 1.0:
+                    self.orientations[tag_id] = (R_base @ R, noise, stamp)
+                updated.append(tag_id)
+        self.stats[camera]["detections"] += len(updated)
+        return updated
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,133 @@
+"""
+Speculative planning of the next motion of an arm while its current motion executes.
+
+When a motion starts executing its end state is known: the last point of its trajectory. The
+planning of the next motion is started right away from that state in a background thread. At the
+handoff, the speculative plan is used if it was made for the same inputs (the key, ex. the step and
+the cup position of the current world snapshot) and the arm really ended where it was predicted to.
+Otherwise it is dropped and the motion is planned again from the current state.
+
+    speculative = SpeculativePlanner("left_gripper")
+    speculative.speculate(("place", 3), end_joints, lambda start: primitives.place(hand, start, ...))
+    ... execute the current motion ...
+    segments = speculative.take(("place", 3), current_joints, lambda start: primitives.place(hand, start, ...))
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import rospy
+
+
+def end_joints(segments):
+    """ joint values at the end of the last segment, None if there are none """
+    if not segments or not segments[-1].plan.joint_trajectory.points:
+        return None
+    return list(segments[-1].plan.joint_trajectory.points[-1].positions)
+
+
+class SpeculativePlanner():
+    def __init__(self, name, tolerance=0.02):
+        """
+        Args:
+            name (str) - arm the motions are planned for, used in the logs
+            tolerance (float) - max joint difference (rad) between the predicted and the actual start
+        """
+        self.name = name
+        self.tolerance = tolerance
+        # one planning thread per arm, the move group of an arm plans one motion at a time
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"speculate_{name}")
+        self.lock = threading.Lock()
+        self.pending = None     # (key, predicted start, future)
+        self.stats = {"hits": 0, "stale": 0, "moved": 0, "failed": 0, "missed": 0, "hidden": 0.0, "waited": 0.0}
+
+    def speculate(self, key, start, plan):
+        """
+        Start planning the next motion in the background.
+
+            Args:
+                key (hashable) - inputs of the motion besides the start state, compared at the handoff
+                start (list of float) - predicted joint values at the start of the motion
+                plan (function) - plan(start) returns the planned motion or None
+        """
+        if start is None:
+            return
+        with self.lock:
+            self._drop()
+
+            def run():
+                t0 = time.time()
+                return plan(start), time.time() - t0
+
+            self.pending = (key, list(start), self.executor.submit(run))
+
+    def _drop(self):
+        """ forget the pending speculation, waiting for it if it already plans (the move group is busy) """
+        if self.pending is None:
+            return
+        future = self.pending[2]
+        self.pending = None
+        if not future.cancel():
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def take(self, key, current, plan):
+        """
+        The motion for key starting at the current joint values, from the speculation if it is still valid.
+
+            Args:
+                key (hashable) - inputs of the motion besides the start state
+                current (list of float) - joint values of the arm now
+                plan (function) - plan(start) returns the planned motion or None
+            Returns:
+                motion - what plan returned
+        """
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending is not None:
+            pending_key, predicted, future = pending
+            reason = None
+            if pending_key != key:
+                reason = "stale"
+            elif max(abs(a - b) for a, b in zip(predicted, current)) > self.tolerance:
+                reason = "moved"
+            if reason is None:
+                t0 = time.time()
+                try:
+                    motion, planning = future.result()
+                except Exception as e:
+                    rospy.logwarn(f"{self.name} speculative planning failed: {e}")
+                    motion, planning = None, 0.0
+                waited = time.time() - t0
+                if motion is not None:
+                    with self.lock:
+                        self.stats["hits"] += 1
+                        self.stats["hidden"] += max(0.0, planning - waited)
+                        self.stats["waited"] += waited
+                    return motion
+                reason = "failed"
+            else:
+                if not future.cancel():
+                    try:
+                        future.result()
+                    except Exception:
+                        pass
+            rospy.logdebug(f"{self.name} speculative plan dropped ({reason}), planning again")
+            with self.lock:
+                self.stats[reason] += 1
+        else:
+            with self.lock:
+                self.stats["missed"] += 1
+        return plan(current)
+
+    def summary_text(self):
+        s = self.stats
+        return (f"{self.name}: {s['hits']} speculative plans used, {s['stale']} stale, {s['moved']} moved, "
+                f"{s['failed']} failed, {s['missed']} not speculated, {s['hidden']:.2f} s planning hidden, "
+                f"{s['waited']:.2f} s waited at handoff")
+
+    def shutdown(self):
+        with self.lock:
+            self._drop()
+        self.executor.shutdown(wait=False)
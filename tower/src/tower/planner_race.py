@@ -0,0 +1,215 @@
+"""
+Planning front end racing several planner configurations on the same MotionPlanRequest.
+
+Each configuration (planner id, attempts, planning time, planning service) is sent to move_group's
+/plan_kinematic_path concurrently from a thread pool. The first valid plan wins, or the shortest one
+found before the deadline. Configurations that have not started when the race is decided are
+cancelled and the results of the others are dropped. Every configuration keeps its success rate,
+planning time and plan duration, and select() ranks them so the race runs the best ones.
+
+    race = PlannerRace(PlannerRace.load_configs(rospy.get_param("planner_configs", None)))
+    trajectory = race.plan(group.construct_motion_plan_request(), deadline=5.0)
+"""
+import os
+import json
+import copy
+import time
+import threading
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+import rospy
+from moveit_msgs.msg import MoveItErrorCodes
+from moveit_msgs.srv import GetMotionPlan
+
+# default race: a fast bidirectional planner, the MoveIt default and a parallel attempt of each
+DEFAULT_CONFIGS = [{"planner_id": "RRTConnectkConfigDefault", "attempts": 1, "time": 2.0},
+                   {"planner_id": "RRTConnectkConfigDefault", "attempts": 4, "time": 2.0},
+                   {"planner_id": "", "attempts": 1, "time": 5.0},
+                   {"planner_id": "ESTkConfigDefault", "attempts": 2, "time": 3.0}]
+
+
+def config_name(config):
+    """ readable key of a planner configuration """
+    return f"{config.get('planner_id') or 'default'}x{config.get('attempts', 1)}@{config.get('service', '/plan_kinematic_path')}"
+
+
+def trajectory_duration(trajectory):
+    """ seconds from the first to the last point of a RobotTrajectory """
+    points = trajectory.joint_trajectory.points
+    if not points:
+        return 0.0
+    return points[-1].time_from_start.to_sec()
+
+
+def trajectory_length(trajectory):
+    """ sum of the joint space distances between consecutive points (rad) """
+    points = trajectory.joint_trajectory.points
+    length = 0.0
+    for a, b in zip(points, points[1:]):
+        length += sum((qa - qb)**2 for qa, qb in zip(a.positions, b.positions))**0.5
+    return length
+
+
+class PlannerStats():
+    """ Success rate, planning time and plan quality of every configuration """
+    def __init__(self, path=None, failure_cost=10.0):
+        """
+        Args:
+            path (str) - json file the statistics are kept in between runs, not saved if None
+            failure_cost (float) - seconds a failed plan costs (fallback planning, retries) when ranking
+        """
+        self.path = path
+        self.failure_cost = failure_cost
+        self.lock = threading.Lock()
+        self.stats = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.stats = json.load(f)
+
+    def entry(self, name):
+        return self.stats.setdefault(name, {"runs": 0, "successes": 0, "wins": 0, "cancelled": 0,
+                                            "planning_time": 0.0, "duration": 0.0, "length": 0.0})
+
+    def record(self, name, success, planning_time, duration=0.0, length=0.0):
+        with self.lock:
+            s = self.entry(name)
+            s["runs"] += 1
+            s["planning_time"] += planning_time
+            if success:
+                s["successes"] += 1
+                s["duration"] += duration
+                s["length"] += length
+
+    def count(self, name, key):
+        with self.lock:
+            self.entry(name)[key] += 1
+
+    def score(self, name):
+        """
+        Mean seconds a run costs: planning time plus the duration of the plan, a failure counted as
+        failure_cost. Lower is better, configurations that never ran score 0 so each one is tried once.
+        """
+        s = self.stats.get(name)
+        if s is None or s["runs"] == 0:
+            return 0.0
+        failures = s["runs"] - s["successes"]
+        return (s["planning_time"] + s["duration"] + failures*self.failure_cost) / s["runs"]
+
+    def save(self):
+        if self.path is None:
+            return
+        with self.lock:
+            data = json.dumps(self.stats, indent=2)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w") as f:
+            f.write(data)
+
+    def summary_text(self):
+        """ one line per configuration, best score first """
+        lines = []
+        for name in sorted(self.stats, key=self.score):
+            s = self.stats[name]
+            ok = s["successes"]
+            lines.append(f"{name}: {ok}/{s['runs']} ok, {s['wins']} wins, "
+                         f"plan {s['planning_time']/max(1, s['runs']):.2f} s, "
+                         f"duration {s['duration']/max(1, ok):.2f} s, score {self.score(name):.2f}")
+        return "\n".join(lines)
+
+
+class PlannerRace():
+    def __init__(self, configs=None, stats=None, max_parallel=None, call=None, recorder=None):
+        """
+        Args:
+            configs (list of dict) - planner configurations {"planner_id", "attempts", "time", "service"}
+            stats (PlannerStats) - statistics of the configurations, kept in memory if None
+            max_parallel (int) - number of configurations raced at once, all if None
+            call (function) - (config, MotionPlanRequest) --> MotionPlanResponse, the planning service if None
+            recorder (Recorder) - records every planning request and its trajectory, nothing recorded if None
+        """
+        self.configs = configs or DEFAULT_CONFIGS
+        self.stats = stats or PlannerStats()
+        self.max_parallel = max_parallel or len(self.configs)
+        self.call = call or self.call_service
+        self.recorder = recorder
+        self.executor = ThreadPoolExecutor(max_workers=len(self.configs), thread_name_prefix="planner")
+        self.local = threading.local()
+
+    @staticmethod
+    def load_configs(param):
+        """ configurations from a parameter (list of dict), DEFAULT_CONFIGS if None """
+        return [dict(c) for c in param] if param else [dict(c) for c in DEFAULT_CONFIGS]
+
+    def call_service(self, config, request):
+        """ plan with the service of the configuration, one proxy per thread and service """
+        service = config.get("service", "/plan_kinematic_path")
+        proxies = self.local.__dict__.setdefault("proxies", {})
+        if service not in proxies:
+            proxies[service] = rospy.ServiceProxy(service, GetMotionPlan, persistent=True)
+        try:
+            return proxies[service](request).motion_plan_response
+        except (rospy.ServiceException, rospy.ROSException) as e:
+            rospy.logwarn(f"planning service {service} failed: {e}")
+            proxies.pop(service, None)
+            return None
+
+    def select(self):
+        """ the max_parallel configurations with the best score """
+        return sorted(self.configs, key=lambda c: self.stats.score(config_name(c)))[:self.max_parallel]
+
+    def _run(self, config, request):
+        req = copy.deepcopy(request)
+        req.planner_id = config.get("planner_id", "")
+        req.num_planning_attempts = config.get("attempts", 1)
+        req.allowed_planning_time = config.get("time", 5.0)
+        start = time.time()
+        response = self.call(config, req)
+        elapsed = time.time() - start
+        success = response is not None and response.error_code.val == MoveItErrorCodes.SUCCESS
+        trajectory = response.trajectory if success else None
+        duration = trajectory_duration(trajectory) if success else 0.0
+        self.stats.record(config_name(config), success, elapsed, duration,
+                          trajectory_length(trajectory) if success else 0.0)
+        if self.recorder is not None:
+            self.recorder.record_plan(req.group_name, config_name(config), success, elapsed, trajectory)
+        return config, trajectory, duration
+
+    def plan(self, request, deadline=5.0, first=True):
+        """
+        Race the selected configurations on a MotionPlanRequest.
+
+            Args:
+                request (MotionPlanRequest) - goals, start state and group (ex. group.construct_motion_plan_request())
+                deadline (float) - seconds to wait for the plans
+                first (bool) - return the first valid plan instead of the shortest before the deadline
+            Returns:
+                trajectory (RobotTrajectory) - None if no configuration found a plan in time
+        """
+        futures = {self.executor.submit(self._run, config, request): config for config in self.select()}
+        best = None
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=deadline):
+                config, trajectory, duration = future.result()
+                if trajectory is None:
+                    continue
+                if best is None or duration < best[2]:
+                    best = (config, trajectory, duration)
+                if first:
+                    break
+        except concurrent.futures.TimeoutError:
+            rospy.logwarn(f"planner race: deadline of {deadline} s reached")
+
+        # configurations still queued are dropped, running ones finish in the background and only update the stats
+        for future, config in futures.items():
+            if future.cancel():
+                self.stats.count(config_name(config), "cancelled")
+        if best is None:
+            return None
+        self.stats.count(config_name(best[0]), "wins")
+        rospy.logdebug(f"planner race won by {config_name(best[0])}, duration {best[2]:.2f} s")
+        return best[1]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.stats.save()
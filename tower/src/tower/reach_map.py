@@ -0,0 +1,252 @@
+"""
+Precomputed reachability and IK seeds of both arms over the table.
+
+The table from scene_objects.yaml is cut into a grid of cells. For every cell and arm the offline
+tool (nodes/build_reach_map) asks move_group for an IK solution of the gripper at the cell center
+with the forward orientation (the one of orientation_forward). The map is stored in a directory:
+
+    grid.json  - origin, step and shape of the grid, orientation, joint names of each arm
+    reach.npy  - uint8 (arm, nx, ny, nz), 0 if unreachable, else the number of reachable cells
+                 in the 3x3x3 neighborhood (1-27), a margin to the edge of the workspace
+    seeds.npy  - float32 (arm, nx, ny, nz, joints), IK solution of each cell, NaN if unreachable
+
+The arrays are opened memory mapped, a lookup reads a few bytes and costs no planning time.
+
+    reach = ReachMap.load("~/.ros/tower_reach_map")
+    if reach.reachable("left_gripper", (0.8, 0.3, -0.07)):
+        seed = reach.seed("left_gripper", (0.8, 0.3, -0.07))
+"""
+import os
+import json
+import numpy as np
+import rospy
+from moveit_msgs.msg import MoveItErrorCodes
+from moveit_msgs.srv import GetPositionIK, GetPositionIKRequest
+from tower.cup_registry import hand_side
+
+ARMS = ("left", "right")
+# quaternion_from_euler(0, 1.5707, 0), the orientation of Handler.orientation_forward
+FORWARD = (0.0, 0.7070787, 0.0, 0.7071348)
+
+
+def table_grid(params, step=0.05, height=0.45, margin=0.0):
+    """
+    Grid over the table of scene_objects.yaml, from the table top up to height.
+
+        Args:
+            params (dict) - scene parameters (t_x, t_y, t_z, table_x, table_y, table_z)
+            step (float) - size of a cell (m)
+            height (float) - height of the grid above the table top (m)
+            margin (float) - extra distance added around the table (m)
+        Returns:
+            origin (tuple) - (x, y, z) center of the first cell
+            shape (tuple) - (nx, ny, nz) number of cells
+    """
+    size = (params["table_x"] + 2*margin, params["table_y"] + 2*margin, height)
+    low = (params["t_x"] - size[0]/2.0, params["t_y"] - size[1]/2.0, params["t_z"] + params["table_z"]/2.0)
+    shape = tuple(max(1, int(round(s / step)) + 1) for s in size)
+    return tuple(round(l, 4) for l in low), shape
+
+
+def neighborhood_count(solved):
+    """ number of True cells in the 3x3x3 neighborhood of every cell of a boolean (nx, ny, nz) array """
+    padded = np.pad(solved.astype(np.uint8), 1)
+    nx, ny, nz = solved.shape
+    count = np.zeros(solved.shape, dtype=np.uint8)
+    for dx in range(3):
+        for dy in range(3):
+            for dz in range(3):
+                count += padded[dx:dx + nx, dy:dy + ny, dz:dz + nz]
+    return np.where(solved, count, 0).astype(np.uint8)
+
+
+class ReachMap():
+    def __init__(self, origin, step, reach, seeds, joints, orientation=FORWARD):
+        """
+        Args:
+            origin (tuple) - (x, y, z) center of the first cell
+            step (float) - size of a cell (m)
+            reach (ndarray) - uint8 (arm, nx, ny, nz) reachability margin, 0 if unreachable
+            seeds (ndarray) - float32 (arm, nx, ny, nz, joints) IK solutions, NaN if unreachable
+            joints (dict) - arm --> joint names of the seeds
+            orientation (tuple) - (x, y, z, w) gripper orientation the map was computed for
+        """
+        self.origin = np.asarray(origin, dtype=float)
+        self.step = float(step)
+        self.reach = reach
+        self.seeds = seeds
+        self.joints = joints
+        self.orientation = tuple(orientation)
+        self.shape = np.asarray(reach.shape[1:])
+
+    @staticmethod
+    def build(origin, step, shape, solve, joints, orientation=FORWARD, progress=None):
+        """
+        Compute a map cell by cell. The cells are swept in a serpentine order and each one is seeded
+        with the solution of the previous cell, so neighboring cells get neighboring configurations.
+
+            Args:
+                origin (tuple) - (x, y, z) center of the first cell
+                step (float) - size of a cell (m)
+                shape (tuple) - (nx, ny, nz) number of cells
+                solve (function) - (arm, (x, y, z), seed) --> {joint name: position} or None, seed is the
+                                   solution of the previous cell or None
+                joints (dict) - arm --> joint names
+                progress (function) - called with (arm, cells done, cells total)
+            Returns:
+                reach_map (ReachMap)
+        """
+        nx, ny, nz = shape
+        n_joints = max(len(names) for names in joints.values())
+        reach = np.zeros((len(ARMS), nx, ny, nz), dtype=np.uint8)
+        seeds = np.full((len(ARMS), nx, ny, nz, n_joints), np.nan, dtype=np.float32)
+        for a, arm in enumerate(ARMS):
+            seed = None
+            done = 0
+            for k in range(nz):
+                for i in range(nx):
+                    ys = range(ny) if (i + k*nx) % 2 == 0 else range(ny - 1, -1, -1)
+                    for j in ys:
+                        xyz = tuple(np.asarray(origin) + step*np.array((i, j, k)))
+                        solution = solve(arm, xyz, seed)
+                        if solution is not None:
+                            seeds[a, i, j, k, :len(joints[arm])] = [solution[name] for name in joints[arm]]
+                            seed = solution
+                        done += 1
+                    if progress is not None:
+                        progress(arm, done, nx*ny*nz)
+            reach[a] = neighborhood_count(~np.isnan(seeds[a, ..., 0]))
+        return ReachMap(origin, step, reach, seeds, joints, orientation)
+
+    def save(self, path):
+        """ write the map to the directory path """
+        path = os.path.expanduser(path)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "reach.npy"), np.ascontiguousarray(self.reach))
+        np.save(os.path.join(path, "seeds.npy"), np.ascontiguousarray(self.seeds))
+        with open(os.path.join(path, "grid.json"), "w") as f:
+            json.dump({"origin": list(self.origin), "step": self.step, "arms": list(ARMS),
+                       "joints": self.joints, "orientation": list(self.orientation)}, f, indent=2)
+
+    @staticmethod
+    def load(path):
+        """ open a saved map memory mapped, None if there is none at path """
+        path = os.path.expanduser(path)
+        if not os.path.exists(os.path.join(path, "grid.json")):
+            return None
+        with open(os.path.join(path, "grid.json")) as f:
+            grid = json.load(f)
+        reach = np.load(os.path.join(path, "reach.npy"), mmap_mode="r")
+        seeds = np.load(os.path.join(path, "seeds.npy"), mmap_mode="r")
+        return ReachMap(grid["origin"], grid["step"], reach, seeds, grid["joints"], grid["orientation"])
+
+    def covers(self, orientation, tolerance=0.1):
+        """
+        True if the map holds for a gripper orientation, (x, y, z, w) within tolerance (rad) of the
+        orientation it was computed for.
+        """
+        dot = abs(float(np.dot(self.orientation, orientation)))
+        return 2.0*np.arccos(min(1.0, dot)) <= tolerance
+
+    def arm_index(self, hand):
+        """ index of a gripper ("left_gripper") or arm ("left") in the arrays """
+        return ARMS.index(hand_side(hand) or hand)
+
+    def cells(self, xyz):
+        """
+        Return the (n, 3) indices of the nearest cell of (n, 3) positions, and an (n,) mask of the
+        positions inside the grid.
+        """
+        ijk = np.rint((np.asarray(xyz, dtype=float).reshape(-1, 3) - self.origin) / self.step).astype(int)
+        inside = np.all((ijk >= 0) & (ijk < self.shape), axis=1)
+        return np.clip(ijk, 0, self.shape - 1), inside
+
+    def margins(self, hand, xyz):
+        """
+        Reachability margin of one hand at (n, 3) positions: 0 if unreachable, 1-27 the reachable
+        cells around it. Positions outside the grid are unknown and get -1.
+        """
+        ijk, inside = self.cells(xyz)
+        values = np.asarray(self.reach[self.arm_index(hand), ijk[:, 0], ijk[:, 1], ijk[:, 2]], dtype=int)
+        return np.where(inside, values, -1)
+
+    def margin(self, hand, xyz):
+        """ margins() of a single (x, y, z) """
+        return int(self.margins(hand, xyz)[0])
+
+    def reachable(self, hand, xyz):
+        """ False if the map knows the hand cannot reach xyz, True if it can or xyz is outside the map """
+        return self.margin(hand, xyz) != 0
+
+    def best_hand(self, xyz, hands=("left_gripper", "right_gripper")):
+        """ the hand with the largest margin at xyz, None if no hand can reach it """
+        margins = [self.margin(hand, xyz) for hand in hands]
+        best = int(np.argmax(margins))
+        return hands[best] if margins[best] != 0 else None
+
+    def seed(self, hand, xyz):
+        """
+        IK solution of the nearest cell, None if unreachable or outside the map.
+
+            Returns:
+                joints (dict) - joint name --> position
+        """
+        ijk, inside = self.cells(xyz)
+        if not inside[0]:
+            return None
+        arm = self.arm_index(hand)
+        i, j, k = ijk[0]
+        values = self.seeds[arm, i, j, k]
+        if np.isnan(values[0]):
+            return None
+        names = self.joints[ARMS[arm]]
+        return dict(zip(names, (float(v) for v in values[:len(names)])))
+
+
+class IKSolver():
+    """ Seeded IK of one arm with move_group's /compute_ik """
+    def __init__(self, frame="world", service="/compute_ik", timeout=0.05, avoid_collisions=True, wait=5.0):
+        """
+        Args:
+            frame (str) - frame of the positions
+            service (str) - IK service of move_group
+            timeout (float) - seconds the IK solver may take
+            avoid_collisions (bool) - reject solutions colliding with the planning scene
+            wait (float) - seconds to wait for the service, rospy.ROSException if it is not available by then
+        """
+        rospy.wait_for_service(service, timeout=wait)
+        self.frame = frame
+        self.timeout = timeout
+        self.avoid_collisions = avoid_collisions
+        self.compute_ik = rospy.ServiceProxy(service, GetPositionIK, persistent=True)
+
+    def solve(self, hand, pose, seed=None):
+        """
+        Return the joint positions {name: position} of the arm of hand at pose, None if there is no solution.
+
+            Args:
+                hand (str) - "left_gripper" or "right_gripper"
+                pose (Pose) - gripper pose in frame
+                seed (dict) - joint name --> position to start the solver from
+        """
+        req = GetPositionIKRequest()
+        req.ik_request.group_name = hand_side(hand) + "_arm"
+        req.ik_request.ik_link_name = hand
+        req.ik_request.avoid_collisions = self.avoid_collisions
+        req.ik_request.pose_stamped.header.frame_id = self.frame
+        req.ik_request.pose_stamped.pose = pose
+        req.ik_request.timeout = rospy.Duration(self.timeout)
+        if seed:
+            req.ik_request.robot_state.is_diff = True
+            req.ik_request.robot_state.joint_state.name = list(seed.keys())
+            req.ik_request.robot_state.joint_state.position = list(seed.values())
+        try:
+            res = self.compute_ik(req)
+        except rospy.ServiceException as e:
+            rospy.logwarn(f"IK service failed: {e}")
+            return None
+        if res.error_code.val != MoveItErrorCodes.SUCCESS:
+            return None
+        state = res.solution.joint_state
+        prefix = hand_side(hand) + "_"
+        return {name: p for name, p in zip(state.name, state.position) if name.startswith(prefix)}
@@ -0,0 +1,283 @@
+"""
+Append-only recording of a build run: world snapshots, tag observations, cup assignments, planned
+trajectories, execution timings and outcomes. See tower.replay to run the decision layer again
+on a recording.
+
+Rows are appended to an in-memory buffer per stream (one list append on the control loop). Full
+buffers are converted to columns and written by a background thread, one chunk at a time:
+
+    <run>/meta.json                         - node, parameters and start time of the run
+    <run>/<stream>/index.jsonl              - one line per chunk written, the chunk is complete once listed
+    <run>/<stream>/<chunk>/<column>.npy     - one column of a chunk, memory mapped when read
+    <run>/<stream>/<chunk>/<column>.offsets.npy - row boundaries of a variable length column (trajectories)
+
+    recorder = Recorder.start("~/.ros/tower_runs", meta={"node": "arm_control"})
+    recorder.record("outcome", t=time.time(), step=3, hand="left_gripper", cup="Cup_4", success=True, message="")
+    recorder.close()
+
+    run = RunReader(recorder.path)
+    outcomes = run.table("outcome")     # column --> array
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# columns of the streams recorded by the nodes, other streams take the columns of their first row
+STREAMS = {
+    "world": ("t", "snapshot", "name", "x", "y", "z"),
+    "tags": ("t", "tag", "x", "y", "z"),
+    "assignment": ("t", "snapshot", "step", "kind", "hand", "cup", "grab", "place"),
+    "plan": ("t", "group", "planner", "success", "planning", "duration", "joints", "times", "positions"),
+    "span": ("stage", "name", "start", "end", "tags"),
+    "outcome": ("t", "step", "hand", "cup", "success", "message"),
+}
+# variable length columns of the streams, stored as ragged even in a chunk where every row is None
+RAGGED = {"assignment": ("grab", "place"), "plan": ("times", "positions")}
+
+
+def to_column(values, ragged=False):
+    """
+    Column arrays of a list of row values.
+
+        Args:
+            values (list) - value of every row
+            ragged (bool) - store as a variable length column, whatever the values are
+
+        Returns:
+            (array, None) - numbers, booleans or strings (None is NaN or "")
+            (values, offsets) - sequences, concatenated along their first axis, row i is values[offsets[i]:offsets[i+1]]
+    """
+    sample = next((v for v in values if v is not None), None)
+    if ragged or isinstance(sample, (list, tuple, np.ndarray)):
+        arrays = [np.asarray(v if v is not None else [], dtype=float) for v in values]
+        width = next((a.shape[1:] for a in arrays if a.ndim > 1), ())
+        arrays = [a.reshape((-1,) + width) for a in arrays]
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(a) for a in arrays])
+        return np.concatenate(arrays) if arrays else np.zeros(0), offsets
+    if isinstance(sample, dict):
+        values = [json.dumps(v, default=str) if v is not None else "" for v in values]
+        sample = ""
+    if isinstance(sample, str) or sample is None:
+        return np.array([v if v is not None else "" for v in values], dtype=str), None
+    if isinstance(sample, (bool, np.bool_)):
+        return np.array([bool(v) for v in values]), None
+    if all(isinstance(v, (int, np.integer)) for v in values):
+        return np.array(values, dtype=np.int64), None
+    return np.array([v if v is not None else np.nan for v in values], dtype=float), None
+
+
+class Ragged():
+    """ Variable length column: row i is values[offsets[i]:offsets[i+1]] """
+    def __init__(self, values, offsets):
+        self.values = values
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.values[self.offsets[i]:self.offsets[i+1]]
+
+    @classmethod
+    def empty(cls, rows):
+        """ a column of rows empty sequences """
+        return cls(np.zeros(0), np.zeros(rows + 1, dtype=np.int64))
+
+    @classmethod
+    def concatenate(cls, parts):
+        # chunks without any value have no width, they add no values
+        filled = [p.values for p in parts if len(p.values)]
+        values = np.concatenate(filled) if filled else parts[0].values
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for p in parts:
+            offsets.append(np.asarray(p.offsets[1:]) + base)
+            base += p.offsets[-1]
+        return cls(values, np.concatenate(offsets))
+
+
+class Recorder():
+    def __init__(self, path, chunk_rows=1024, meta=None):
+        """
+        Args:
+            path (str) - directory of the run, created if needed
+            chunk_rows (int) - rows of a stream buffered before they are written
+            meta (dict) - written to meta.json (parameters of the run, ...)
+        """
+        self.path = os.path.abspath(os.path.expanduser(path))
+        os.makedirs(self.path, exist_ok=True)
+        self.chunk_rows = chunk_rows
+        self.lock = threading.Lock()
+        self.buffers = {}   # stream --> list of rows
+        self.columns = {}   # stream --> column names
+        self.chunks = {}    # stream --> number of chunks written or being written
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorder")
+        self.pending = []
+        self.closed = False
+        self.snapshot = 0
+        self.tag_stamps = {}
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(dict(meta or {}, start=time.time()), f, indent=2, default=str)
+
+    @classmethod
+    def start(cls, directory, **kwargs):
+        """ a recorder writing to a new run directory named after the start time """
+        name = time.strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(os.path.expanduser(directory), name)
+        n = 1
+        while os.path.exists(path):
+            n += 1
+            path = os.path.join(os.path.expanduser(directory), f"{name}_{n}")
+        return cls(path, **kwargs)
+
+    def record(self, stream, **row):
+        """ append one row, the missing columns are None """
+        if self.closed:
+            return
+        with self.lock:
+            if stream not in self.buffers:
+                self.buffers[stream] = []
+                self.columns[stream] = STREAMS.get(stream, tuple(row))
+                self.chunks[stream] = 0
+            buffer = self.buffers[stream]
+            buffer.append(tuple(row.get(c) for c in self.columns[stream]))
+            if len(buffer) >= self.chunk_rows:
+                self._submit(stream)
+
+    def _submit(self, stream):
+        """ hand the buffer of a stream to the writer thread, called with the lock held """
+        rows = self.buffers[stream]
+        if not rows:
+            return
+        self.buffers[stream] = []
+        chunk = self.chunks[stream]
+        self.chunks[stream] += 1
+        self.pending = [future for future in self.pending if not future.done()]
+        self.pending.append(self.writer.submit(self._write, stream, chunk, self.columns[stream], rows))
+
+    def _write(self, stream, chunk, columns, rows):
+        directory = os.path.join(self.path, stream, f"{chunk:05d}")
+        os.makedirs(directory, exist_ok=True)
+        kinds = {}
+        ragged = RAGGED.get(stream, ())
+        for c, name in enumerate(columns):
+            values, offsets = to_column([row[c] for row in rows], name in ragged)
+            np.save(os.path.join(directory, name + ".npy"), values)
+            if offsets is not None:
+                np.save(os.path.join(directory, name + ".offsets.npy"), offsets)
+            kinds[name] = "ragged" if offsets is not None else values.dtype.str
+        # the chunk is listed once all its columns are on disk
+        with open(os.path.join(self.path, stream, "index.jsonl"), "a") as f:
+            f.write(json.dumps({"chunk": f"{chunk:05d}", "rows": len(rows), "columns": kinds}) + "\n")
+
+    def flush(self, wait=True):
+        """ write every buffered row """
+        with self.lock:
+            for stream in list(self.buffers):
+                self._submit(stream)
+            pending, self.pending = self.pending, []
+        if wait:
+            for future in pending:
+                future.result()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.writer.shutdown(wait=True)
+
+    # helpers of the streams recorded by the nodes
+
+    def record_world(self, world):
+        """ one WorldState snapshot, returns its snapshot number """
+        with self.lock:
+            self.snapshot += 1
+            snapshot = self.snapshot
+        for name in world.names:
+            x, y, z = world.xyz(name)
+            self.record("world", t=world.stamp, snapshot=snapshot, name=name, x=x, y=y, z=z)
+        return snapshot
+
+    def record_tag(self, tag, xyz, stamp):
+        """ one tag observation, repeated lookups of the same transform are skipped """
+        if self.tag_stamps.get(tag) == stamp:
+            return
+        self.tag_stamps[tag] = stamp
+        self.record("tags", t=stamp, tag=tag, x=xyz[0], y=xyz[1], z=xyz[2])
+
+    def record_plan(self, group, planner, success, planning, trajectory=None):
+        """ one planning request and the RobotTrajectory it returned (None if it failed) """
+        joints, times, positions, duration = "", None, None, 0.0
+        if trajectory is not None:
+            jt = trajectory.joint_trajectory
+            joints = ",".join(jt.joint_names)
+            times = [p.time_from_start.to_sec() for p in jt.points]
+            positions = [list(p.positions) for p in jt.points]
+            duration = times[-1] if times else 0.0
+        self.record("plan", t=time.time(), group=group, planner=planner, success=success, planning=planning,
+                    duration=duration, joints=joints, times=times, positions=positions)
+
+    def record_span(self, stage, name, start, end, tags):
+        """ Tracer listener, every timed span of the run """
+        self.record("span", stage=stage, name=name, start=start, end=end, tags=tags)
+
+
+class RunReader():
+    def __init__(self, path):
+        """
+        Args:
+            path (str) - directory of a recorded run
+        """
+        self.path = os.path.abspath(os.path.expanduser(path))
+        with open(os.path.join(self.path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+    def streams(self):
+        return sorted(name for name in os.listdir(self.path)
+                      if os.path.exists(os.path.join(self.path, name, "index.jsonl")))
+
+    def chunks(self, stream):
+        """ yield every complete chunk of a stream as {column: array or Ragged}, memory mapped """
+        index = os.path.join(self.path, stream, "index.jsonl")
+        if not os.path.exists(index):
+            return
+        with open(index) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        for entry in sorted(entries, key=lambda e: e["chunk"]):
+            directory = os.path.join(self.path, stream, entry["chunk"])
+            chunk = {}
+            for name, kind in entry["columns"].items():
+                values = np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+                if kind == "ragged":
+                    values = Ragged(values, np.load(os.path.join(directory, name + ".offsets.npy"), mmap_mode="r"))
+                chunk[name] = values
+            yield chunk
+
+    def table(self, stream):
+        """ every chunk of a stream concatenated, {} if nothing was recorded """
+        chunks = list(self.chunks(stream))
+        if not chunks:
+            return {}
+        table = {}
+        for name in chunks[0]:
+            parts = [chunk[name] for chunk in chunks]
+            if any(isinstance(p, Ragged) for p in parts):
+                # a sequence column can be plain ""/NaN in a chunk without any sequence (older recordings)
+                parts = [p if isinstance(p, Ragged) else Ragged.empty(len(p)) for p in parts]
+                table[name] = Ragged.concatenate(parts) if len(parts) > 1 else parts[0]
+            else:
+                table[name] = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        return table
+
+    def rows(self, stream):
+        """ yield the rows of a stream as dictionaries """
+        for chunk in self.chunks(stream):
+            names = list(chunk)
+            for i in range(len(chunk[names[0]]) if names else 0):
+                yield {name: (chunk[name][i] if isinstance(chunk[name], Ragged) else chunk[name][i].item())
+                       for name in names}
@@ -0,0 +1,213 @@
+"""
+Offline replay of a build run recorded by tower.recorder. No robot, ROS master, Gazebo or MoveIt
+needed: the recorded world snapshots drive Scene through a ReplayWorld, every recorded cup
+assignment is decided again and compared, the towers are planned again with BuildTower and the
+recorded planning requests rank the planner configurations.
+
+    cd tower/src
+    python3 -m tower.replay ~/.ros/tower_runs/20261018_101500
+    python3 -m tower.replay ~/.ros/tower_runs/20261018_101500 --assigner off --save replay.json
+
+It prints the decisions that differ from the recording, the failed steps with the world they were
+decided on, and the latency of each decision replayed against the recorded one.
+"""
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from tower.recorder import RunReader, Ragged
+from tower.world import MemoryWorld
+from tower.simulator import Scene
+from tower.buildTower import BuildTower
+from tower.planner_race import PlannerStats
+from tower.tracing import percentile
+
+
+class ReplayWorld(MemoryWorld):
+    """ World backend reading the recorded snapshots, seek() selects the one read() returns """
+    def __init__(self, table):
+        """
+        Args:
+            table (dict) - "world" table of a RunReader
+        """
+        self.snapshots = {}     # snapshot --> (stamp, {name: (x, y, z)})
+        if table:
+            for i in range(len(table["snapshot"])):
+                stamp, positions = self.snapshots.setdefault(int(table["snapshot"][i]), (float(table["t"][i]), {}))
+                positions[str(table["name"][i])] = (float(table["x"][i]), float(table["y"][i]), float(table["z"][i]))
+        self.current = min(self.snapshots) if self.snapshots else None
+        super().__init__(self.snapshots[self.current][1] if self.snapshots else {}, clock=self.stamp)
+
+    def stamp(self):
+        return self.snapshots[self.current][0] if self.snapshots else 0.0
+
+    def seek(self, snapshot):
+        """ make the recorded snapshot the current world """
+        self.current = snapshot
+        self.positions = dict(self.snapshots[snapshot][1])
+
+
+class Replay():
+    def __init__(self, path, assigner=None, feasibility=None):
+        """
+        Args:
+            path (str) - directory of a recorded run
+            assigner (AssignmentEngine) - replay the decisions with the optimal assignment, min(x) if None
+            feasibility (Feasibility) - replay the sorting places with the lane feasibility checks
+        """
+        self.run = RunReader(path)
+        self.params = self.run.meta.get("params", {})
+        self.world = ReplayWorld(self.run.table("world"))
+        self.scene = Scene(None, False, world=self.world, params=self.params, assigner=assigner, feasibility=feasibility)
+        self.planner = BuildTower(feasibility=feasibility)
+        self.timings = {}   # decision --> [seconds]
+
+    def timed(self, name, function, *args):
+        t0 = time.perf_counter()
+        result = function(*args)
+        self.timings.setdefault(name, []).append(time.perf_counter() - t0)
+        return result
+
+    def towers(self):
+        """ {build start time: (placePosList, TowerPlan or None)} of every recorded build, planned again """
+        towers = {}
+        for row in self.run.rows("build"):
+            cups = int(row["cups"])
+            if cups == 3:
+                towers[row["t"]] = (self.timed("tower_3_cups", self.planner.tower_3_cups)[0], None)
+            else:
+                plan = self.timed("pyramid", self.planner.pyramid, self.planner.pyramid_rows(cups))
+                towers[row["t"]] = (plan.as_lists()[0], plan)
+        return towers
+
+    def decisions(self):
+        """
+        Decide every recorded assignment again on the snapshot it was made on.
+
+            Returns:
+                decisions (list of dict) - recorded row with the replayed "replay_cup" and "replay_place"
+        """
+        towers = self.towers()
+        starts = sorted(towers)
+        picks = {}      # build start time --> cup of every step, with an assigner
+        decisions = []
+        for row in self.run.rows("assignment"):
+            row = dict(row, grab=tuple(float(v) for v in row["grab"]), place=tuple(float(v) for v in row["place"]))
+            if row["snapshot"] in self.world.snapshots:
+                self.world.seek(row["snapshot"])
+                self.timed("update_world", self.scene.update_world)
+            hand = row["hand"]
+            if row["kind"] == "sort":
+                cup = self.timed("assign_cup", self.scene.assign_cup_st1, hand)
+                place = self.timed("place_next_pos", self.scene.place_next_pos, hand)
+                place = (place.x, place.y)
+            else:
+                built = [t for t in starts if t <= row["t"]]
+                places, plan = towers[built[-1]] if built else ([], None)
+                if self.scene.assigner is not None and plan is not None:
+                    # the cups of the whole tower are assigned on the snapshot of its first step
+                    if built[-1] not in picks:
+                        picks[built[-1]] = self.timed("tower_picks", self.scene.tower_picks, plan)
+                    cup = picks[built[-1]][row["step"]]
+                else:
+                    cup = self.timed("grab_next_cup", self.scene.grab_next_cup, hand)
+                place = tuple(places[row["step"]][:2]) if row["step"] < len(places) else None
+            decisions.append(dict(row, replay_cup=cup, replay_place=place))
+        return decisions
+
+    @staticmethod
+    def differs(decision, tol=1e-3):
+        """ the replayed decision is not the recorded one """
+        if decision["replay_cup"] != decision["cup"]:
+            return True
+        place = decision["replay_place"]
+        return place is None or np.hypot(place[0] - decision["place"][0], place[1] - decision["place"][1]) > tol
+
+    def failures(self):
+        """ recorded steps that failed, with the snapshot their cups were assigned on """
+        assigned = {}   # (step, hand) --> [(time, snapshot)], a step number is reused by every build
+        for row in self.run.rows("assignment"):
+            assigned.setdefault((row["step"], row["hand"]), []).append((row["t"], row["snapshot"]))
+        failures = []
+        for row in self.run.rows("outcome"):
+            if not row["success"]:
+                before = [snapshot for t, snapshot in assigned.get((row["step"], row["hand"]), []) if t <= row["t"]]
+                snapshot = before[-1] if before else None
+                world = self.world.snapshots.get(snapshot, (None, {}))[1]
+                failures.append(dict(row, snapshot=snapshot, world=world))
+        return failures
+
+    def planner_stats(self):
+        """ PlannerStats of the recorded planning requests """
+        stats = PlannerStats()
+        table = self.run.table("plan")
+        for i in range(len(table.get("planner", []))):
+            positions = table["positions"][i] if isinstance(table["positions"], Ragged) else []
+            length = float(np.linalg.norm(np.diff(positions, axis=0), axis=1).sum()) if len(positions) > 1 else 0.0
+            stats.record(str(table["planner"][i]), bool(table["success"][i]), float(table["planning"][i]),
+                         float(table["duration"][i]), length)
+        return stats
+
+    def recorded_latency(self):
+        """ {span name: [seconds]} of the recorded scene spans """
+        table = self.run.table("span")
+        latency = {}
+        for i in range(len(table.get("stage", []))):
+            if table["stage"][i] == "scene":
+                latency.setdefault(str(table["name"][i]), []).append(float(table["end"][i] - table["start"][i]))
+        return latency
+
+    def report(self):
+        decisions = self.decisions()
+        recorded = self.recorded_latency()
+        latency = {}
+        for name, values in self.timings.items():
+            latency[name] = {"n": len(values), "replay_p50": percentile(values, 50), "replay_p95": percentile(values, 95),
+                             "recorded_p50": percentile(recorded.get(name, []), 50)}
+        return {"decisions": len(decisions),
+                "differ": [d for d in decisions if self.differs(d)],
+                "failures": self.failures(),
+                "latency": latency,
+                "planners": self.planner_stats().summary_text()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="replay the decision layer on a recorded build run")
+    parser.add_argument("run", help="directory of the recorded run")
+    parser.add_argument("--assigner", choices=("recorded", "on", "off"), default="recorded",
+                        help="decide with the optimal assignment of both hands or the min(x) rule")
+    parser.add_argument("--feasibility", choices=("recorded", "on", "off"), default="recorded",
+                        help="move the sorting places until they are free")
+    parser.add_argument("--save", help="write the report as json")
+    args = parser.parse_args(argv)
+
+    assigner = feasibility = None
+    meta = RunReader(args.run).meta
+    params = meta.get("params", {})
+    if args.assigner == "on" or (args.assigner == "recorded" and meta.get("optimal_assignment")):
+        from tower.assignment import AssignmentEngine
+        assigner = AssignmentEngine()
+    if args.feasibility == "on" or (args.feasibility == "recorded" and meta.get("feasibility_check")):
+        from tower.feasibility import Feasibility
+        feasibility = Feasibility.from_params(params.get)
+    report = Replay(args.run, assigner, feasibility).report()
+
+    print(f"{report['decisions']} decisions replayed, {len(report['differ'])} differ from the recording")
+    for d in report["differ"]:
+        print(f"  step {d['step']} {d['hand']}: recorded {d['cup']} -> {d['place']}, replayed {d['replay_cup']} -> {d['replay_place']}")
+    for f in report["failures"]:
+        print(f"FAILED step {f['step']} {f['hand']} {f['cup']}: {f['message']} (snapshot {f['snapshot']}: {f['world']})")
+    for name, l in report["latency"].items():
+        recorded = f"{l['recorded_p50']*1000:.3f} ms" if l["recorded_p50"] is not None else "-"
+        print(f"{name:16s} n={l['n']:4d} replay p50 {l['replay_p50']*1000:.3f} ms  p95 {l['replay_p95']*1000:.3f} ms  recorded p50 {recorded}")
+    print(report["planners"])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+April tag detection in the vision node with the apriltag Python binding.
+
+Each frame only small regions of interest around the last known corners of the wanted tags are
+searched at full resolution. Tags that are not tracked yet, or were lost, are looked for with a
+decimated search of the whole frame, at most every full_period frames. The pose of a tag is
+recovered from its four corners and the camera matrix, the same way apriltag_pose does it.
+"""
+import numpy as np
+
+
+def tag_pose(corners, K, tag_size):
+    """
+    Pose of a tag in the camera frame (z forward) from its corners.
+
+        Args:
+            corners (4x2 array) - pixel corners in the order of the binding (lb, rb, rt, lt)
+            K (3x3 array) - camera matrix
+            tag_size (float) - side of the black square (m)
+        Returns:
+            (R, t) (3x3 array, 3 array) - rotation and translation of the tag, None if degenerate
+    """
+    s = tag_size / 2.0
+    obj = np.array([[-s, s], [s, s], [s, -s], [-s, -s]])
+    img = np.linalg.solve(K, np.vstack([np.asarray(corners, dtype=float).T, np.ones(4)]))
+    img = img[:2] / img[2]
+
+    # homography from the tag plane to normalized image coordinates
+    A = np.zeros((8, 9))
+    for i in range(4):
+        X, Y = obj[i]
+        u, v = img[:, i]
+        A[2*i] = [X, Y, 1, 0, 0, 0, -u*X, -u*Y, -u]
+        A[2*i+1] = [0, 0, 0, X, Y, 1, -v*X, -v*Y, -v]
+    H = np.linalg.svd(A)[2][-1].reshape(3, 3)
+
+    n1, n2 = np.linalg.norm(H[:, 0]), np.linalg.norm(H[:, 1])
+    if n1 < 1e-12 or n2 < 1e-12:
+        return None
+    H = H / np.sqrt(n1 * n2)
+    if H[2, 2] < 0:
+        # the tag is in front of the camera
+        H = -H
+    r1, r2, t = H[:, 0], H[:, 1], H[:, 2]
+    U, _, Vt = np.linalg.svd(np.column_stack([r1, r2, np.cross(r1, r2)]))
+    R = U @ Vt
+    if np.linalg.det(R) < 0:
+        R = U @ np.diag([1, 1, -1]) @ Vt
+    return R, t
+
+
+# channel offsets of red, green and blue per sensor_msgs/Image encoding
+CHANNELS = {"bgra8": (4, 2, 1, 0), "bgr8": (3, 2, 1, 0), "rgba8": (4, 0, 1, 2), "rgb8": (3, 0, 1, 2)}
+
+
+def image_to_gray(msg):
+    """
+    Grayscale view of a sensor_msgs/Image (mono8, bgr8, bgra8, rgb8 or rgba8).
+
+        Returns:
+            gray (2d uint8 array) - mono8 images are not copied
+    """
+    data = np.frombuffer(msg.data, dtype=np.uint8).reshape(msg.height, msg.step)
+    if msg.encoding == "mono8":
+        return data[:, :msg.width]
+    n, r, g, b = CHANNELS[msg.encoding]
+    pixels = data[:, :msg.width*n].reshape(msg.height, msg.width, n)
+    # ITU-R 601 luma in fixed point, weights sum to 256
+    rgb = pixels[..., [r, g, b]].astype(np.uint16)
+    gray = (77*rgb[..., 0] + 150*rgb[..., 1] + 29*rgb[..., 2]) >> 8
+    return gray.astype(np.uint8)
+
+
+class RoiTagDetector():
+    def __init__(self, ids=range(1, 11), family="tag36h11", threads=1, roi_scale=2.5, min_roi=40,
+                 full_decimate=2.0, full_period=5):
+        """
+        Args:
+            ids (iterable of int) - tag ids to track (table tag_1, cups tag_2 ... tag_10)
+            family (str) - tag family
+            threads (int) - detector threads
+            roi_scale (float) - side of a region of interest relative to the tag size in pixels
+            min_roi (int) - min side of a region of interest in pixels
+            full_decimate (float) - decimation of the full frame search
+            full_period (int) - frames between two full frame searches while a tag is missing
+        """
+        # the binding is only needed to detect, tag_pose and image_to_gray run without it
+        from apriltag import apriltag
+        self.ids = set(ids)
+        self.ids_array = np.array(sorted(self.ids))
+        self.roi_scale = roi_scale
+        self.min_roi = min_roi
+        self.full_period = full_period
+        self.fine = apriltag(family, threads=threads, decimate=1.0)
+        self.coarse = apriltag(family, threads=threads, decimate=full_decimate)
+
+        self.tracks = {}       # id --> (corners, velocity of the center in pixels per frame)
+        self.frame = 0
+        self.last_full = None
+        self.stats = {"roi": 0, "full": 0, "roi_pixels": 0, "full_pixels": 0}
+
+    def rois(self, shape):
+        """ return [(x0, y0, x1, y1)] search windows around the predicted tag positions """
+        h, w = shape
+        windows = []
+        for corners, velocity in self.tracks.values():
+            c = corners.mean(axis=0) + velocity
+            size = max(self.min_roi, self.roi_scale * np.ptp(corners, axis=0).max())
+            x0, y0 = (c - size/2).astype(int)
+            x1, y1 = (c + size/2).astype(int)
+            x0, y0, x1, y1 = max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+            if x1 - x0 > 8 and y1 - y0 > 8:
+                windows.append((x0, y0, x1, y1))
+        return merge_windows(windows)
+
+    def _found(self, records, x0=0, y0=0):
+        """ {id: corners in the full frame} of the wanted tags in detect_batch records of a window at (x0, y0) """
+        records = records[(records["hamming"] == 0) & np.isin(records["id"], self.ids_array)]
+        return {int(r["id"]): r["lb-rb-rt-lt"] + (x0, y0) for r in records}
+
+    def detect(self, gray):
+        """
+        Detect the wanted tags in a grayscale frame.
+
+            Args:
+                gray (2d uint8 array) - image, rows must be contiguous
+            Returns:
+                found (dict) - tag id --> 4x2 array of pixel corners (lb, rb, rt, lt)
+        """
+        self.frame += 1
+        found = {}
+        windows = self.rois(gray.shape)
+        # slicing keeps the row stride, the windows are not copied and go to the detector in one call
+        records = self.fine.detect_batch([gray[y0:y1, x0:x1] for x0, y0, x1, y1 in windows])
+        for (x0, y0, x1, y1), window_records in zip(windows, records):
+            found.update(self._found(window_records, x0, y0))
+            self.stats["roi"] += 1
+            self.stats["roi_pixels"] += int((x1 - x0) * (y1 - y0))
+
+        missing = self.ids - set(found)
+        if missing and (self.last_full is None or self.frame - self.last_full >= self.full_period):
+            self.last_full = self.frame
+            self.stats["full"] += 1
+            self.stats["full_pixels"] += gray.shape[0] * gray.shape[1]
+            for tag_id, corners in self._found(self.coarse.detect_batch([gray])[0]).items():
+                found.setdefault(tag_id, corners)
+
+        tracks = {}
+        for tag_id, corners in found.items():
+            velocity = np.zeros(2)
+            if tag_id in self.tracks:
+                velocity = corners.mean(axis=0) - self.tracks[tag_id][0].mean(axis=0)
+            tracks[tag_id] = (corners, velocity)
+        self.tracks = tracks
+        return found
+
+
+def merge_windows(windows):
+    """ merge overlapping (x0, y0, x1, y1) windows so no pixel is searched twice """
+    merged = []
+    for w in sorted(windows):
+        for i, m in enumerate(merged):
+            if w[0] < m[2] and m[0] < w[2] and w[1] < m[3] and m[1] < w[3]:
+                merged[i] = (min(w[0], m[0]), min(w[1], m[1]), max(w[2], m[2]), max(w[3], m[3]))
+                break
+        else:
+            merged.append(w)
+    if len(merged) < len(windows):
+        return merge_windows(merged)
+    return merged
@@ -0,0 +1,122 @@
+"""
+Keeps track of the objects in the MoveIt planning scene by listening to the planning scene
+diffs published by move_group, so Scene can wait on an object being added, attached or
+detached without polling get_known_object_names/get_attached_objects.
+"""
+import threading
+from concurrent.futures import Future, TimeoutError
+import rospy
+from moveit_msgs.msg import PlanningScene, PlanningSceneComponents, CollisionObject
+from moveit_msgs.srv import GetPlanningScene
+
+
+class SceneSync():
+    def __init__(self, topic="/move_group/monitored_planning_scene", service="/get_planning_scene"):
+        """ Subscribes to the planning scene diff topic and seeds the object sets with one
+        get_planning_scene call.
+
+            Args:
+                topic (str) - planning scene (diff) topic published by move_group
+                service (str) - service used to read the full scene once at start up
+        """
+        self.lock = threading.Lock()
+        self.known = set()
+        self.attached = set()
+        self.waiters = []   # list of (name, known, attached, Future)
+
+        self.sub = rospy.Subscriber(topic, PlanningScene, self.scene_callback, queue_size=10)
+        self.seed(service)
+
+    def seed(self, service, timeout=2.0):
+        """ read the world object names and attached objects once """
+        try:
+            rospy.wait_for_service(service, timeout=timeout)
+            get_scene = rospy.ServiceProxy(service, GetPlanningScene)
+            components = PlanningSceneComponents(components=PlanningSceneComponents.WORLD_OBJECT_NAMES |
+                                                 PlanningSceneComponents.ROBOT_STATE_ATTACHED_OBJECTS)
+            self.apply(get_scene(components).scene)
+        except (rospy.ROSException, rospy.ServiceException) as e:
+            rospy.logwarn(f"SceneSync could not read the planning scene: {e}")
+
+    def scene_callback(self, msg):
+        self.apply(msg)
+
+    def apply(self, msg):
+        """ update the known and attached object sets from a full scene or a diff """
+        with self.lock:
+            if not msg.is_diff:
+                self.known.clear()
+                self.attached.clear()
+
+            for obj in msg.world.collision_objects:
+                if obj.operation == CollisionObject.REMOVE:
+                    if obj.id == "":
+                        self.known.clear()
+                    else:
+                        self.known.discard(obj.id)
+                else:
+                    self.known.add(obj.id)
+
+            if not msg.robot_state.is_diff and msg.is_diff and msg.robot_state.attached_collision_objects:
+                # a full robot state lists every attached object
+                self.attached.clear()
+            for aco in msg.robot_state.attached_collision_objects:
+                if aco.object.operation == CollisionObject.REMOVE:
+                    if aco.object.id == "":
+                        self.attached.clear()
+                    else:
+                        self.attached.discard(aco.object.id)
+                else:
+                    self.attached.add(aco.object.id)
+                    # attaching an object takes it out of the world
+                    self.known.discard(aco.object.id)
+            self._resolve()
+
+    def _resolve(self):
+        """ resolve every waiter whose object reached its expected state (lock held) """
+        pending = []
+        for waiter in self.waiters:
+            name, known, attached, future = waiter
+            if future.done():
+                continue
+            if self._holds(name, known, attached):
+                future.set_result(True)
+            else:
+                pending.append(waiter)
+        self.waiters = pending
+
+    def _holds(self, name, known, attached):
+        return (name in self.known) == known and (name in self.attached) == attached
+
+    def expect(self, name, known=False, attached=False):
+        """
+        Returns a Future that resolves as soon as the object reaches the expected state.
+
+            Args:
+                name (str) - object name in the planning scene
+                known (bool) - whether the object should be a world object
+                attached (bool) - whether the object should be attached to the robot
+        """
+        future = Future()
+        with self.lock:
+            if self._holds(name, known, attached):
+                future.set_result(True)
+            else:
+                self.waiters.append((name, known, attached, future))
+        return future
+
+    def wait(self, name, known=False, attached=False, timeout=1):
+        """ block until the object reaches the expected state, return False on timeout """
+        future = self.expect(name, known, attached)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            with self.lock:
+                future.cancel()
+            return False
+
+    def mark_known(self, names):
+        """ record objects that were added with a synchronous apply_planning_scene call """
+        with self.lock:
+            self.known.update(names)
+            self._resolve()
@@ -0,0 +1,148 @@
+"""
+Runs the left and right arm pick and place pipelines of a BuildTower plan at the same time.
+
+Each hand works through its own steps in plan order in a thread. A hand only waits when the
+cup it is about to place rests on cups that are not placed yet, or when its place is near the
+tower centerline while the other hand is also placing there.
+"""
+import threading
+import time
+from concurrent.futures import Future
+import rospy
+import actionlib
+from control_msgs.msg import FollowJointTrajectoryAction, FollowJointTrajectoryGoal
+
+
+class ArmExecutor():
+    """ Sends trajectories straight to the Baxter joint trajectory action server of one limb,
+    so both limbs can move at the same time without preempting each other in move_group.
+    """
+    def __init__(self, limb, timeout=5.0):
+        """
+        Args:
+            limb (str) - "left" or "right"
+            timeout (float) - seconds to wait for the action server
+        """
+        self.limb = limb
+        self.client = actionlib.SimpleActionClient(f"robot/limb/{limb}/follow_joint_trajectory",
+                                                   FollowJointTrajectoryAction)
+        if not self.client.wait_for_server(rospy.Duration(timeout)):
+            rospy.logerr(f"ERROR {limb} joint trajectory action server not available")
+
+    def execute(self, plan):
+        """
+        Starts a planned RobotTrajectory and returns immediately.
+
+            Args:
+                plan (RobotTrajectory) - trajectory planned for this limb
+            Returns:
+                future (Future) - resolves to the action result once the motion is done
+        """
+        future = Future()
+        goal = FollowJointTrajectoryGoal()
+        goal.trajectory = plan.joint_trajectory
+        goal.trajectory.header.stamp = rospy.Time(0)
+
+        def done(state, result):
+            future.set_result(result)
+
+        self.client.send_goal(goal, done_cb=done)
+        return future
+
+    def cancel(self):
+        self.client.cancel_all_goals()
+
+
+class DualArmScheduler():
+    def __init__(self, plan, grab, place, centerline=0.1, center_y=0.0):
+        """
+        Args:
+            plan (TowerPlan) - dependency ordered steps from BuildTower
+            grab (function) - grab(step) picks the cup of a step with step.hand and returns when done
+            place (function) - place(step) places the held cup at step.position and returns when done
+            centerline (float) - places closer than this to the tower center line conflict with the other arm
+            center_y (float) - y of the tower center line (BuildTower.centerY)
+        """
+        self.plan = plan
+        self.grab = grab
+        self.place = place
+        self.centerline = centerline
+        self.center_y = center_y
+
+        self.cond = threading.Condition()
+        self.placed = set()
+        self.center_busy = False
+        self.errors = []
+        self.timings = []   # (step index, hand, phase, start, end)
+
+    def conflicts(self, step):
+        """ whether a place needs the centerline workspace for itself """
+        return abs(step.position[1] - self.center_y) < self.centerline
+
+    def _record(self, step, phase, start):
+        with self.cond:
+            self.timings.append((step.index, step.hand, phase, start, time.time()))
+
+    def _wait_for_place(self, step):
+        """ block until the supporting cups are placed and the workspace is free """
+        with self.cond:
+            while not self.errors:
+                ready = all(dep in self.placed for dep in step.depends)
+                if ready and not (self.conflicts(step) and self.center_busy):
+                    if self.conflicts(step):
+                        self.center_busy = True
+                    return True
+                self.cond.wait()
+        return False
+
+    def _done_place(self, step, success):
+        with self.cond:
+            if success:
+                self.placed.add(step.index)
+            if self.conflicts(step):
+                self.center_busy = False
+            self.cond.notify_all()
+
+    def run_hand(self, hand):
+        """ pipeline of one hand: grab, wait for supports, place, for every step of the hand """
+        try:
+            for step in self.plan.hand_steps(hand):
+                start = time.time()
+                self.grab(step)
+                self._record(step, "grab", start)
+
+                start = time.time()
+                if not self._wait_for_place(step):
+                    return
+                self._record(step, "wait", start)
+
+                start = time.time()
+                success = False
+                try:
+                    self.place(step)
+                    success = True
+                finally:
+                    self._done_place(step, success)
+                self._record(step, "place", start)
+        except Exception as e:
+            rospy.logerr(f"ERROR {hand} pipeline failed: {e}")
+            with self.cond:
+                self.errors.append((hand, e))
+                self.cond.notify_all()
+
+    def run(self):
+        """
+        Runs both hands until the plan is built or a pipeline fails.
+
+            Returns:
+                success (bool) - True if every step was placed
+        """
+        threads = [threading.Thread(target=self.run_hand, args=(hand,), daemon=True)
+                   for hand in ("left_gripper", "right_gripper")]
+        start = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        rospy.loginfo(f"built {len(self.placed)}/{len(self.plan)} cups in {time.time() - start:.1f} s")
+        return not self.errors and len(self.placed) == len(self.plan)
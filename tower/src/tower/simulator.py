@@ -2,20 +2,12 @@
 Uses the MoveIt Python API to create a planning scene and perform some path planning tasks
 
 """
-import sys
-import copy
 import rospy
-import moveit_commander
-import moveit_msgs.msg
 import geometry_msgs.msg
-from math import pi
-from std_msgs.msg import String
-from moveit_commander.conversions import pose_to_list
-from moveit_msgs.msg import MoveItErrorCodes
-from gazebo_msgs.srv import GetModelState,SetModelState
 from geometry_msgs.msg import Pose,Point,Twist
-from gazebo_msgs.msg import ModelState
-import tf2_ros
+from types import MappingProxyType
+from tower.cup_registry import CupRegistry, hand_side
+from tower.world import GazeboWorld, TagWorld
 
 
 
@@ -39,47 +31,128 @@ def all_close(goal, actual, tolerance):
     return all_close(goal.pose, actual.pose, tolerance)
 
   elif type(goal) is geometry_msgs.msg.Pose:
+    from moveit_commander.conversions import pose_to_list
     return all_close(pose_to_list(goal), pose_to_list(actual), tolerance)
 
   return True
 
+class WorldState():
+    """ Immutable snapshot of the cup and table positions at one instant.
+
+    Every query made during one decision step should read from the same snapshot so
+    the scene is fetched once per step instead of once per cup.
+    """
+    __slots__ = ("_positions", "stamp")
+
+    def __init__(self, positions, stamp):
+        """
+        Args:
+            positions (dict) - model name --> (x, y, z) in the base frame
+            stamp (float) - time (rospy.get_time) at which the positions were read
+        """
+        object.__setattr__(self, "_positions", MappingProxyType(dict(positions)))
+        object.__setattr__(self, "stamp", stamp)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("WorldState is immutable")
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    @property
+    def names(self):
+        """ names of all models in the snapshot """
+        return tuple(self._positions.keys())
+
+    def xyz(self, name):
+        """ return the (x, y, z) tuple of a model, (0, 0, 0) if unknown """
+        return self._positions.get(name, (0.0, 0.0, 0.0))
+
+    def position(self, name):
+        """ return a new Point of a model so callers are free to modify it """
+        x, y, z = self.xyz(name)
+        return Point(x, y, z)
+
+    def age(self):
+        """ seconds since the snapshot was taken """
+        return rospy.get_time() - self.stamp
+
+
 class Scene():
-    def __init__(self,myscene,REAL_ROBOT):
+    def __init__(self,myscene,REAL_ROBOT, world=None, params=None, reach=None, assigner=None, feasibility=None,
+                 recorder=None):
         """ Initiates a `PlanningSceneInterface`_ object.  This object is an interface
         to the world surrounding the robot. Object geometry variables are assigned from yaml file
         and the object postions are assigned from gazebo or computer vision (april tag locations)
+
+            Args:
+                myscene (PlanningSceneInterface) - None to run without MoveIt (no add/attach/detach)
+                REAL_ROBOT (bool) - read the april tags instead of gazebo
+                world - world backend (see tower.world), picked from REAL_ROBOT if None
+                params (dict) - scene parameters, read from the parameter server if None
+                reach (ReachMap) - reachability of each hand over the table, every cup is assumed reachable if None
+                assigner (AssignmentEngine) - assigns the cups of both hands together, min(x) of each side if None
+                feasibility (Feasibility) - sorting places are moved along the lane until they are free, not checked if None
+                recorder (Recorder) - records every world snapshot and tag observation, nothing recorded if None
         """
         rospy.loginfo("INIT Scene")
         self.scene = myscene
-        if(REAL_ROBOT):
-            self.gms = self.fake_gms
-            self.sms = self.fake_sms
+        self.params = params
+        self.reach = reach
+        self.assigner = assigner
+        self.feasibility = feasibility
+        self.recorder = recorder
+        self.jobs = None    # (snapshot, {hand: [(cup name, place Point), ...]}) of the sorting assignment
+        if myscene is not None:
+            # MoveIt and Gazebo messages are imported when used, Scene runs on a MemoryWorld without them
+            from tower.scene_sync import SceneSync
+            self.sync = SceneSync()
         else:
-            self.gms = rospy.ServiceProxy("/gazebo/get_model_state",GetModelState)
-            self.sms = rospy.ServiceProxy("/gazebo/set_model_state",SetModelState)
+            self.sync = None
 
+        # OBJECT VARIABLES
+        self.cup_radius = self.param("radius") # cup size
+        self.cup_height = self.param("length")
+        self.table_x = self.param("table_x")
+        self.table_y = self.param("table_y")
+        self.table_z = self.param("table_z")
+        self.table_posx = self.param("t_x")    
+        self.table_posy = self.param("t_y")
+        self.table_posz = self.param("t_z")
 
-        rospy.loginfo("added scene")
 
-        # OBJECT VARIABLES
-        self.cup_radius = rospy.get_param("radius") # cup size
-        self.cup_height = rospy.get_param("length")
-        self.table_x = rospy.get_param("table_x")
-        self.table_y = rospy.get_param("table_y")
-        self.table_z = rospy.get_param("table_z")
-        self.table_posx = rospy.get_param("t_x")    
-        self.table_posy = rospy.get_param("t_y")
-        self.table_posz = rospy.get_param("t_z")
 
+        self.cup_n = self.param("cup_n", 9)
+
+        if world is not None:
+            self.backend = world
+        elif(REAL_ROBOT):
+            self.backend = TagWorld(self.cup_n, max_age=self.param("tag_max_age", 1.0),
+                                    max_std=self.param("tag_max_std", 0.02),
+                                    burst=self.param("tag_burst", 2.0), recorder=recorder)
+        else:
+            self.backend = GazeboWorld()
+        self.gms = self.backend.get_model_state
+        self.sms = self.backend.set_model_state
+        rospy.loginfo("added scene")
 
+        # positions and workspace partitions of the cups, kept in sync with the snapshots
+        self.registry = CupRegistry(["Cup_"+str(i+1) for i in range(self.cup_n)], self.table_y/4.0)
 
-        self.cup_n = 9
-        self.buffer = tf2_ros.Buffer()
-        self.listener = tf2_ros.TransformListener(self.buffer)
+        # world snapshot shared by all queries of one decision step
+        self.world = None
+        self.snapshot = 0   # number of the snapshot in the recording
+        self.world_ttl = self.param("world_ttl", 0.5)
 
-        self.cup_positions = []
-        for i in range(self.cup_n+1):
-            self.cup_positions.append(Pose())
+    def param(self, name, default=KeyError):
+        """ read a scene parameter from params or the parameter server """
+        if self.params is None:
+            if default is KeyError:
+                return rospy.get_param(name)
+            return rospy.get_param(name, default)
+        if default is KeyError:
+            return self.params[name]
+        return self.params.get(name, default)
 
 
     # Functions that add objects to scene
@@ -125,10 +198,48 @@ class Scene():
         self.scene.add_cylinder(name,cylinder_pose,self.cup_height,self.cup_radius)
         return self.wait_for_state_update(object_name=name,box_is_known=True, timeout=1)
 
+    def add_cups(self, positions):
+        """Adds several cups to the planning scene with one apply_planning_scene call
+        Args:
+            positions (dict): cup name --> Point of the cup
+        Returns:
+            True or False (bool): whether the planning scene accepted the update
+        """
+        from moveit_msgs.msg import PlanningScene, CollisionObject
+        from shape_msgs.msg import SolidPrimitive
+        scene_diff = PlanningScene()
+        scene_diff.is_diff = True
+        scene_diff.robot_state.is_diff = True
+        for name, position in positions.items():
+            cylinder = CollisionObject()
+            cylinder.id = name
+            cylinder.header.frame_id = 'world'
+            cylinder.operation = CollisionObject.ADD
+            primitive = SolidPrimitive()
+            primitive.type = SolidPrimitive.CYLINDER
+            primitive.dimensions = [self.cup_height, self.cup_radius]
+            pose = Pose()
+            pose.orientation.w = 1.0
+            pose.position.x = position.x
+            pose.position.y = position.y
+            pose.position.z = position.z
+            cylinder.primitives.append(primitive)
+            cylinder.primitive_poses.append(pose)
+            scene_diff.world.collision_objects.append(cylinder)
+
+        # apply_planning_scene is a service call, the objects exist once it returns
+        success = self.scene.apply_planning_scene(scene_diff)
+        if success:
+            self.sync.mark_known(positions.keys())
+        else:
+            rospy.logerr("ERROR in add_cups apply_planning_scene failed")
+        return success
+
     
 
     def restart_scene_workStation(self):
         """Restarts gazebo scene """
+        from gazebo_msgs.msg import ModelState
         pose = Pose()
         twist = Twist()
         pose.position = Point(1,0.0,0.3)
@@ -144,6 +255,7 @@ class Scene():
 
     def restart_scene_inline(self):
         """restarts gazebo scene """
+        from gazebo_msgs.msg import ModelState
         pose = Pose()
         twist = Twist()
         pose.position = Point(0.8,0.8,0.1)
@@ -162,19 +274,21 @@ class Scene():
         """Creates scene at moveIt with 3 cups at the table
         """
 
+        world = self.update_world()
+        cups = {}
         for i in range(self.cup_n):
             cup_name = "Cup_"+str(i+1)
-            cupPos = self.gms(cup_name,"base").pose
-            self.add_cup(cup_name,cupPos.position)
+            cups[cup_name] = world.position(cup_name)
+        self.add_cups(cups)
 
         table = self.gms("Table","base")
         self.add_table("Table",table.pose.position)
-        ModelState("Table",table.pose,Twist(),"base")
     
     def set_table_posistion(self):
         """Adds table in rviz and gazebo at a position that
         is specifed in scene_objects.yaml
         """
+        from gazebo_msgs.msg import ModelState
         pose = Pose()
         twist = Twist()
         pose.position = Point(self.table_posx,self.table_posy,self.table_posz)
@@ -183,29 +297,12 @@ class Scene():
 
 
     def wait_for_state_update(self, object_name ,box_is_known=False, box_is_attached=False, timeout=1):
-        """Copied from tutorial
-        """
-
-        start = rospy.get_time()
-        seconds = rospy.get_time()
-        while (seconds - start < timeout) and not rospy.is_shutdown():
-            # Test if the box is in attached objects
-            attached_objects = self.scene.get_attached_objects([object_name])
-            is_attached = len(attached_objects.keys()) > 0
-            # Test if the box is in the scene.
-            # Note that attaching the box will remove it from known_objects
-            is_known = object_name in self.scene.get_known_object_names()
-            # Test if we are in the expected state
-            if (box_is_attached == is_attached) and (box_is_known == is_known):
-                return True
-
-            # Sleep so that we give other threads time on the processor
-            rospy.sleep(0.1)
-            seconds = rospy.get_time()
-
-        # If we exited the while loop without returning then we timed out
-        return False
-        ## END_SUB_TUTORIAL
+        """Waits until the object reaches the expected state in the planning scene.
+        Resolves as soon as the planning scene diff reporting the change arrives.
+        Returns:
+            True or False (bool): False if timeout seconds passed first
+        """
+        return self.sync.wait(object_name, known=box_is_known, attached=box_is_attached, timeout=timeout)
 
 
 
@@ -224,7 +321,7 @@ class Scene():
             return 0
         rospy.logdebug("attach : "+str(cup_name))
         # get a list of known objects in scene
-        known_object_list = self.scene.get_known_object_names()
+        known_object_list = list(self.sync.known)
         if cup_name not in known_object_list:
             rospy.logerr("Object %s does not exist in the scene", cup_name)
             rospy.logerr(known_object_list)
@@ -234,6 +331,7 @@ class Scene():
         # rospy.logerr(touch_links)
         
         self.scene.attach_mesh(ee_link, cup_name, touch_links = touch_links)   # attach mesh is a moveit commander function
+        self.registry.grabbed(cup_name)
 
 
         #wait for planning scene to update
@@ -251,62 +349,40 @@ class Scene():
             return 0
         rospy.logdebug("detach :"+str(cup_name))
         self.scene.remove_attached_object(ee_link, name=cup_name)
+        self.registry.placed(cup_name)
 
         # We wait for the planning scene to update.
         return self.wait_for_state_update(cup_name,box_is_known=True, box_is_attached=False, timeout=timeout)
 
 
-    def fake_sms(self, ModelState):
-        pass
-
-    def fake_gms(self, name,base):
-        pos = Pose()
-        if(name=="Table"):
-            tagPos = self.listen_tag(1)
-            pos.position.x= tagPos[0]
-            pos.position.y= tagPos[1]
-            pos.position.z= tagPos[2]
-            rospy.loginfo(f"table tag = {tagPos}")
-        else:
-            id = int(name[-1])+1
-            tagPos = self.listen_tag(id)
-            pos.position.x= tagPos[0]
-            pos.position.y= tagPos[1]
-            pos.position.z= tagPos[2]
-
-        if(name=="Table"):
-            list_id = 0
-        else:
-            list_id = int(name[-1])
-
-                
-        if(pos.position.x !=0 and pos.position.y !=0 and pos.position.z !=0 ):
-            self.cup_positions[list_id].position.x = pos.position.x
-            self.cup_positions[list_id].position.y = pos.position.y
-            self.cup_positions[list_id].position.z = pos.position.z
+    def model_names(self):
+        """ names of every model that is part of a world snapshot """
+        return ["Cup_"+str(i+1) for i in range(self.cup_n)] + ["Table"]
 
-        return ModelState(name,self.cup_positions[list_id],Twist(), "base")
-        # return ModelState(name,pos,Twist(), "base")
-
-    def listen_tag(self, i):
-        """ 
-        Listens to the most recent end_effector's position with respect to the base_link. 
+    def update_world(self):
         """
-        try:
-            name = "tag_" + str(i)
-            trans = self.buffer.lookup_transform('base', name, rospy.Time())
-            # rospy.loginfo(f"{trans}")
-            tagX = trans.transform.translation.x
-            tagY = trans.transform.translation.y
-            tagZ = trans.transform.translation.z
-            # rospy.loginfo(f"({tagX}, {tagY}, {tagZ})")
-            return (tagX, tagY, tagZ)
-        except (tf2_ros.LookupException, tf2_ros.ConnectivityException, tf2_ros.ExtrapolationException):
-            rospy.logerr(f"ERROR in listen_tag no lookup_transform found for {i}! ")
-            return (0, 0, 0)
-
-
+        Reads every cup and the table in a single bulk read and stores it as the current snapshot.
+        In simulation the latest /gazebo/model_states message is used, on the real robot all
+        tags are looked up in one pass over the TF buffer.
 
+            Returns:
+                world (WorldState) - the new snapshot
+        """
+        positions = self.backend.read(self.model_names())
+        self.world = WorldState(positions, self.backend.now())
+        self.registry.sync(self.world)
+        if self.recorder is not None:
+            self.snapshot = self.recorder.record_world(self.world)
+        return self.world
+
+    def world_state(self):
+        """
+        Returns the current snapshot, taking a new one if there is none or it is
+        older than world_ttl seconds.
+        """
+        if self.world is None or self.backend.now() - self.world.stamp > self.world_ttl:
+            return self.update_world()
+        return self.world
 
     def cups_sorted(self):
         """
@@ -317,14 +393,24 @@ class Scene():
         for i in range(self.cup_n):
             cups_list.append("Cup_"+str(i+1))
 
+        world = self.world_state()
         for cup in cups_list:
-            position = self.get_cup_position(cup)
-            y_pos = position.y
+            y_pos = world.xyz(cup)[1]
             # if the cup is in the middle two quadrants of the table
             if y_pos < self.table_y/4 and y_pos > -1*self.table_y/4:
                 return False
         return True
 
+    def reachable(self, hand, xyz):
+        """ False if the reachability map knows hand cannot get to the (x, y, z) position """
+        return self.reach is None or self.reach.reachable(hand, xyz)
+
+    def accept_for(self, hand):
+        """ filter of the cups a hand can reach, None without a reachability map """
+        if self.reach is None:
+            return None
+        return lambda xyz: self.reach.reachable(hand, xyz)
+
     def assign_cup_st1(self,hand):
         """
         This function sorts cups that are randomly placed in the middle
@@ -334,15 +420,21 @@ class Scene():
         Return the position of a cup that should be grabed from hand arm
         left_hand arm gets y>0 
         right_hand arm gets y<0
-        priority is given to cup with min(x)
+        priority is given to cup with min(x), cups the hand cannot reach are skipped
+        with an assigner, the first cup of the hand in the assignment of all cups is returned
         """
-        dictio_left,dictio_right = self.create_dictionary("InWorkspace")
-        if(hand=="left_gripper") and not len(dictio_left) == 0:
-            cup_name = self.get_min_of_dict(dictio_left)
-
-        elif(hand=="right_gripper") and not len(dictio_right) == 0:
-            cup_name = self.get_min_of_dict(dictio_right)
-        else:
+        if self.assigner is not None:
+            jobs = self.sorting_jobs().get(hand)
+            if not jobs:
+                rospy.logerr("ERROR in assing_cup_st1 no cup assigned to hand!")
+                return "Cup_0"
+            return jobs[0][0]
+        self.world_state()
+        side = hand_side(hand)
+        cup_name = None
+        if side is not None:
+            cup_name = self.registry.min_x("InWorkspace", side, self.accept_for(hand))
+        if cup_name is None:
             rospy.logerr("ERROR in assing_cup_st1 no hand recognised!")
             return "Cup_0"
         return cup_name
@@ -358,8 +450,11 @@ class Scene():
             cup.position.y = 0
             cup.position.z = 0
             return cup.position
-        cup = self.gms(name,"base")
-        return cup.pose.position
+        world = self.world_state()
+        if name not in world and name in self.registry.index:
+            # not seen recently, use the last position the registry knows
+            return self.registry.position(name)
+        return world.position(name)
 
 
 
@@ -370,26 +465,9 @@ class Scene():
             Arg: 
                 workspace --> InWorkspace or OutWorkspace choose to populate the list with cups that are in sorted WS or not
         """
-        dictio_left = {}
-        dictio_right = {}
-
-        # get only sorted cups & split  left right lists
-        condition = self.table_y/4.0
-        for i in range(self.cup_n):
-            k = i + 1
-            cup_name = "Cup_"+str(k)
-            cup_pos = self.gms(cup_name,"base").pose.position
-            if(workspace=="OutWorkspace"):
-                if(cup_pos.y>condition):
-                    dictio_left[cup_name] = cup_pos
-                elif(cup_pos.y<-1*condition):
-                    dictio_right[cup_name]=cup_pos
-            elif(workspace=="InWorkspace"):
-                if cup_pos.y < condition and cup_pos.y > -1*condition:
-                    if(cup_pos.y>0):
-                        dictio_left[cup_name] = cup_pos
-                    elif(cup_pos.y<0):
-                        dictio_right[cup_name] = cup_pos
+        self.world_state()
+        dictio_left = self.registry.partition_dict(workspace, "left")
+        dictio_right = self.registry.partition_dict(workspace, "right")
 
         #sort list with min(x) being the first
         return dictio_left,dictio_right
@@ -399,13 +477,12 @@ class Scene():
         """
         Return the cup_name  of the next cup that should be grabed from the sorting workspace
         """
-        dictio_left,dictio_right = self.create_dictionary("OutWorkspace")
-        if hand=="left_gripper" and not len(dictio_left)==0:
-            cup_name = self.get_min_of_dict(dictio_left)
-
-        elif hand=="right_gripper" and not len(dictio_right)==0:
-            cup_name = self.get_min_of_dict(dictio_right)
-        else:
+        self.world_state()
+        side = hand_side(hand)
+        cup_name = None
+        if side is not None:
+            cup_name = self.registry.min_x("OutWorkspace", side, self.accept_for(hand))
+        if cup_name is None:
             rospy.logerr("ERROR in grab_next_pos no hand recognised!")
             return "Cup_0"
         return cup_name
@@ -414,41 +491,125 @@ class Scene():
         """
         Returns the position of the next cup that will be placed at the sorting workspace
         """
-        dictio_left,dictio_right = self.create_dictionary("OutWorkspace")
+        if self.assigner is not None and self.sorting_jobs().get(hand):
+            return self.sorting_jobs()[hand][0][1]
+        self.world_state()
+        side = hand_side(hand)
 
         #handle expeption of first cup
-        if(hand=="left_gripper" and len(dictio_left)==0):
+        if(side=="left" and self.registry.count("OutWorkspace", side)==0):
             pos = Pose().position
             pos.x = 1.0
             pos.y = self.table_y/4.0 +0.2
             pos.z = self.table_posz + self.cup_height*2
-            return pos
+            return self.free_lane_place(pos)
 
-        if(hand=="right_gripper" and len(dictio_right)==0):
+        if(side=="right" and self.registry.count("OutWorkspace", side)==0):
             pos = Pose().position
             pos.x = 1.0
             pos.y = -1*self.table_y/4.0 - 0.2
             pos.z = self.table_posz + self.cup_height*2
-            return pos
+            return self.free_lane_place(pos)
 
-        if(hand=="left_gripper"):
-            diction = dictio_left
-            
-        elif(hand=="right_gripper"):
-            diction = dictio_right
-        else:
+        if side is None:
             rospy.logerr("ERROR in place_pos no hand recognised!")
             return Pose().position
 
-        cup_name = self.get_min_of_dict(diction)
-        pos = diction[cup_name]
+        cup_name = self.registry.min_x("OutWorkspace", side)
+        pos = self.registry.position(cup_name)
         pos.x = pos.x - self.cup_radius*1.2
-        return pos
+        return self.free_lane_place(pos)
+
+    def free_lane_place(self, pos, cups=(), candidates=8):
+        """
+        First place along the sorting lane, from pos towards -x, that is free of the cups on the table.
+        All candidates are checked in one batch, pos is returned unchanged without a feasibility check.
+
+            Args:
+                pos (Point) - place the lane would use
+                cups (list of (x,y,z)) - places taken besides the cups of the registry
+                candidates (int) - number of places tried, cup_radius*1.2 apart
+            Returns:
+                place (Point)
+        """
+        if self.feasibility is None:
+            return pos
+        step = self.cup_radius*1.2
+        targets = [(pos.x - step*k, pos.y, pos.z) for k in range(candidates)]
+        free = self.feasibility.feasible(targets, obstacles=self.registry.resting() + list(cups))
+        if not free.any():
+            rospy.logwarn(f"no free sorting place after {pos.x:.3f}, {pos.y:.3f}")
+            return pos
+        k = int(free.argmax())
+        return Point(targets[k][0], pos.y, pos.z)
+
+    def lane_slots(self, hand, n):
+        """
+        The next n places of the sorting lane of a hand, in the order place_next_pos gives them.
+
+            Returns:
+                slots (list of Point)
+        """
+        side = hand_side(hand)
+        if self.registry.count("OutWorkspace", side) == 0:
+            y = self.table_y/4.0 + 0.2
+            start = Point(1.0 + self.cup_radius*1.2, y if side == "left" else -y, self.table_posz + self.cup_height*2)
+        else:
+            start = self.registry.position(self.registry.min_x("OutWorkspace", side))
+        if self.feasibility is None:
+            return [Point(start.x - self.cup_radius*1.2*(k + 1), start.y, start.z) for k in range(n)]
+        slots = []
+        for k in range(n):
+            last = slots[-1] if slots else start
+            slots.append(self.free_lane_place(Point(last.x - self.cup_radius*1.2, start.y, start.z),
+                                              [(p.x, p.y, p.z) for p in slots]))
+        return slots
+
+    def sorting_jobs(self):
+        """
+        Assignment of every cup of the sorting workspace to a hand and a place of its lane,
+        computed once per world snapshot.
+
+            Returns:
+                jobs (dict) - hand --> [(cup name, place Point), ...] in execution order
+        """
+        world = self.world_state()
+        if self.jobs is not None and self.jobs[0] is world:
+            return self.jobs[1]
+        names = []
+        for side in ("left", "right"):
+            names += list(self.registry.partition_dict("InWorkspace", side).keys())
+        cups = [tuple(world.xyz(name)) for name in names]
+        lanes = {hand: self.lane_slots(hand, len(names)) for hand in ("left_gripper", "right_gripper")}
+        jobs, makespan = self.assigner.assign_sorting(cups, {hand: [(p.x, p.y, p.z) for p in slots]
+                                                             for hand, slots in lanes.items()})
+        rospy.logdebug(f"sorting assignment of {len(names)} cups, makespan {makespan:.1f} s")
+        jobs = {hand: [(names[c], lanes[hand][s]) for c, s in hand_jobs] for hand, hand_jobs in jobs.items()}
+        self.jobs = (world, jobs)
+        return jobs
+
+    def tower_picks(self, plan):
+        """
+        Cup of every step of a tower plan, taken from the sorted lanes so the build takes the least
+        time for both hands together.
+
+            Args:
+                plan (TowerPlan) - build plan
+            Returns:
+                picks (list of str) - cup name of each step, "Cup_0" if no cup is left for the step
+        """
+        world = self.world_state()
+        names = []
+        for side in ("left", "right"):
+            names += list(self.registry.partition_dict("OutWorkspace", side).keys())
+        picks, makespan = self.assigner.assign_tower(plan, [tuple(world.xyz(name)) for name in names])
+        rospy.loginfo(f"tower assignment of {len(names)} cups, makespan {makespan:.1f} s")
+        return [names[c] if c is not None else "Cup_0" for c in picks]
 
     def get_max_of_dict(self,dictio):
         """ return the maximum key from dictionary based on position.x"""
-        return [k for k,v in dictio.items() if v.x==max([val.x for val in dictio.values()])][0]
+        return max(dictio, key=lambda k: dictio[k].x)
 
     def get_min_of_dict(self,dictio):
         """ return the minimum key from dictionary based on position.x"""
-        return [k for k,v in dictio.items() if v.x==min([val.x for val in dictio.values()])][0]
\ No newline at end of file
+        return min(dictio, key=lambda k: dictio[k].x)
\ No newline at end of file
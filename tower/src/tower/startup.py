@@ -0,0 +1,209 @@
+"""
+Fast startup of the nodes controlling Baxter.
+
+The robot commander, the planning scene interface and both grippers are built at the same time in
+a thread pool instead of one after another. The move groups are only loaded when they are first
+used (or warmed in the background), a gripper that already reports as calibrated is not calibrated
+again, and the readiness of the node is served as a std_srvs/Trigger service.
+
+    startup = robot_startup()
+    robot = startup.get("robot")                # waits for the commander only
+    both_arms_group = startup.groups["both_arms"]  # MoveGroupCommander built on first use
+    ...
+    startup.mark_ready()
+
+Experiment scripts can attach to the long-lived nodes/motion_daemon with attach() instead of
+building all of this on every launch.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import rospy
+
+GROUPS = ("both_arms", "left_arm", "right_arm")
+GRIPPERS = ("left", "right")
+
+
+def start_gripper(side, timeout=1.0, factory=None):
+    """
+    A Baxter gripper, calibrated only if it does not already report as calibrated.
+
+        Args:
+            side (str) - left or right
+            timeout (float) - max seconds of the calibration
+            factory (function) - factory(side) returns the gripper, baxter_interface.Gripper if None
+        Returns:
+            Gripper
+    """
+    if factory is None:
+        from baxter_interface import Gripper
+        factory = Gripper
+    gripper = factory(side)
+    if gripper.calibrated():
+        rospy.logdebug(f"{side} gripper already calibrated")
+    else:
+        gripper.calibrate(timeout=timeout)
+    return gripper
+
+
+class LazyResource():
+    """ Object built on first attribute access, every other attribute is forwarded to it """
+    def __init__(self, name, build, startup=None, warm=False):
+        """
+        Args:
+            name (str) - name in the startup timings
+            build (function) - build() returns the object
+            startup (Startup) - records the build time, and runs the warm build
+            warm (bool) - build it right away in the startup thread pool
+        """
+        self._name = name
+        self._build = build
+        self._startup = startup
+        self._lock = threading.Lock()
+        self._object = None
+        if warm and startup is not None:
+            startup.executor.submit(self.get)
+
+    def loaded(self):
+        return self._object is not None
+
+    def get(self):
+        """ the object, built by the first caller while the others wait """
+        if self._object is None:
+            with self._lock:
+                if self._object is None:
+                    t0 = time.time()
+                    obj = self._build()
+                    if self._startup is not None:
+                        self._startup.timings[self._name] = time.time() - t0
+                    self._object = obj
+        return self._object
+
+    def __getattr__(self, attr):
+        # only called for the attributes the proxy does not have
+        return getattr(self.get(), attr)
+
+
+class Startup():
+    def __init__(self, workers=6):
+        """
+        Args:
+            workers (int) - max resources built at the same time
+        """
+        self.t0 = time.time()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="startup")
+        self.futures = {}
+        self.groups = {}
+        self.timings = {}   # name --> seconds to build
+        self.ready = threading.Event()
+        self.ready_time = None
+        self.service = None
+
+    def submit(self, name, build, *args, **kwargs):
+        """ start building a resource in the background """
+        def run():
+            t0 = time.time()
+            result = build(*args, **kwargs)
+            self.timings[name] = time.time() - t0
+            return result
+        self.futures[name] = self.executor.submit(run)
+        return self.futures[name]
+
+    def lazy(self, name, build, warm=False):
+        """ a move group (or any other resource) built on first use """
+        self.groups[name] = LazyResource(name, build, self, warm)
+        return self.groups[name]
+
+    def get(self, name, timeout=None):
+        """ the resource, waiting for it if it is still being built (build errors are raised here) """
+        if name in self.groups:
+            return self.groups[name].get()
+        return self.futures[name].result(timeout=timeout)
+
+    def wait(self, timeout=None):
+        """ wait for every submitted resource, the lazy ones are not built """
+        for name in list(self.futures):
+            self.get(name, timeout)
+
+    def mark_ready(self):
+        """ the node finished its setup """
+        self.ready_time = time.time() - self.t0
+        self.ready.set()
+        rospy.loginfo(f"ready in {self.ready_time:.2f} s ({self.status_text()})")
+
+    def status_text(self):
+        parts = []
+        for name in self.futures:
+            future = self.futures[name]
+            if not future.done():
+                parts.append(f"{name} loading")
+            elif future.exception() is not None:
+                parts.append(f"{name} failed: {future.exception()}")
+            else:
+                parts.append(f"{name} {self.timings.get(name, 0.0):.2f} s")
+        for name, group in self.groups.items():
+            parts.append(f"{name} {self.timings[name]:.2f} s" if group.loaded() and name in self.timings
+                         else f"{name} not loaded")
+        return ", ".join(parts)
+
+    def serve(self, name="~ready"):
+        """ serve the readiness of the node as a std_srvs/Trigger service """
+        from std_srvs.srv import Trigger, TriggerResponse
+
+        def callback(req):
+            return TriggerResponse(success=self.ready.is_set(), message=self.status_text())
+
+        self.service = rospy.Service(name, Trigger, callback)
+        return self.service
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def robot_startup(groups=GROUPS, grippers=GRIPPERS, warm=False, calibrate_timeout=1.0, robot_description="robot_description"):
+    """
+    The resources of a Handler: commander, planning scene and grippers built concurrently, move groups lazy.
+
+        Args:
+            groups (list of str) - move groups, startup.groups[name]
+            grippers (list of str) - sides of the grippers, startup.get(side + "_gripper")
+            warm (bool) - build the move groups in the background right away instead of on first use
+            calibrate_timeout (float) - max seconds of a gripper calibration
+            robot_description (str) - parameter of the URDF
+        Returns:
+            Startup - with the resources robot and scene
+    """
+    import moveit_commander
+
+    startup = Startup()
+    startup.submit("robot", moveit_commander.RobotCommander, robot_description=robot_description)
+    startup.submit("scene", moveit_commander.PlanningSceneInterface)
+    for side in grippers:
+        startup.submit(f"{side}_gripper", start_gripper, side, calibrate_timeout)
+    for name in groups:
+        startup.lazy(name, lambda name=name: moveit_commander.MoveGroupCommander(name, robot_description=robot_description),
+                     warm=warm)
+    return startup
+
+
+def attach(name="motion_daemon", timeout=None):
+    """
+    Wait for the motion daemon to be ready and return a proxy of its step service.
+
+        Args:
+            name (str) - name of the daemon node
+            timeout (float) - max seconds to wait, forever if None
+        Returns:
+            rospy.ServiceProxy - tower/Step service of the daemon
+    """
+    from std_srvs.srv import Trigger
+    from tower.srv import Step
+
+    end = None if timeout is None else time.time() + timeout
+    rospy.wait_for_service(f"{name}/ready", timeout=timeout)
+    ready = rospy.ServiceProxy(f"{name}/ready", Trigger)
+    while not ready().success:
+        if end is not None and time.time() > end:
+            raise rospy.ROSException(f"{name} not ready after {timeout} s")
+        rospy.sleep(0.1)
+    return rospy.ServiceProxy(f"{name}/step", Step, persistent=True)
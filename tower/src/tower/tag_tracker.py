@@ -0,0 +1,123 @@
+"""
+Filtered april tag positions for the decision layer.
+
+Each tag has a position estimate with a variance, fused from the detections with a Kalman filter
+(random walk model, same noise on every axis). Queries never touch TF: they predict the variance
+to the query time and return the last estimate, so they are O(1), and callers can ask for a
+position that is no older than max_age seconds and no less certain than max_std meters.
+
+    tracker = TagTracker()
+    tracker.update(3, (0.71, 0.12, -0.07), stamp)
+    tracker.position(3, max_age=0.5, max_std=0.01)   # None if stale or uncertain
+"""
+import math
+import time
+import threading
+
+
+class TagTracker():
+    def __init__(self, process_noise=0.01, measurement_noise=0.005, gate=5.0, late=0.0, clock=time.time):
+        """
+        Args:
+            process_noise (float) - std of the random walk of a tag (m/sqrt(s)). Cups stand still
+                                    between moves (a move restarts the track), with 0.01 an estimate
+                                    stays under tag_max_std (0.02) for tag_max_age (1 s) without detections
+            measurement_noise (float) - std of one detection (m)
+            gate (float) - a detection further than gate std from the estimate restarts the
+                           track (the cup was moved) if it is at least as certain as the
+                           estimate, otherwise it is dropped as an outlier
+            late (float) - detections up to late seconds older than the last one are still fused,
+                           for several cameras whose frames arrive out of order
+            clock (function) - returns the current time in seconds, same clock as the stamps
+        """
+        self.q = process_noise**2
+        self.r = measurement_noise**2
+        self.gate = gate
+        self.late = late
+        self.clock = clock
+        self.lock = threading.Lock()
+        # tag id --> (x, y, z, variance, last seen, detections), replaced as a whole so
+        # queries read a consistent tuple without taking the lock
+        self.tracks = {}
+
+    def update(self, tag_id, xyz, stamp, noise=None):
+        """
+        Fuse one detection. Detections more than late seconds older than the last one of the tag
+        are ignored.
+
+            Args:
+                tag_id (int) - tag id
+                xyz (tuple) - detected (x, y, z) position
+                stamp (float) - time of the detection
+                noise (float) - std of this detection, measurement_noise if None
+            Returns:
+                fused (bool) - False if the detection was ignored or dropped
+        """
+        r = self.r if noise is None else noise**2
+        with self.lock:
+            track = self.tracks.get(tag_id)
+            if track is not None and stamp <= track[4] - self.late:
+                return False
+            if track is None:
+                self.tracks[tag_id] = (xyz[0], xyz[1], xyz[2], r, stamp, 1)
+                return True
+
+            # predict, then update every axis with the same gain. A late detection is fused
+            # without prediction and does not move the last seen stamp back
+            p = track[3] + self.q*max(0.0, stamp - track[4])
+            s = p + r
+            d2 = sum((xyz[axis] - track[axis])**2 for axis in range(3))
+            if d2 > self.gate**2 * s:
+                if r > p:
+                    return False
+                self.tracks[tag_id] = (xyz[0], xyz[1], xyz[2], r, stamp, 1)
+                return True
+            k = p / s
+            x, y, z = (track[axis] + k*(xyz[axis] - track[axis]) for axis in range(3))
+            self.tracks[tag_id] = (x, y, z, (1 - k)*p, max(stamp, track[4]), track[5] + 1)
+            return True
+
+    def estimate(self, tag_id, now=None):
+        """
+        Returns:
+            (xyz, std, age) - position, std (m) predicted to now and seconds since the last
+                              detection, None if the tag was never seen
+        """
+        track = self.tracks.get(tag_id)
+        if track is None:
+            return None
+        x, y, z, p, seen, n = track
+        now = self.clock() if now is None else now
+        age = max(0.0, now - seen)
+        return (x, y, z), math.sqrt(p + self.q*age), age
+
+    def position(self, tag_id, max_age=None, max_std=None, now=None):
+        """
+        Position of a tag if it is fresh and certain enough.
+
+            Args:
+                tag_id (int) - tag id
+                max_age (float) - max seconds since the last detection, no limit if None
+                max_std (float) - max std of the estimate (m), no limit if None
+            Returns:
+                xyz (tuple) - filtered (x, y, z), None if unknown, stale or uncertain
+        """
+        estimate = self.estimate(tag_id, now)
+        if estimate is None:
+            return None
+        xyz, std, age = estimate
+        if max_age is not None and age > max_age:
+            return None
+        if max_std is not None and std > max_std:
+            return None
+        return xyz
+
+    def stale(self, tag_ids, max_age=None, max_std=None, now=None):
+        """ return the ids of tag_ids that position() would not answer """
+        now = self.clock() if now is None else now
+        return [i for i in tag_ids if self.position(i, max_age, max_std, now) is None]
+
+    def forget(self, tag_id):
+        """ drop the estimate of a tag """
+        with self.lock:
+            self.tracks.pop(tag_id, None)
@@ -0,0 +1,132 @@
+"""
+Timed spans of the arm_control pipeline (scene queries, planning, execution, gripper actions
+and waits) with an export to Chrome trace / Perfetto JSON and p50/p95 latency summaries.
+
+    tracer = Tracer()
+    with tracer.tags(cup="Cup_3", hand="left_gripper", step=2):
+        with tracer.span("plan", "cartesian"):
+            ...
+    tracer.dump("/tmp/build.json")   # open in chrome://tracing or ui.perfetto.dev
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(values, q):
+    """ q-th percentile (0-100) of values with linear interpolation, None if values is empty """
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100.0
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+class Tracer():
+    def __init__(self, capacity=100000, enabled=True):
+        """
+        Args:
+            capacity (int) - max number of spans kept, the oldest are dropped first
+            enabled (bool) - False turns span() and record() into no-ops
+        """
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.spans = deque(maxlen=capacity)   # (stage, name, start, end, thread id, tags)
+        self.threads = {}                     # thread ident --> (tid, thread name)
+        self.local = threading.local()
+        self.listeners = []                   # listener(stage, name, start, end, tags) of every span, ex. a Recorder
+
+    def _tid(self):
+        ident = threading.get_ident()
+        if ident not in self.threads:
+            self.threads[ident] = (len(self.threads) + 1, threading.current_thread().name)
+        return self.threads[ident][0]
+
+    def current_tags(self):
+        """ tags set by the enclosing tags() blocks of this thread """
+        return getattr(self.local, "tags", {})
+
+    @contextmanager
+    def tags(self, **tags):
+        """ tag every span started in this thread inside the block (cup, hand, step, ...) """
+        outer = self.current_tags()
+        self.local.tags = dict(outer, **tags)
+        try:
+            yield
+        finally:
+            self.local.tags = outer
+
+    @contextmanager
+    def span(self, stage, name=None, **tags):
+        """
+        Time the block as one span.
+
+            Args:
+                stage (str) - pipeline stage the latency is summarized by ("scene", "plan", "execute", ...)
+                name (str) - what ran, stage if None
+                tags - extra tags, added to the current tags()
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(stage, start, time.time(), name, **tags)
+
+    def record(self, stage, start, end, name=None, **tags):
+        """ add a span that was timed elsewhere (start, end in seconds since the epoch) """
+        if not self.enabled:
+            return
+        tags = dict(self.current_tags(), **tags)
+        with self.lock:
+            self.spans.append((stage, name or stage, start, end, self._tid(), tags))
+        for listener in self.listeners:
+            listener(stage, name or stage, start, end, tags)
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+
+    def chrome_trace(self):
+        """ return the spans as a Chrome trace event dictionary """
+        with self.lock:
+            spans = list(self.spans)
+            threads = list(self.threads.values())
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in threads]
+        for stage, name, start, end, tid, tags in spans:
+            events.append({"name": name, "cat": stage, "ph": "X", "pid": pid, "tid": tid,
+                           "ts": start * 1e6, "dur": (end - start) * 1e6,
+                           "args": {k: str(v) for k, v in tags.items()}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path):
+        """ write the Chrome trace JSON to path and return the absolute path """
+        path = os.path.abspath(os.path.expanduser(path))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+    def summary(self):
+        """ return {stage: (count, p50 seconds, p95 seconds, total seconds)} """
+        durations = {}
+        with self.lock:
+            for stage, name, start, end, tid, tags in self.spans:
+                durations.setdefault(stage, []).append(end - start)
+        return {stage: (len(d), percentile(d, 50), percentile(d, 95), sum(d))
+                for stage, d in durations.items()}
+
+    def summary_text(self):
+        """ summary() as one line per stage, slowest total first """
+        stats = sorted(self.summary().items(), key=lambda item: -item[1][3])
+        return "\n".join(f"{stage}: n={count} p50={p50*1000:.1f} ms p95={p95*1000:.1f} ms total={total:.2f} s"
+                         for stage, (count, p50, p95, total) in stats)
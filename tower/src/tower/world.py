@@ -0,0 +1,260 @@
+"""
+World backends of Scene. A backend reads the positions of the cups and the table and can move them.
+
+    GazeboWorld - /gazebo/model_states and the gazebo model state services (simulation)
+    TagWorld - april tag transforms from TF, filtered by a TagTracker (real robot)
+    MemoryWorld - plain dictionary, no ROS master needed (tests and benchmarks)
+
+Every backend implements:
+    read(names) - {name: (x, y, z)} of the given models, read in one pass, models without a
+                  trustworthy position are left out
+    get_model_state(name, base) - ModelState of one model, same as /gazebo/get_model_state
+    set_model_state(state) - move a model, same as /gazebo/set_model_state
+    now() - current time of the backend in seconds
+"""
+import time
+import random
+import rospy
+from geometry_msgs.msg import Pose, Twist
+from tower.tag_tracker import TagTracker
+
+
+def model_state(name, xyz, base="base"):
+    """ gazebo_msgs/ModelState of a model at xyz, gazebo_msgs is only needed once a state is asked for """
+    from gazebo_msgs.msg import ModelState
+    pose = Pose()
+    pose.position.x, pose.position.y, pose.position.z = xyz
+    pose.orientation.w = 1.0
+    return ModelState(name, pose, Twist(), base)
+
+
+class GazeboWorld():
+    """ Positions from the latest /gazebo/model_states message, relative to the baxter model """
+    def __init__(self):
+        from gazebo_msgs.srv import GetModelState, SetModelState
+        from gazebo_msgs.msg import ModelStates
+        self.gms = rospy.ServiceProxy("/gazebo/get_model_state", GetModelState)
+        self.sms = rospy.ServiceProxy("/gazebo/set_model_state", SetModelState)
+        self.model_states = None
+        self.model_states_sub = rospy.Subscriber("/gazebo/model_states", ModelStates,
+                                                 self.model_states_callback, queue_size=1)
+
+    def model_states_callback(self, msg):
+        """ keep the latest /gazebo/model_states message for the next read """
+        self.model_states = msg
+
+    def now(self):
+        return rospy.get_time()
+
+    def get_model_state(self, name, base="base"):
+        return self.gms(name, base)
+
+    def set_model_state(self, state):
+        return self.sms(state)
+
+    def read(self, names):
+        positions = {}
+        msg = self.model_states
+        if msg is None:
+            # no model_states received yet, fall back to one service call per model
+            for name in names:
+                p = self.gms(name, "base").pose.position
+                positions[name] = (p.x, p.y, p.z)
+            return positions
+
+        index = {n: i for i, n in enumerate(msg.name)}
+        origin = (0.0, 0.0, 0.0)
+        if "baxter" in index:
+            base = msg.pose[index["baxter"]].position
+            origin = (base.x, base.y, base.z)
+        for name in names:
+            if name in index:
+                p = msg.pose[index[name]].position
+                positions[name] = (p.x - origin[0], p.y - origin[1], p.z - origin[2])
+        return positions
+
+
+class TagWorld():
+    """
+    Positions of the april tags in TF. The table uses tag_1 and Cup_<n> uses tag_<n+1>.
+
+    A timer polls TF and fuses every new tag transform in a TagTracker, reads are answered from
+    the tracker and never wait on TF. read() leaves out the models whose tag was not seen in the
+    last max_age seconds or whose estimate is less certain than max_std.
+
+    Every read() also asks the detection for burst seconds of full rate detection (/request_tags,
+    see tower.detection_scheduler), so cameras are only processed at full rate while the decision
+    layer is reading the tags.
+    """
+    def __init__(self, cup_n, rate=30.0, max_age=1.0, max_std=0.02, tracker=None, burst=2.0, wait=1.0, recorder=None):
+        """
+        Args:
+            cup_n (int) - number of cups
+            rate (float) - TF polling rate (Hz)
+            max_age (float) - max seconds since a tag was last seen for read()
+            max_std (float) - max std of a tag estimate for read() (m)
+            tracker (TagTracker) - filter of the tag positions, a default one if None
+            burst (float) - seconds of full rate detection requested by read(), 0 to never request
+            wait (float) - max seconds read() waits for stale tags after waking up the detection
+            recorder (Recorder) - records every tag observation, nothing recorded if None
+        """
+        # TF is only needed on the real robot, the other backends run without it
+        import tf2_ros
+        self.tf2_ros = tf2_ros
+        self.buffer = tf2_ros.Buffer()
+        self.listener = tf2_ros.TransformListener(self.buffer)
+
+        self.tag_ids = list(range(1, cup_n+2))
+        self.max_age = max_age
+        self.max_std = max_std
+        self.tracker = tracker or TagTracker(clock=rospy.get_time)
+        self.recorder = recorder
+        self.timer = rospy.Timer(rospy.Duration(1.0/rate), self.poll)
+
+        self.burst = burst
+        self.wait = wait
+        self.burst_requested = None
+        self.request_tags = None
+
+    def now(self):
+        return rospy.get_time()
+
+    def get_model_state(self, name, base="base"):
+        return model_state(name, self.read_tag_position(name))
+
+    def set_model_state(self, state):
+        pass
+
+    def request_detection(self, now):
+        """
+        Keep the detection at full rate, at most one request per half burst.
+
+            Returns:
+                woken (bool) - True if the detection was paused or in background before the request
+        """
+        if self.burst <= 0 or (self.burst_requested is not None and now - self.burst_requested < self.burst/2):
+            return False
+        self.burst_requested = now
+        if self.request_tags is None:
+            from tower.srv import RequestTags
+            self.request_tags = rospy.ServiceProxy("/request_tags", RequestTags)
+        try:
+            return self.request_tags(self.burst).previous_mode != "full"
+        except (rospy.ServiceException, rospy.ROSException):
+            # detection runs unscheduled
+            return False
+
+    def read(self, names):
+        now = self.now()
+        if self.request_detection(now):
+            # the detection was not running at full rate, give it time to see the tags again
+            tags = [self.tag_id(name) for name in names]
+            deadline = now + self.wait
+            while self.tracker.stale(tags, self.max_age, self.max_std) and self.now() < deadline:
+                rospy.sleep(0.02)
+            now = self.now()
+
+        positions = {}
+        for name in names:
+            xyz = self.tracker.position(self.tag_id(name), self.max_age, self.max_std, now)
+            if xyz is not None:
+                positions[name] = xyz
+        return positions
+
+    def tag_id(self, name):
+        """ april tag id of a model """
+        if(name=="Table"):
+            return 1
+        return int(name.split("_")[-1]) + 1
+
+    def read_tag_position(self, name):
+        """
+        Returns:
+            (x, y, z) - last estimate of the model whatever its age, (0, 0, 0) if never seen
+        """
+        estimate = self.tracker.estimate(self.tag_id(name))
+        if estimate is None:
+            rospy.logwarn(f"tag of {name} was never seen")
+            return (0, 0, 0)
+        return estimate[0]
+
+    def poll(self, event=None):
+        """ fuse the latest transform of every tag """
+        for i in self.tag_ids:
+            trans = self.listen_tag(i)
+            if trans is not None:
+                t = trans.transform.translation
+                self.tracker.update(i, (t.x, t.y, t.z), trans.header.stamp.to_sec())
+                if self.recorder is not None:
+                    self.recorder.record_tag(i, (t.x, t.y, t.z), trans.header.stamp.to_sec())
+
+    def listen_tag(self, i):
+        """
+        Listens to the most recent transform of tag_<i> with respect to the base, None if there is none.
+        """
+        try:
+            return self.buffer.lookup_transform('base', "tag_" + str(i), rospy.Time())
+        except (self.tf2_ros.LookupException, self.tf2_ros.ConnectivityException, self.tf2_ros.ExtrapolationException):
+            return None
+
+
+class MemoryWorld():
+    """ Models kept in a dictionary, for running Scene and BuildTower without ROS, Gazebo or cameras """
+    def __init__(self, positions=None, clock=time.time):
+        """
+        Args:
+            positions (dict) - model name --> (x, y, z) in the base frame
+            clock (function) - returns the current time in seconds
+        """
+        self.positions = dict(positions or {})
+        self.clock = clock
+
+    def now(self):
+        return self.clock()
+
+    def get_model_state(self, name, base="base"):
+        return model_state(name, self.positions.get(name, (0.0, 0.0, 0.0)), base)
+
+    def set_model_state(self, state):
+        p = state.pose.position
+        self.positions[state.model_name] = (p.x, p.y, p.z)
+
+    def read(self, names):
+        return {name: self.positions[name] for name in names if name in self.positions}
+
+    def move(self, name, xyz):
+        """ put a model at (x, y, z) """
+        self.positions[name] = tuple(xyz)
+
+    @classmethod
+    def random_layout(cls, cup_n, table_x=0.74, table_y=1.83, table_pos=(1, 0, -0.22), cup_z=-0.07,
+                      radius=0.02, seed=None, clock=time.time):
+        """
+        Cups at random positions on the table, at least two radii apart while there is room.
+
+            Args:
+                cup_n (int) - number of cups, named Cup_1 ... Cup_<cup_n>
+                table_x, table_y (float) - table size
+                table_pos (tuple) - table center
+                cup_z (float) - height of the cups
+                radius (float) - cup radius
+                seed (int) - random seed, layouts with the same seed are identical
+            Returns:
+                world (MemoryWorld)
+        """
+        rng = random.Random(seed)
+        half_x = table_x/2.0 - radius
+        half_y = table_y/2.0 - radius
+        cell = 2*radius
+        taken = set()
+        positions = {"Table": tuple(table_pos)}
+        for i in range(cup_n):
+            for attempt in range(20):
+                x = table_pos[0] + rng.uniform(-half_x, half_x)
+                y = table_pos[1] + rng.uniform(-half_y, half_y)
+                key = (int(x // cell), int(y // cell))
+                if not any((key[0]+dx, key[1]+dy) in taken for dx in (-1, 0, 1) for dy in (-1, 0, 1)):
+                    break
+            taken.add(key)
+            positions["Cup_"+str(i+1)] = (x, y, cup_z)
+        return cls(positions, clock)
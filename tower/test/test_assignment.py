@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+""" Unittest for the cup assignment of both hands """
+import itertools
+import unittest
+import numpy as np
+from tower.assignment import hungarian, AssignmentEngine
+from tower.buildTower import BuildTower
+from tower.benchmark import make_scene
+
+PICKS = [(0.8, -0.37, -0.07), (0.8, 0.37, -0.07), (0.9, -0.37, -0.07), (0.9, 0.37, -0.07),
+         (0.8, -0.5, -0.07), (0.8, 0.5, -0.07), (0.9, -0.5, -0.07), (0.9, 0.5, -0.07),
+         (1.0, -0.5, -0.07), (1.0, 0.5, -0.07)]
+
+
+class AssignmentNode(unittest.TestCase):
+
+    def test_hungarian(self):
+        rng = np.random.default_rng(1)
+        for n, m in [(4, 4), (3, 5), (5, 3), (1, 1)]:
+            cost = rng.random((n, m))
+            rows, cols = hungarian(cost)
+            self.assertEqual(len(rows), min(n, m))
+            if n <= m:
+                best = min(cost[np.arange(n), list(p)].sum() for p in itertools.permutations(range(m), n))
+            else:
+                best = min(cost[list(p), np.arange(m)].sum() for p in itertools.permutations(range(n), m))
+            self.assertAlmostEqual(cost[rows, cols].sum(), best)
+        # a forbidden pair is only used when nothing else is possible
+        rows, cols = hungarian([[np.inf, 1.0], [1.0, 5.0]])
+        self.assertEqual(list(cols), [1, 0])
+
+    def test_tower(self):
+        tower = BuildTower()
+        plan = tower.pyramid(4, first_hand="right_gripper", x=0.85, z=-0.07, spacing=0.09, height=0.11)
+        engine = AssignmentEngine()
+        starts = {"left_gripper": (0.6, 0.3, 0.1), "right_gripper": (0.6, -0.3, 0.1)}
+        greedy = [PICKS.index(p) for p in tower.assign_picks(plan, PICKS)]
+        picks, makespan = engine.assign_tower(plan, PICKS, starts)
+        self.assertEqual(sorted(picks), list(range(10)))
+        self.assertLessEqual(makespan, engine.simulate(plan, greedy, np.array(PICKS), starts))
+        self.assertEqual(len(tower.assign_picks(plan, PICKS[:8], engine)), 10)
+        self.assertEqual(tower.assign_picks(plan, PICKS[:8], engine).count(None), 2)
+
+    def test_sorting_sides(self):
+        engine = AssignmentEngine()
+        lanes = {"left_gripper": [(1.2 - 0.05*k, 0.7, -0.07) for k in range(6)],
+                 "right_gripper": [(1.2 - 0.05*k, -0.7, -0.07) for k in range(6)]}
+        cups = [(0.8 + 0.05*k, 0.1, -0.07) for k in range(4)] + [(0.9, -0.1, -0.07)]
+        # in lockstep the hands stay on their side even if a balanced split is shorter
+        jobs, makespan = engine.assign_sorting(cups, lanes)
+        self.assertEqual(sorted(c for c, s in jobs["left_gripper"]), [0, 1, 2, 3])
+        self.assertEqual([c for c, s in jobs["right_gripper"]], [4])
+        # a hand crosses only when its side has more cups than its lane has places
+        jobs, makespan = engine.assign_sorting(cups, {"left_gripper": lanes["left_gripper"][:3],
+                                                      "right_gripper": lanes["right_gripper"]})
+        self.assertEqual(len(jobs["left_gripper"]), 3)
+        self.assertEqual(len(jobs["right_gripper"]), 2)
+        self.assertLess(makespan, np.inf)
+        # each hand on its own, any split
+        jobs, makespan = engine.assign_sorting(cups, lanes, lockstep=False)
+        self.assertGreater(len(jobs["right_gripper"]), 1)
+
+    def test_sorting(self):
+        scene, world = make_scene(7, 3)
+        scene.assigner = AssignmentEngine()
+        scene.update_world()
+        jobs = scene.sorting_jobs()
+        cups = [cup for hand in jobs for cup, place in jobs[hand]]
+        unsorted = [name for side in ("left", "right") for name in scene.registry.partition_dict("InWorkspace", side)]
+        self.assertEqual(sorted(cups), sorted(unsorted))
+        # the first place of each lane is the one the min(x) rule gives
+        engine, scene.assigner = scene.assigner, None
+        greedy = {hand: scene.place_next_pos(hand) for hand in jobs}
+        scene.assigner = engine
+        for hand in jobs:
+            if jobs[hand]:
+                self.assertAlmostEqual(jobs[hand][0][1].x, greedy[hand].x)
+                self.assertAlmostEqual(jobs[hand][0][1].y, greedy[hand].y)
+                self.assertEqual(scene.assign_cup_st1(hand), jobs[hand][0][0])
+                self.assertEqual(scene.place_next_pos(hand), jobs[hand][0][1])
+        lanes = {"left_gripper": [(1.0 - 0.024*k, 0.66, -0.07) for k in range(6)],
+                 "right_gripper": [(1.0 - 0.024*k, -0.66, -0.07) for k in range(6)]}
+        # all cups on the left: with the hands running on their own, the right hand still takes some of them
+        cups = [(0.9 + 0.05*k, 0.3, -0.07) for k in range(6)]
+        jobs, makespan = scene.assigner.assign_sorting(cups, lanes, lockstep=False)
+        self.assertTrue(jobs["right_gripper"])
+        self.assertLess(makespan, scene.assigner.makespan(
+            {"left_gripper": scene.assigner.cycles(lanes["left_gripper"][0], cups, lanes["left_gripper"])}, False))
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "Assignment", AssignmentNode)
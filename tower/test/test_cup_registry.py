@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+""" Unittest for the cup registry that backs Scene cup assignment """
+import unittest
+from tower.cup_registry import CupRegistry
+
+
+class CupRegistryNode(unittest.TestCase):
+
+    def setUp(self):
+        # table_y/4 with the table from scene_objects.yaml
+        self.registry = CupRegistry(["Cup_1", "Cup_2", "Cup_3", "Cup_4"], 1.83/4.0)
+        self.registry.update("Cup_1", (0.9, 0.2, -0.04))
+        self.registry.update("Cup_2", (0.8, 0.1, -0.04))
+        self.registry.update("Cup_3", (0.7, -0.3, -0.04))
+        self.registry.update("Cup_4", (1.0, 0.6, -0.04))
+
+    def test_partitions(self):
+        self.assertEqual(self.registry.min_x("InWorkspace", "left"), "Cup_2")
+        self.assertEqual(self.registry.min_x("InWorkspace", "right"), "Cup_3")
+        self.assertEqual(self.registry.min_x("OutWorkspace", "left"), "Cup_4")
+        self.assertEqual(self.registry.min_x("OutWorkspace", "right"), None)
+        self.assertEqual(sorted(self.registry.partition_dict("InWorkspace", "left")), ["Cup_1", "Cup_2"])
+
+    def test_incremental_update(self):
+        # moving the min cup further away hands the min to the next one
+        self.registry.update("Cup_2", (1.1, 0.1, -0.04))
+        self.assertEqual(self.registry.min_x("InWorkspace", "left"), "Cup_1")
+
+        # a grabbed cup leaves its partition until it is placed
+        self.registry.grabbed("Cup_1")
+        self.assertEqual(self.registry.min_x("InWorkspace", "left"), "Cup_2")
+        self.registry.placed("Cup_1", (0.8, 0.7, -0.04))
+        self.assertEqual(self.registry.min_x("OutWorkspace", "left"), "Cup_1")
+        self.assertEqual(self.registry.count("OutWorkspace", "left"), 2)
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "CupRegistry", CupRegistryNode)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+""" Unittest for the rate policy of the tag detection """
+import unittest
+from tower.detection_scheduler import DetectionScheduler
+
+
+class Clock():
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+class DetectionSchedulerNode(unittest.TestCase):
+
+    def frames(self, scheduler, clock, seconds, fps=30):
+        """ feed seconds of frames, returns how many were accepted """
+        accepted = 0
+        for i in range(int(seconds*fps)):
+            accepted += scheduler.accept()
+            clock.t += 1.0/fps
+        return accepted
+
+    def test_modes(self):
+        clock = Clock()
+        scheduler = DetectionScheduler(background_rate=2.0, clock=clock, cpu=clock)
+        self.assertEqual(self.frames(scheduler, clock, 1.0), 0)
+        scheduler.set_consumers(1)
+        self.assertEqual(scheduler.mode(), "background")
+        self.assertEqual(self.frames(scheduler, clock, 2.0), 4)
+        scheduler.request(1.0)
+        self.assertEqual(scheduler.mode(), "full")
+        self.assertEqual(self.frames(scheduler, clock, 1.0), 30)
+        clock.t += 0.01
+        self.assertEqual(scheduler.mode(), "background")
+
+    def test_report(self):
+        clock = Clock()
+        # the "CPU" runs at the same speed as the clock: 100% in every mode
+        scheduler = DetectionScheduler(background_rate=2.0, clock=clock, cpu=clock)
+        self.frames(scheduler, clock, 1.0)
+        scheduler.request(0.5)
+        self.frames(scheduler, clock, 0.5)
+        report = scheduler.report()
+        self.assertAlmostEqual(report["paused"]["wall"], 1.0, places=3)
+        self.assertAlmostEqual(report["full"]["wall"], 0.5, delta=0.04)
+        self.assertAlmostEqual(report["paused"]["cpu_percent"], 100.0, places=3)
+        self.assertEqual(report["paused"]["skipped"], 30)
+        self.assertIn("full (every frame)", scheduler.report_text())
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "DetectionScheduler", DetectionSchedulerNode)
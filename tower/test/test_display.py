@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+""" Unittest for the head display rendering of cam_display """
+import unittest
+import numpy as np
+from std_msgs.msg import String
+from tower.display import DisplayPipeline, Resizer, image_to_bgr, bgr_to_image, progress_message
+
+
+def frame(value, width=1280, height=800, encoding="rgb8"):
+    """ an Image filled with (value, value + 1, value + 2) in encoding order """
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[:] = (value, value + 1, value + 2)
+    msg = bgr_to_image(pixels)
+    msg.encoding = encoding
+    return msg
+
+
+class DisplayNode(unittest.TestCase):
+
+    def test_conversion(self):
+        bgr = image_to_bgr(frame(10, 4, 2))
+        self.assertEqual(bgr.shape, (2, 4, 3))
+        self.assertEqual(tuple(bgr[0, 0]), (12, 11, 10))
+        self.assertEqual(tuple(image_to_bgr(frame(10, 4, 2, "bgr8"))[1, 3]), (10, 11, 12))
+
+    def test_letterbox(self):
+        resizer = Resizer((1024, 600))
+        pixels = np.arange(80*64, dtype=np.uint8).reshape(80, 64, 1).repeat(3, axis=2)
+        pixels[..., 2] = 7
+        canvas = resizer(bgr_to_image(pixels))
+        x0, y0, bw, bh = resizer.box
+        self.assertEqual((bh, bw), (600, 480))
+        self.assertEqual(canvas.shape, (600, 1024, 3))
+        self.assertFalse(canvas[:, :x0].any())
+        self.assertEqual(tuple(canvas[y0, x0]), tuple(pixels[0, 0]))
+        self.assertEqual(tuple(canvas[y0 + bh - 1, x0 + bw - 1]), tuple(pixels[-1, -1]))
+        # channel order and row padding of the message
+        msg = frame(10, 64, 80)
+        msg.step += 8
+        msg.data = np.pad(np.frombuffer(msg.data, dtype=np.uint8).reshape(80, 64*3), ((0, 0), (0, 8))).tobytes()
+        self.assertEqual(tuple(resizer(msg)[300, 512]), (12, 11, 10))
+
+    def test_latest_only(self):
+        pipeline = DisplayPipeline()
+        self.assertIsNone(pipeline.render())
+        for value in (10, 20, 30):
+            pipeline.image_callback(frame(value))
+        msg = pipeline.render()
+        self.assertEqual(pipeline.frames.dropped, 2)
+        self.assertEqual((msg.width, msg.height, msg.encoding), (1024, 600, "bgr8"))
+        pixels = image_to_bgr(msg)
+        self.assertEqual(tuple(pixels[300, 512]), (32, 31, 30))
+        # nothing new, nothing published
+        self.assertIsNone(pipeline.render())
+
+        # the overlay is drawn once per change, on the last frame
+        pipeline.progress_callback(String(data=progress_message(4, 10, "Cup_4")))
+        pipeline.progress_callback(String(data=progress_message(4, 10, "Cup_4")))
+        self.assertEqual(pipeline.overlay.renders, 1)
+        pixels = image_to_bgr(pipeline.render())
+        self.assertEqual(tuple(pixels[590, 100]), (0, 200, 0))
+        self.assertEqual(tuple(pixels[590, 1000]), (40, 40, 40))
+        self.assertEqual(tuple(pixels[300, 512]), (32, 31, 30))
+        self.assertIsNone(pipeline.render())
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "Display", DisplayNode)
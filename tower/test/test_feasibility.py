@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+""" Unittest for the geometric feasibility checks of the place targets """
+import unittest
+import numpy as np
+from tower.feasibility import Feasibility, OFF_TABLE, OVERLAP, UNSUPPORTED, NO_CLEARANCE
+from tower.buildTower import BuildTower
+from tower.benchmark import make_scene, SCENE_PARAMS
+
+
+class FeasibilityNode(unittest.TestCase):
+
+    def setUp(self):
+        self.feasibility = Feasibility.from_params(SCENE_PARAMS.get)
+
+    def test_layout(self):
+        tower = BuildTower(feasibility=self.feasibility)
+        plan = tower.pyramid(4, first_hand="right_gripper", x=0.85, z=-0.07, spacing=0.09, height=0.11, lean=-0.013)
+        slots = [step.position for step in plan]
+        self.assertFalse(self.feasibility.check_layout(slots).any())
+        self.assertEqual(tower.infeasible(plan), [])
+        # without the first cup of the bottom row the cups above it fall
+        codes = self.feasibility.check_layout(slots[1:])
+        self.assertTrue(all(code == UNSUPPORTED for code in codes if code))
+        self.assertGreater(np.count_nonzero(codes), 0)
+        # a cup left on the tower place
+        steps = tower.infeasible(plan, obstacles=[slots[0]])
+        self.assertEqual([(step.index, code) for step, code in steps], [(0, OVERLAP)])
+
+    def test_targets(self):
+        targets = [(0.8, 0.0, -0.07), (1.5, 0.0, -0.07), (0.8, 0.02, -0.07), (0.7, 0.0, -0.07)]
+        codes = self.feasibility.check(targets, obstacles=[(0.8, 0.0, -0.07)])
+        self.assertEqual(list(codes), [OVERLAP, OFF_TABLE, OVERLAP, 0])
+        # the gripper comes from -x, a cup right in front of the target is in its way
+        codes = self.feasibility.check([(0.9, 0.0, -0.07)], obstacles=[(0.83, 0.0, -0.07)])
+        self.assertEqual(list(codes), [NO_CLEARANCE])
+
+    def test_sorting_lane(self):
+        scene, world = make_scene(4, 2)
+        scene.feasibility = self.feasibility
+        world.move("Cup_1", (0.95, 0.6575, -0.07))
+        scene.update_world()
+        place = scene.place_next_pos("left_gripper")
+        self.assertAlmostEqual(place.x, 0.95 - 0.048)
+        slots = scene.lane_slots("left_gripper", 3)
+        self.assertAlmostEqual(slots[0].x, place.x)
+        self.assertTrue(all(a.x - b.x >= 0.04 for a, b in zip(slots, slots[1:])))
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "Feasibility", FeasibilityNode)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+""" Unittest for the non-blocking gripper commands """
+import time
+import unittest
+from tower.gripper_control import GripperController, FakeGripper, gather
+
+
+class GripperControlNode(unittest.TestCase):
+
+    def setUp(self):
+        # 100 --> 0 takes 0.2 s, a cup stops the closing gripper at 40
+        self.grippers = {"left_gripper": FakeGripper("left", speed=500.0, obj=40.0),
+                         "right_gripper": FakeGripper("right", speed=500.0)}
+        self.control = GripperController(self.grippers, timeout=1.0, period=0.005)
+
+    def tearDown(self):
+        self.control.shutdown()
+
+    def test_both_in_parallel(self):
+        t0 = time.time()
+        self.assertEqual(self.control.close("both").result(), [True, True])
+        # one gripper travel, not two
+        self.assertLess(time.time() - t0, 0.35)
+        self.assertTrue(self.grippers["left_gripper"].gripping())
+        self.assertAlmostEqual(self.grippers["left_gripper"].position(), 40.0)
+        self.assertAlmostEqual(self.grippers["right_gripper"].position(), 0.0)
+
+    def test_in_order(self):
+        # the open is sent without waiting, the close only starts once the gripper is open
+        self.grippers["right_gripper"].command_position(0.0, block=True)
+        t0 = time.time()
+        opening = self.control.open("right_gripper")
+        self.assertFalse(opening.done())
+        self.assertTrue(self.control.close("right_gripper").result())
+        self.assertTrue(opening.result())
+        targets = [target for t, target in self.grippers["right_gripper"].commands]
+        self.assertEqual(targets, [0.0, 100.0, 0.0])
+        self.assertGreater(time.time() - t0, 0.35)
+
+    def test_release_and_timeout(self):
+        self.assertTrue(self.control.close("left_gripper").result())
+        # still gripping when the release is sent, it resolves on the position only
+        self.assertTrue(self.control.release("left_gripper").result())
+        self.assertAlmostEqual(self.grippers["left_gripper"].position(), 55.0)
+        self.grippers["right_gripper"].speed = 10.0
+        self.assertFalse(self.control.close("right_gripper").result())
+        count, total, worst, timeouts = self.control.summary()["right_gripper close"]
+        self.assertEqual((count, timeouts), (1, 1))
+        self.assertEqual(gather([]).result(), [])
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "GripperControl", GripperControlNode)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+""" Unittest for Scene running on the in-memory world backend """
+import unittest
+from tower.world import MemoryWorld
+from tower.benchmark import make_scene, bench_sorting
+
+
+class MemoryWorldNode(unittest.TestCase):
+
+    def test_random_layout(self):
+        a = MemoryWorld.random_layout(20, seed=3)
+        b = MemoryWorld.random_layout(20, seed=3)
+        self.assertEqual(a.positions, b.positions)
+        self.assertEqual(len(a.positions), 21)
+        for name, (x, y, z) in a.positions.items():
+            if name != "Table":
+                self.assertTrue(0.63 <= x <= 1.37 and -0.915 <= y <= 0.915)
+
+    def test_scene_queries(self):
+        scene, world = make_scene(9, 0)
+        world.move("Cup_1", (0.7, 0.1, -0.07))
+        world.move("Cup_2", (0.8, -0.1, -0.07))
+        scene.update_world()
+        self.assertEqual(scene.get_cup_position("Cup_1").x, 0.7)
+        left, right = scene.create_dictionary("InWorkspace")
+        self.assertIn("Cup_1", left)
+        self.assertIn("Cup_2", right)
+
+    def test_sorting(self):
+        scene, world = make_scene(30, 1)
+        bench_sorting(scene, world)
+        scene.update_world()
+        self.assertTrue(scene.cups_sorted())
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "MemoryWorld", MemoryWorldNode)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+""" Unittest for the persistent motion cache """
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from geometry_msgs.msg import Pose
+from moveit_msgs.msg import RobotTrajectory
+from trajectory_msgs.msg import JointTrajectoryPoint
+from tower.motion_cache import MotionCache, TrajectoryValidator
+
+
+def trajectory(*waypoints):
+    plan = RobotTrajectory()
+    plan.joint_trajectory.joint_names = ["j0", "j1"]
+    plan.joint_trajectory.points = [JointTrajectoryPoint(positions=list(p)) for p in waypoints]
+    return plan
+
+
+class MotionCacheNode(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_buckets(self):
+        cache = MotionCache(self.path, bucket=0.02)
+        goal = Pose()
+        goal.position.x, goal.orientation.w = 0.8, 1.0
+        cache.put("left_arm", [0.100, 0.5], goal, trajectory((0.1, 0.5), (0.3, 0.6)))
+        # same bucket of the start, same goal to the mm
+        plan = cache.get("left_arm", [0.105, 0.5], [0.8004, 0, 0, 0, 0, 0, 1])
+        self.assertIsNotNone(plan)
+        self.assertEqual(plan.joint_trajectory.points[0].positions, [0.105, 0.5])
+        self.assertEqual(plan.joint_trajectory.points[1].positions, [0.3, 0.6])
+        # next bucket, another goal, another group
+        self.assertIsNone(cache.get("left_arm", [0.115, 0.5], goal))
+        self.assertIsNone(cache.get("left_arm", [0.1, 0.5], [0.801, 0, 0, 0, 0, 0, 1]))
+        self.assertIsNone(cache.get("right_arm", [0.1, 0.5], goal))
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_lru(self):
+        cache = MotionCache(self.path, capacity=2)
+        cache.put("left_arm", [0.0], [1], trajectory((0.0,), (1.0,)))
+        cache.put("left_arm", [0.0], [2], trajectory((0.0,), (2.0,)))
+        # the use of the first entry outlives the run
+        self.assertIsNotNone(MotionCache(self.path, capacity=2).get("left_arm", [0.0], [1]))
+        cache = MotionCache(self.path, capacity=2)
+        cache.put("left_arm", [0.0], [3], trajectory((0.0,), (3.0,)))
+        self.assertIsNone(cache.get("left_arm", [0.0], [2]))
+        self.assertIsNotNone(cache.get("left_arm", [0.0], [1]))
+        self.assertIsNotNone(cache.get("left_arm", [0.0], [3]))
+        self.assertEqual(len(MotionCache(self.path, capacity=2).entries), 2)
+
+    def test_validator(self):
+        validator = TrajectoryValidator(samples=2)
+        checked = []
+
+        def check(req):
+            checked.append(list(req.robot_state.joint_state.position))
+            return SimpleNamespace(valid=req.robot_state.joint_state.position[0] < 0.5)
+
+        validator.check = check
+        cache = MotionCache(self.path, validator=validator)
+        cache.put("left_arm", [0.0, 0.0], [1], trajectory(*[(0.1*i, 0.0) for i in range(5)]))
+        cache.put("left_arm", [0.0, 0.0], [2], trajectory((0.0, 0.0), (0.4, 0.0), (0.6, 0.0)))
+        self.assertIsNotNone(cache.get("left_arm", [0.0, 0.0], [1]))
+        # every other waypoint and the last one
+        self.assertEqual(checked, [[0.0, 0.0], [0.2, 0.0], [0.4, 0.0]])
+        # a colliding plan is a miss and leaves the cache
+        self.assertIsNone(cache.get("left_arm", [0.0, 0.0], [2]))
+        self.assertEqual(len(cache.entries), 1)
+        self.assertEqual(len(MotionCache(self.path).entries), 1)
+        self.assertFalse(validator.valid("left_arm", trajectory()))
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "MotionCache", MotionCacheNode)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+""" Unittest for the joint limit scaling and trajectory stitching of MotionPrimitives """
+import os
+import shutil
+import tempfile
+import unittest
+import rospy
+from geometry_msgs.msg import Pose
+from moveit_msgs.msg import RobotTrajectory
+from trajectory_msgs.msg import JointTrajectoryPoint
+from tower.motion_primitives import MotionPrimitives, parse_joint_limits, scaling_factors, stitch
+
+JOINTS = ["left_s0", "left_s1"]
+
+
+def trajectory(*waypoints):
+    """ RobotTrajectory through (seconds, positions) waypoints """
+    plan = RobotTrajectory()
+    plan.joint_trajectory.joint_names = list(JOINTS)
+    plan.joint_trajectory.points = [JointTrajectoryPoint(positions=list(p), velocities=[0.1, 0.1],
+                                                         time_from_start=rospy.Duration.from_sec(t))
+                                    for t, p in waypoints]
+    return plan
+
+
+class FakeGroup():
+    """ MoveGroupCommander whose cartesian paths only reach frac of the waypoints """
+    def __init__(self, frac):
+        self.frac = frac
+        self.calls = []
+
+    def get_name(self):
+        return "left_arm"
+
+    def get_active_joints(self):
+        return list(JOINTS)
+
+    def set_start_state(self, state):
+        pass
+
+    def compute_cartesian_path(self, goals, eef_step, jump):
+        self.calls.append(("cartesian", len(goals)))
+        return trajectory((0.0, (0.0, 0.0)), (1.0, (0.1, 0.0))), self.frac
+
+    def set_pose_target(self, pose):
+        self.calls.append(("pose", 1))
+
+    def set_joint_value_target(self, joints):
+        self.calls.append(("joints", 1))
+
+    def plan(self):
+        return True, trajectory((0.0, (0.0, 0.0)), (2.0, (0.2, 0.0))), 1.0, None
+
+    def clear_pose_targets(self):
+        pass
+
+    def set_start_state_to_current_state(self):
+        pass
+
+
+class MotionPrimitivesNode(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.limits = os.path.join(self.path, "joint_limits.yaml")
+        with open(self.limits, "w") as f:
+            f.write("joint_limits:\n"
+                    "  left_s0: {has_velocity_limits: true, max_velocity: 1.0,"
+                    " has_acceleration_limits: true, max_acceleration: 2.0}\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_limits(self):
+        limits = parse_joint_limits({
+            "left_s0": {"has_velocity_limits": True, "max_velocity": 1.0,
+                        "has_acceleration_limits": True, "max_acceleration": 2.0},
+            "left_s1": {"has_velocity_limits": True, "max_velocity": 0.5,
+                        "has_acceleration_limits": False, "max_acceleration": 9.0}})
+        self.assertEqual(limits, {"left_s0": (1.0, 2.0), "left_s1": (0.5, None)})
+        planning = {"left_s0": (2.0, 4.0), "left_s1": (2.0, 4.0), "left_w2": (0.1, 0.1)}
+        # the slowest joint sets the scaling, joints without a limit on either side do not
+        self.assertEqual(scaling_factors(JOINTS, limits, planning), (0.25, 0.5))
+        self.assertEqual(scaling_factors(["left_w2"], limits, planning), (1.0, 1.0))
+        self.assertEqual(scaling_factors(JOINTS, limits, {}), (1.0, 1.0))
+
+    def test_stitch(self):
+        first = trajectory((0.0, (0.0, 0.0)), (1.0, (0.1, 0.0)), (1.5, (0.2, 0.0)))
+        second = trajectory((0.0, (0.2, 0.0)), (2.0, (0.2, 0.3)))
+        third = trajectory((0.5, (0.2, 0.3)), (1.0, (0.0, 0.3)))
+        merged = stitch([first, second, third])
+        points = merged.joint_trajectory.points
+        self.assertEqual(merged.joint_trajectory.joint_names, JOINTS)
+        # the repeated start of each plan is dropped
+        self.assertEqual([p.positions for p in points],
+                         [[0.0, 0.0], [0.1, 0.0], [0.2, 0.0], [0.2, 0.3], [0.0, 0.3]])
+        self.assertEqual([round(p.time_from_start.to_sec(), 6) for p in points], [0.0, 1.0, 1.5, 3.5, 4.0])
+        self.assertTrue(all(p.velocities == [] and p.accelerations == [] for p in points))
+        # the input plans are left as they were
+        self.assertEqual(second.joint_trajectory.points[1].time_from_start.to_sec(), 2.0)
+        self.assertEqual(second.joint_trajectory.points[1].velocities, [0.1, 0.1])
+
+    def test_cartesian_fallback(self):
+        group = FakeGroup(frac=0.5)
+        primitives = MotionPrimitives(None, {"left_gripper": group}, limits_file=self.limits)
+        self.assertEqual(primitives.scaling["left_gripper"], (1.0, 1.0))
+        above, pos = Pose(), Pose()
+        # several waypoints are not replaced by a plan to the last one
+        self.assertIsNone(primitives._plan_piece(group, [0.0, 0.0], [above, pos]))
+        self.assertEqual(group.calls, [("cartesian", 2)])
+        self.assertEqual(primitives.plan("left_gripper", [0.0, 0.0], [above, pos]), (None, [0.0, 0.0]))
+        # a single pose is planned in joint space
+        group.calls = []
+        plan = primitives._plan_piece(group, [0.0, 0.0], [pos])
+        self.assertEqual(group.calls, [("cartesian", 1), ("pose", 1)])
+        self.assertEqual(plan.joint_trajectory.points[-1].positions, [0.2, 0.0])
+        # a complete cartesian path is used as is
+        group.frac = 1.0
+        plan = primitives._plan_piece(group, [0.0, 0.0], [above, pos])
+        self.assertEqual(plan.joint_trajectory.points[-1].positions, [0.1, 0.0])
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "MotionPrimitives", MotionPrimitivesNode)
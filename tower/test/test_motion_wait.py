@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+""" Unittest for the feedback driven waits of MotionMonitor """
+import time
+import threading
+import unittest
+from sensor_msgs.msg import JointState
+from tower.motion_wait import MotionMonitor, arm_joints
+from tower.gripper_control import FakeGripper
+
+
+def joint_state(hand, velocity, joints=7):
+    return JointState(name=arm_joints(hand)[:joints], velocity=[velocity]*joints)
+
+
+class MotionWaitNode(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = MotionMonitor(velocity_tol=0.02, timeout=1.0, hold=0.05)
+
+    def test_settled(self):
+        self.monitor.joint_states_callback(joint_state("left_gripper", 0.5))
+        # the arm stops 0.1 s after the wait started, then has to stay still for hold
+        timer = threading.Timer(0.1, self.monitor.joint_states_callback, (joint_state("left_gripper", 0.001),))
+        t0 = time.time()
+        timer.start()
+        self.assertTrue(self.monitor.wait_settled("left_gripper"))
+        elapsed = time.time() - t0
+        self.assertGreaterEqual(elapsed, 0.15)
+        self.assertLess(elapsed, 0.5)
+        # still already, only the hold is waited
+        t0 = time.time()
+        self.assertTrue(self.monitor.wait_settled("left_gripper"))
+        self.assertLess(time.time() - t0, 0.15)
+
+    def test_timeout(self):
+        self.monitor.joint_states_callback(joint_state("left_gripper", 0.001))
+        self.monitor.joint_states_callback(joint_state("right_gripper", 0.5))
+        self.assertFalse(self.monitor.wait_settled("right_gripper", timeout=0.1))
+        self.assertTrue(self.monitor.wait_settled("left_gripper", label="left place"))
+        count, total, worst, timeouts = self.monitor.summary()["right_gripper settle"]
+        self.assertEqual((count, timeouts), (1, 1))
+        self.assertGreaterEqual(worst, 0.1)
+        self.assertEqual(self.monitor.summary()["left place"][3], 0)
+
+    def test_missing_joints(self):
+        # a joint without any state is not still
+        self.assertFalse(self.monitor.wait_settled("left_gripper", timeout=0.1))
+        self.monitor.joint_states_callback(joint_state("left_gripper", 0.0, joints=6))
+        self.assertFalse(self.monitor.wait_settled("left_gripper", timeout=0.1))
+        self.monitor.joint_states_callback(joint_state("left_gripper", 0.0))
+        self.assertTrue(self.monitor.wait_settled("left_gripper", timeout=0.1))
+
+    def test_gripper(self):
+        # 100 --> 0 takes 0.2 s, a cup stops the closing gripper at 40
+        gripper = FakeGripper("left", speed=500.0, obj=40.0)
+        gripper.close()
+        self.assertTrue(self.monitor.wait_gripper(gripper, 0.0, label="close"))
+        self.assertTrue(gripper.gripping())
+        gripper.command_position(55.0)
+        self.assertTrue(self.monitor.wait_gripper(gripper, 55.0, label="release"))
+        self.assertAlmostEqual(gripper.position(), 55.0)
+        gripper.speed = 10.0
+        gripper.open()
+        self.assertFalse(self.monitor.wait_gripper(gripper, 100.0, label="open", timeout=0.1))
+        # without a position, only the end of the motion is waited for
+        gripper.speed = 500.0
+        self.assertTrue(self.monitor.wait_gripper(gripper, label="open"))
+        self.assertEqual(self.monitor.summary()["open"][::3], (2, 1))
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "MotionWait", MotionWaitNode)
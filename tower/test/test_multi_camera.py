@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+""" Unittest for the fusion of tag detections from several cameras """
+import unittest
+import numpy as np
+from tower.multi_camera import CameraDetector, MultiCameraFusion, project_corners, reprojection_error
+from tower.roi_detector import tag_pose
+from tower.tag_tracker import TagTracker
+
+K = np.array([[400.0, 0, 320], [0, 400.0, 200], [0, 0, 1]])
+TAG = 0.0381
+
+
+class FixedCorners():
+    """ stands in for RoiTagDetector, returns the same corners every frame """
+    def __init__(self, corners):
+        self.corners = corners
+
+    def detect(self, gray):
+        return self.corners
+
+
+def view(t, offset=(0.0, 0.0)):
+    """ corners of tag 3 facing a camera at t (camera frame), shifted by offset pixels """
+    return {3: project_corners(K, np.identity(3), np.array(t), TAG) + offset}
+
+
+class MultiCameraNode(unittest.TestCase):
+
+    def test_pose_from_corners(self):
+        R, t = tag_pose(view((0.05, -0.02, 0.4))[3], K, TAG)
+        np.testing.assert_allclose(t, (0.05, -0.02, 0.4), atol=1e-6)
+        np.testing.assert_allclose(R, np.identity(3), atol=1e-6)
+        self.assertLess(reprojection_error(view((0.05, -0.02, 0.4))[3], K, R, t, TAG), 1e-6)
+
+    def test_fusion_weights_close_camera(self):
+        # both cameras look down z of the base, the far one sees the tag 1 px off
+        near = CameraDetector("near", K, TAG, detector=FixedCorners(view((0.0, 0.0, 0.3))))
+        far = CameraDetector("far", K, TAG, detector=FixedCorners(view((0.0, 0.0, 1.5), (1.0, 0.0))))
+        frames = {"near_frame": (np.identity(3), np.zeros(3)),
+                  "far_frame": (np.identity(3), np.array([0.0, 0.0, -1.2]))}
+        fusion = MultiCameraFusion([near, far], lambda frame, stamp: frames[frame],
+                                   TagTracker(process_noise=0.0, late=0.1))
+        for k in range(5):
+            fusion.process("near", None, "near_frame", k*0.1)
+            fusion.process("far", None, "far_frame", k*0.1)
+        xyz, std, age = fusion.tracker.estimate(3, now=0.4)
+        far_x = 1.5 * 1.0 / 400.0
+        self.assertLess(abs(xyz[0]), 0.1*far_x)
+        self.assertAlmostEqual(xyz[2], 0.3, places=3)
+        fusion.shutdown()
+
+    def test_busy_camera_drops_frames(self):
+        cam = CameraDetector("near", K, TAG, detector=FixedCorners(view((0.0, 0.0, 0.3))))
+        fusion = MultiCameraFusion([cam], lambda frame, stamp: (np.identity(3), np.zeros(3)))
+        fusion.busy["near"] = True
+        self.assertIsNone(fusion.submit("near", None, "f", 0.0))
+        fusion.busy["near"] = False
+        self.assertEqual(fusion.submit("near", None, "f", 0.0).result(), [3])
+        self.assertEqual(fusion.stats["near"]["dropped"], 1)
+        fusion.shutdown()
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "MultiCamera", MultiCameraNode)
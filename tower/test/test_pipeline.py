@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+""" Unittest for planning the next motion while the current one executes """
+import time
+import unittest
+from tower.pipeline import SpeculativePlanner
+
+
+class Planner():
+    """ fake planner taking delay seconds, returns the start it planned from """
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, start):
+        self.calls.append(list(start))
+        time.sleep(self.delay)
+        return ("motion", tuple(start))
+
+
+class PipelineNode(unittest.TestCase):
+
+    def test_planning_hidden(self):
+        planner = Planner(0.2)
+        speculative = SpeculativePlanner("left_gripper")
+        speculative.speculate(("pick", 1), [0.0, 1.0], planner)
+        time.sleep(0.3)     # the current motion executes
+        t0 = time.time()
+        self.assertEqual(speculative.take(("pick", 1), [0.005, 1.0], planner), ("motion", (0.0, 1.0)))
+        self.assertLess(time.time() - t0, 0.1)
+        self.assertEqual(speculative.stats["hits"], 1)
+        self.assertGreater(speculative.stats["hidden"], 0.15)
+        speculative.shutdown()
+
+    def test_replanned(self):
+        planner = Planner(0.05)
+        speculative = SpeculativePlanner("right_gripper")
+        # the world changed: the cup of the step is somewhere else
+        speculative.speculate(("pick", 2, (800, 370, -70)), [0.0, 1.0], planner)
+        self.assertEqual(speculative.take(("pick", 2, (810, 370, -70)), [0.0, 1.0], planner), ("motion", (0.0, 1.0)))
+        # the arm did not end where the motion was supposed to end
+        speculative.speculate(("place", 2), [0.0, 1.0], planner)
+        self.assertEqual(speculative.take(("place", 2), [0.3, 1.0], planner), ("motion", (0.3, 1.0)))
+        # nothing was speculated
+        self.assertEqual(speculative.take(("place", 3), [0.3, 1.0], planner), ("motion", (0.3, 1.0)))
+        self.assertEqual((speculative.stats["stale"], speculative.stats["moved"], speculative.stats["missed"]), (1, 1, 1))
+        speculative.shutdown()
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "Pipeline", PipelineNode)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+""" Unittest for racing planner configurations with a fake planning service """
+import os
+import time
+import tempfile
+import unittest
+from types import SimpleNamespace
+from moveit_msgs.msg import MoveItErrorCodes
+from tower.planner_race import PlannerRace, PlannerStats, config_name
+
+
+def fake_response(success, duration):
+    point = SimpleNamespace(positions=[duration], time_from_start=SimpleNamespace(to_sec=lambda: duration))
+    start = SimpleNamespace(positions=[0.0], time_from_start=SimpleNamespace(to_sec=lambda: 0.0))
+    trajectory = SimpleNamespace(joint_trajectory=SimpleNamespace(points=[start, point]))
+    code = MoveItErrorCodes.SUCCESS if success else MoveItErrorCodes.PLANNING_FAILED
+    return SimpleNamespace(error_code=SimpleNamespace(val=code), trajectory=trajectory)
+
+
+class FakePlanner():
+    """ planner_id --> (planning seconds, success, trajectory duration) """
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.requests = []
+
+    def __call__(self, config, request):
+        self.requests.append(request)
+        delay, success, duration = self.behaviour[request.planner_id]
+        time.sleep(delay)
+        return fake_response(success, duration)
+
+
+CONFIGS = [{"planner_id": "slow_short", "time": 1.0},
+           {"planner_id": "fast_long", "time": 1.0},
+           {"planner_id": "failing", "time": 1.0}]
+
+
+class PlannerRaceNode(unittest.TestCase):
+
+    def setUp(self):
+        self.planner = FakePlanner({"slow_short": (0.2, True, 2.0),
+                                    "fast_long": (0.05, True, 6.0),
+                                    "failing": (0.01, False, 0.0)})
+        self.request = SimpleNamespace(planner_id="", num_planning_attempts=1, allowed_planning_time=5.0)
+
+    def test_first_and_shortest(self):
+        race = PlannerRace(CONFIGS, call=self.planner)
+        self.assertEqual(race.plan(self.request, deadline=1.0).joint_trajectory.points[-1].positions, [6.0])
+        self.assertEqual(race.plan(self.request, deadline=1.0, first=False).joint_trajectory.points[-1].positions, [2.0])
+        # the request of the caller is not modified
+        self.assertEqual(self.request.planner_id, "")
+        self.assertEqual(sorted(r.planner_id for r in self.planner.requests[:3]), sorted(c["planner_id"] for c in CONFIGS))
+        race.shutdown()
+
+    def test_deadline_and_stats(self):
+        path = os.path.join(tempfile.mkdtemp(), "stats.json")
+        race = PlannerRace(CONFIGS[1:], stats=PlannerStats(path), call=self.planner)
+        self.planner.behaviour["fast_long"] = (0.3, True, 6.0)
+        self.assertIsNone(race.plan(self.request, deadline=0.1))
+        time.sleep(0.4)
+        race.shutdown()
+        stats = PlannerStats(path)
+        self.assertEqual(stats.stats[config_name(CONFIGS[2])]["successes"], 0)
+        self.assertEqual(stats.stats[config_name(CONFIGS[1])]["successes"], 1)
+        # a configuration that always fails ranks last once both have run
+        self.assertGreater(stats.score(config_name(CONFIGS[2])), stats.score(config_name(CONFIGS[1])))
+        race = PlannerRace(CONFIGS, stats=stats, max_parallel=2, call=self.planner)
+        self.assertNotIn(CONFIGS[2], race.select())
+        race.shutdown()
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "PlannerRace", PlannerRaceNode)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+""" Unittest for the reachability map and its use by Scene and BuildTower """
+import tempfile
+import unittest
+from tower.reach_map import ReachMap, table_grid
+from tower.buildTower import BuildTower
+from tower.benchmark import make_scene, SCENE_PARAMS
+
+JOINTS = {"left": ["left_s0", "left_s1"], "right": ["right_s0", "right_s1"]}
+
+
+def fake_solve(arm, xyz, seed):
+    """ both arms reach x < 1.2, the left arm only y > 0.3 and the right arm y < 0.5 """
+    if xyz[0] > 1.2 or (arm == "left" and xyz[1] < 0.3) or (arm == "right" and xyz[1] > 0.5):
+        return None
+    return {JOINTS[arm][0]: xyz[0], JOINTS[arm][1]: xyz[1]}
+
+
+class ReachMapNode(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        origin, shape = table_grid(SCENE_PARAMS, step=0.05, height=0.3)
+        path = tempfile.mkdtemp()
+        ReachMap.build(origin, 0.05, shape, fake_solve, JOINTS).save(path)
+        cls.reach = ReachMap.load(path)
+
+    def test_lookup(self):
+        reach = self.reach
+        self.assertTrue(reach.reachable("left_gripper", (0.7, 0.4, -0.05)))
+        self.assertFalse(reach.reachable("right_gripper", (0.7, 0.8, -0.05)))
+        self.assertEqual(reach.best_hand((0.7, 0.6, -0.05)), "left_gripper")
+        self.assertIsNone(reach.best_hand((1.3, 0.9, -0.05)))
+        # outside the grid nothing is known
+        self.assertTrue(reach.reachable("right_gripper", (0.7, 0.8, 2.0)))
+        seed = reach.seed("left_gripper", (0.7, 0.4, -0.05))
+        self.assertAlmostEqual(seed["left_s0"], 0.7, delta=0.03)
+        self.assertIsNone(reach.seed("right_gripper", (0.7, 0.8, -0.05)))
+        self.assertEqual(list(reach.margins("left_gripper", [(0.7, 0.4, -0.05), (1.3, 0.9, -0.05)])), [27, 0])
+
+    def test_planner_and_scene(self):
+        # the left hand cannot reach the cup at y = 0.2, the right hand takes it
+        tower = BuildTower(reach=self.reach)
+        plan = tower.plan_layout([(0.75, -0.2, -0.07), (0.75, 0.2, -0.07), (0.75, 0.6, -0.07)])
+        self.assertEqual(tower.unreachable(plan), [])
+        hands = {step.position[1]: step.hand for step in plan}
+        self.assertEqual(hands, {-0.2: "right_gripper", 0.2: "right_gripper", 0.6: "left_gripper"})
+        self.assertEqual(len(tower.unreachable(tower.plan_layout([(1.3, 0.6, -0.07)]))), 1)
+
+        scene, world = make_scene(2, 0)
+        scene.reach = self.reach
+        world.move("Cup_1", (0.65, 0.8, -0.07))
+        world.move("Cup_2", (0.7, 0.85, -0.07))
+        scene.update_world()
+        self.assertEqual(scene.grab_next_cup("left_gripper"), "Cup_1")
+        scene.reach = ReachMap(self.reach.origin, self.reach.step, self.reach.reach * 0, self.reach.seeds, JOINTS)
+        self.assertEqual(scene.grab_next_cup("left_gripper"), "Cup_0")
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "ReachMap", ReachMapNode)
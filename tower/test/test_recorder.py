@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+""" Unittest for the run recorder and the offline replay """
+import time
+import tempfile
+import unittest
+from types import SimpleNamespace
+from tower.recorder import Recorder, RunReader
+from tower.replay import Replay
+from tower.tracing import Tracer
+from tower.simulator import Scene
+from tower.benchmark import make_scene, SCENE_PARAMS
+
+
+def trajectory(points):
+    """ RobotTrajectory like object with points of 2 joints, 1 s apart """
+    return SimpleNamespace(joint_trajectory=SimpleNamespace(joint_names=["s0", "s1"], points=[
+        SimpleNamespace(positions=p, time_from_start=SimpleNamespace(to_sec=lambda i=i: float(i)))
+        for i, p in enumerate(points)]))
+
+
+class RecorderNode(unittest.TestCase):
+
+    def test_record_and_replay(self):
+        params = dict(SCENE_PARAMS, cup_n=6)
+        recorder = Recorder(tempfile.mkdtemp(), chunk_rows=4, meta={"node": "test", "params": params})
+        tracer = Tracer()
+        tracer.listeners.append(recorder.record_span)
+        live, world = make_scene(6, 4)
+        scene = Scene(None, False, world=world, params=params, recorder=recorder)
+
+        for step in range(3):
+            with tracer.span("scene", "update_world"):
+                scene.update_world()
+            for hand in ("left_gripper", "right_gripper"):
+                with tracer.span("scene", "assign_cup"):
+                    cup = scene.assign_cup_st1(hand)
+                place = scene.place_next_pos(hand)
+                grab = scene.get_cup_position(cup)
+                recorder.record("assignment", t=time.time(), snapshot=scene.snapshot, step=step, kind="sort", hand=hand,
+                                cup=cup, grab=(grab.x, grab.y, -0.04), place=(place.x, place.y, -0.04))
+                recorder.record("outcome", t=time.time(), step=step, hand=hand, cup=cup,
+                                success=step != 1 or hand == "left_gripper", message="")
+            # the cups of this step are sorted before the next snapshot
+            world.move(scene.assign_cup_st1("left_gripper"), (1.0 - 0.05*step, 0.7, -0.07))
+        recorder.record_plan("both_arms", "RRTConnect", True, 0.3, trajectory([[0.0, 0.0], [0.1, 0.2], [0.3, 0.4]]))
+        recorder.record_plan("both_arms", "PRM", False, 5.0)
+        recorder.close()
+
+        run = RunReader(recorder.path)
+        self.assertEqual(run.streams(), ["assignment", "outcome", "plan", "span", "world"])
+        self.assertGreater(len(list(run.chunks("world"))), 1)
+        plans = run.table("plan")
+        self.assertEqual(list(plans["planner"]), ["RRTConnect", "PRM"])
+        self.assertEqual(plans["positions"][0].shape, (3, 2))
+        self.assertEqual(len(plans["positions"][1]), 0)
+
+        replay = Replay(recorder.path)
+        report = replay.report()
+        self.assertEqual(report["decisions"], 6)
+        self.assertEqual(report["differ"], [])
+        failures = report["failures"]
+        self.assertEqual([(f["step"], f["hand"]) for f in failures], [(1, "right_gripper")])
+        self.assertEqual(sorted(failures[0]["world"]), sorted(scene.world.names))
+        self.assertIsNotNone(report["latency"]["assign_cup"]["recorded_p50"])
+        self.assertIn("RRTConnect: 1/1 ok", report["planners"])
+
+    def test_failed_plan_chunk(self):
+        # the last chunk only holds a failed plan, without any trajectory
+        recorder = Recorder(tempfile.mkdtemp(), chunk_rows=2, meta={"params": SCENE_PARAMS})
+        recorder.record_plan("left_arm", "RRTConnect", True, 0.2, trajectory([[0.0, 0.0], [0.1, 0.2]]))
+        recorder.record_plan("left_arm", "RRTConnect", True, 0.2, trajectory([[0.0, 0.0], [0.1, 0.2], [0.2, 0.4]]))
+        recorder.record_plan("left_arm", "PRM", False, 5.0)
+        recorder.close()
+        plans = RunReader(recorder.path).table("plan")
+        self.assertEqual([len(plans["positions"][i]) for i in range(3)], [2, 3, 0])
+        self.assertEqual(plans["positions"][1].shape, (3, 2))
+        self.assertIn("PRM: 0/1 ok", Replay(recorder.path).planner_stats().summary_text())
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "Recorder", RecorderNode)
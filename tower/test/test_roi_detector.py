@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+""" Unittest for the search windows and image conversion of the in-process tag detection """
+import unittest
+import numpy as np
+from sensor_msgs.msg import Image
+from tower.roi_detector import RoiTagDetector, merge_windows, image_to_gray
+
+try:
+    import apriltag
+except ImportError:
+    apriltag = None
+
+
+def image(pixels, encoding, pad=0):
+    """ sensor_msgs/Image of a (height, width, channels) array, rows padded with pad bytes """
+    h, w = pixels.shape[:2]
+    rows = pixels.reshape(h, -1)
+    msg = Image(height=h, width=w, encoding=encoding, step=rows.shape[1] + pad)
+    msg.data = np.pad(rows, ((0, 0), (0, pad))).tobytes()
+    return msg
+
+
+def square(center, side):
+    """ lb, rb, rt, lt corners of a tag of side pixels """
+    x, y = center
+    s = side/2.0
+    return np.array([[x - s, y + s], [x + s, y + s], [x + s, y - s], [x - s, y - s]])
+
+
+class RoiDetectorNode(unittest.TestCase):
+
+    def test_merge_windows(self):
+        self.assertEqual(merge_windows([]), [])
+        # windows that only touch are kept apart
+        self.assertEqual(merge_windows([(0, 0, 10, 10), (10, 0, 20, 10)]), [(0, 0, 10, 10), (10, 0, 20, 10)])
+        self.assertEqual(merge_windows([(0, 0, 10, 10), (5, 5, 15, 15), (100, 100, 110, 110)]),
+                         [(0, 0, 15, 15), (100, 100, 110, 110)])
+        # the merge of two windows can overlap a third one
+        self.assertEqual(merge_windows([(0, 0, 10, 10), (8, 0, 20, 10), (18, 5, 30, 30), (0, 20, 17, 30)]),
+                         [(0, 0, 30, 30)])
+
+    def test_gray(self):
+        rgb = np.array([[[255, 0, 0], [0, 255, 0], [0, 0, 255], [255, 255, 255]]], dtype=np.uint8)
+        luma = [[76, 149, 28, 255]]
+        np.testing.assert_array_equal(image_to_gray(image(rgb, "rgb8", pad=4)), luma)
+        np.testing.assert_array_equal(image_to_gray(image(rgb[..., ::-1], "bgr8")), luma)
+        rgba = np.concatenate([rgb, np.full((1, 4, 1), 7, dtype=np.uint8)], axis=2)
+        np.testing.assert_array_equal(image_to_gray(image(rgba, "rgba8")), luma)
+        np.testing.assert_array_equal(image_to_gray(image(rgba[..., [2, 1, 0, 3]], "bgra8")), luma)
+        mono = np.arange(12, dtype=np.uint8).reshape(3, 4, 1)
+        gray = image_to_gray(image(mono, "mono8", pad=4))
+        np.testing.assert_array_equal(gray, mono[..., 0])
+        self.assertFalse(gray.flags.owndata)
+
+    @unittest.skipIf(apriltag is None, "apriltag binding not built")
+    def test_rois(self):
+        detector = RoiTagDetector(roi_scale=2.0, min_roi=40)
+        detector.tracks = {
+            # 20 px tag moving 5 px right per frame: a 40 px window around the predicted center
+            2: (square((100, 100), 20), np.array([5.0, 0.0])),
+            # close to it, the windows are merged
+            3: (square((130, 110), 20), np.zeros(2)),
+            # in the corners, clipped at the frame edges
+            4: (square((5, 5), 20), np.zeros(2)),
+            6: (square((630, 470), 20), np.zeros(2)),
+            # mostly outside the frame, less than 8 px left, no window
+            5: (square((655, 300), 10), np.zeros(2)),
+        }
+        self.assertEqual(detector.rois((480, 640)), [(0, 0, 25, 25), (85, 80, 150, 130), (610, 450, 640, 480)])
+        detector.tracks = {}
+        self.assertEqual(detector.rois((480, 640)), [])
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "RoiDetector", RoiDetectorNode)
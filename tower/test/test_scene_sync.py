@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+""" Unittest for the planning scene diff bookkeeping of SceneSync """
+import time
+import unittest
+from moveit_msgs.msg import PlanningScene, CollisionObject, AttachedCollisionObject
+from tower.scene_sync import SceneSync
+
+
+def diff(world=(), attached=(), is_diff=True):
+    """ PlanningScene with (id, operation) world and attached objects """
+    msg = PlanningScene(is_diff=is_diff)
+    msg.robot_state.is_diff = True
+    msg.world.collision_objects = [CollisionObject(id=name, operation=op) for name, op in world]
+    msg.robot_state.attached_collision_objects = [
+        AttachedCollisionObject(link_name="left_gripper", object=CollisionObject(id=name, operation=op))
+        for name, op in attached]
+    return msg
+
+
+class SceneSyncNode(unittest.TestCase):
+
+    def setUp(self):
+        # no move_group here, the seed call only logs a warning
+        self.sync = SceneSync()
+
+    def test_add_attach_remove(self):
+        added = self.sync.expect("Cup_1", known=True)
+        attached = self.sync.expect("Cup_1", attached=True)
+        self.assertFalse(added.done())
+        self.sync.scene_callback(diff(world=[("Cup_1", CollisionObject.ADD), ("Cup_2", CollisionObject.ADD)]))
+        self.assertTrue(added.result(timeout=0))
+        self.assertFalse(attached.done())
+        self.assertEqual(self.sync.known, {"Cup_1", "Cup_2"})
+
+        # attaching takes the cup out of the world
+        self.sync.scene_callback(diff(attached=[("Cup_1", CollisionObject.ADD)]))
+        self.assertTrue(attached.result(timeout=0))
+        self.assertEqual((self.sync.known, self.sync.attached), ({"Cup_2"}, {"Cup_1"}))
+
+        detached = self.sync.expect("Cup_1", known=False, attached=False)
+        self.sync.scene_callback(diff(attached=[("Cup_1", CollisionObject.REMOVE)]))
+        self.assertTrue(detached.result(timeout=0))
+        self.assertEqual(self.sync.waiters, [])
+
+        # an empty id removes every world object, a full scene replaces the sets
+        self.sync.scene_callback(diff(world=[("", CollisionObject.REMOVE)]))
+        self.assertEqual(self.sync.known, set())
+        self.sync.scene_callback(diff(world=[("Cup_3", CollisionObject.ADD)], is_diff=False))
+        self.sync.mark_known(["Cup_4"])
+        self.assertEqual(self.sync.known, {"Cup_3", "Cup_4"})
+        # already in the expected state
+        self.assertTrue(self.sync.expect("Cup_4", known=True).done())
+
+    def test_wait(self):
+        t0 = time.time()
+        self.assertFalse(self.sync.wait("Cup_1", known=True, timeout=0.1))
+        self.assertGreaterEqual(time.time() - t0, 0.1)
+        # the timed out waiter is dropped on the next diff
+        self.assertTrue(self.sync.waiters[0][3].cancelled())
+        self.sync.scene_callback(diff(world=[("Cup_1", CollisionObject.ADD)]))
+        self.assertEqual(self.sync.waiters, [])
+        self.assertTrue(self.sync.wait("Cup_1", known=True, timeout=0.1))
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "SceneSync", SceneSyncNode)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+""" Unittest for the dual arm scheduler of arm_control_6_1 """
+import time
+import threading
+import unittest
+from tower.buildTower import TowerPlan, TowerStep
+from tower.scheduler import DualArmScheduler
+
+
+class FakeArms():
+    """ grab and place of both arms, each place takes duration seconds """
+    def __init__(self, duration=0.1):
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.places = {}    # step index --> (start, end)
+
+    def grab(self, step):
+        pass
+
+    def place(self, step):
+        start = time.time()
+        time.sleep(self.duration)
+        with self.lock:
+            self.places[step.index] = (start, time.time())
+
+
+def overlap(a, b):
+    return a[0] < b[1] and b[0] < a[1]
+
+
+class SchedulerNode(unittest.TestCase):
+
+    def test_dependencies(self):
+        # the right hand cup rests on the left hand cup, the other right hand cup does not
+        plan = TowerPlan([TowerStep(0, (0.8, 0.3, 0.0), "left_gripper", 0, ()),
+                          TowerStep(1, (0.8, -0.3, 0.0), "right_gripper", 0, ()),
+                          TowerStep(2, (0.8, 0.25, 0.1), "right_gripper", 1, (0,))])
+        arms = FakeArms()
+        scheduler = DualArmScheduler(plan, arms.grab, arms.place)
+        self.assertTrue(scheduler.run())
+        self.assertTrue(overlap(arms.places[0], arms.places[1]))
+        self.assertGreaterEqual(arms.places[2][0], arms.places[0][1])
+        waits = [index for index, hand, phase, start, end in scheduler.timings if phase == "wait"]
+        self.assertEqual(sorted(waits), [0, 1, 2])
+
+    def test_centerline(self):
+        # tower centered at y = 0.5: the cups next to it exclude each other, the others do not
+        plan = TowerPlan([TowerStep(0, (0.8, 0.52, 0.0), "left_gripper", 0, ()),
+                          TowerStep(1, (0.8, 0.48, 0.0), "right_gripper", 0, ()),
+                          TowerStep(2, (0.8, 0.95, 0.0), "left_gripper", 0, ()),
+                          TowerStep(3, (0.8, 0.05, 0.0), "right_gripper", 0, ())])
+        arms = FakeArms()
+        scheduler = DualArmScheduler(plan, arms.grab, arms.place, centerline=0.1, center_y=0.5)
+        self.assertTrue(scheduler.run())
+        self.assertTrue(scheduler.conflicts(plan[0]) and scheduler.conflicts(plan[1]))
+        self.assertFalse(scheduler.conflicts(plan[3]))
+        self.assertFalse(overlap(arms.places[0], arms.places[1]))
+        # whichever hand got the center first, the other one placed there during its free place
+        self.assertTrue(overlap(arms.places[1], arms.places[2]) or overlap(arms.places[0], arms.places[3]))
+
+    def test_failure(self):
+        plan = TowerPlan([TowerStep(0, (0.8, 0.3, 0.0), "left_gripper", 0, ()),
+                          TowerStep(1, (0.8, -0.3, 0.1), "right_gripper", 1, (0,))])
+        arms = FakeArms()
+
+        def place(step):
+            if step.hand == "left_gripper":
+                raise RuntimeError("place failed")
+            arms.place(step)
+
+        scheduler = DualArmScheduler(plan, arms.grab, place)
+        self.assertFalse(scheduler.run())
+        # the right hand stops waiting for the cup that was never placed
+        self.assertEqual(arms.places, {})
+        self.assertEqual([hand for hand, e in scheduler.errors], ["left_gripper"])
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "Scheduler", SchedulerNode)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+""" Unittest for the concurrent and lazy startup of the nodes """
+import time
+import unittest
+from tower.startup import Startup, start_gripper
+
+
+class FakeGripper():
+    def __init__(self, side, calibrated):
+        self.side = side
+        self.is_calibrated = calibrated
+        self.calibrations = 0
+
+    def calibrated(self):
+        return self.is_calibrated
+
+    def calibrate(self, timeout=1.0):
+        self.calibrations += 1
+        self.is_calibrated = True
+
+
+class StartupNode(unittest.TestCase):
+
+    def test_concurrent(self):
+        startup = Startup()
+        t0 = time.time()
+        for name in ("robot", "scene", "left_gripper", "right_gripper"):
+            startup.submit(name, time.sleep, 0.2)
+        built = []
+        group = startup.lazy("both_arms", lambda: built.append(1) or "group")
+        startup.wait()
+        self.assertLess(time.time() - t0, 0.6)
+        self.assertFalse(startup.ready.is_set())
+        # the move group is only built on first use, once
+        self.assertFalse(group.loaded())
+        self.assertIn("both_arms not loaded", startup.status_text())
+        self.assertEqual(group.upper(), "GROUP")
+        self.assertEqual(group.get(), "group")
+        self.assertEqual(built, [1])
+        startup.mark_ready()
+        self.assertTrue(startup.ready.is_set())
+        startup.shutdown()
+
+    def test_gripper(self):
+        grippers = {"left": FakeGripper("left", True), "right": FakeGripper("right", False)}
+        self.assertEqual(start_gripper("left", factory=grippers.get).calibrations, 0)
+        self.assertEqual(start_gripper("right", factory=grippers.get).calibrations, 1)
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "Startup", StartupNode)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+""" Unittest for the april tag tracker and stale cups in the registry """
+import os
+import unittest
+import yaml
+from tower.tag_tracker import TagTracker
+from tower.benchmark import make_scene
+
+
+class TagTrackerNode(unittest.TestCase):
+
+    def test_fusion(self):
+        tracker = TagTracker(process_noise=0.001, measurement_noise=0.01, clock=lambda: 10.0)
+        for k, x in enumerate([0.70, 0.72, 0.69, 0.71, 0.68, 0.70]):
+            tracker.update(3, (x, 0.1, -0.07), 9.0 + 0.1*k)
+        xyz, std, age = tracker.estimate(3)
+        self.assertAlmostEqual(xyz[0], 0.70, delta=0.01)
+        self.assertLess(std, 0.01)
+        self.assertAlmostEqual(age, 0.5)
+        # older detections are ignored
+        self.assertFalse(tracker.update(3, (0.0, 0.0, 0.0), 9.2))
+
+    def test_staleness(self):
+        tracker = TagTracker(process_noise=0.01, measurement_noise=0.005)
+        tracker.update(2, (0.7, 0.1, -0.07), 0.0)
+        self.assertIsNotNone(tracker.position(2, max_age=0.5, max_std=0.02, now=0.2))
+        self.assertIsNone(tracker.position(2, max_age=0.5, now=1.0))
+        self.assertIsNone(tracker.position(2, max_std=0.02, now=10.0))
+        self.assertIsNone(tracker.position(5))
+        self.assertEqual(tracker.stale([2, 5], max_age=0.5, now=0.2), [5])
+
+    def test_shipped_config(self):
+        # a tag stays readable for tag_max_age after its last detection, at full and background rate
+        with open(os.path.join(os.path.dirname(__file__), "..", "config", "scene_objects.yaml")) as f:
+            config = yaml.safe_load(f)
+        max_age, max_std = config["tag_max_age"], config["tag_max_std"]
+        for rate in (30.0, 1.0):
+            tracker = TagTracker()
+            for k in range(int(3*rate)):
+                tracker.update(2, (0.7, 0.1, -0.07), k/rate)
+            last = (int(3*rate) - 1)/rate
+            self.assertIsNotNone(tracker.position(2, max_age, max_std, now=last + max_age - 1e-3), rate)
+            self.assertIsNone(tracker.position(2, max_age, max_std, now=last + max_age + 1e-3))
+
+    def test_moved_cup_restarts_track(self):
+        tracker = TagTracker()
+        tracker.update(4, (0.7, 0.1, -0.07), 0.0)
+        tracker.update(4, (0.9, -0.3, -0.07), 0.1)
+        self.assertEqual(tracker.position(4, now=0.1), (0.9, -0.3, -0.07))
+        # a far off detection much less certain than the estimate is an outlier
+        self.assertFalse(tracker.update(4, (0.5, 0.0, -0.07), 0.2, noise=0.05))
+
+    def test_missing_cup_is_not_assigned(self):
+        scene, world = make_scene(2, 0)
+        world.move("Cup_1", (0.7, 0.1, -0.07))
+        world.move("Cup_2", (0.8, 0.2, -0.07))
+        scene.update_world()
+        self.assertEqual(scene.assign_cup_st1("left_gripper"), "Cup_1")
+        del world.positions["Cup_1"]
+        scene.update_world()
+        self.assertEqual(scene.assign_cup_st1("left_gripper"), "Cup_2")
+        self.assertEqual(scene.get_cup_position("Cup_1").x, 0.7)
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "TagTracker", TagTrackerNode)
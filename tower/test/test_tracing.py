@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+""" Unittest for the latency spans and the Chrome trace export of Tracer """
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from tower.tracing import Tracer, percentile
+
+
+class TracingNode(unittest.TestCase):
+
+    def test_percentile(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        values = [5, 1, 4, 2, 3]
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile(values, 50), 3)
+        self.assertEqual(percentile(values, 100), 5)
+        # interpolated between the 9th and 10th of 1 ... 10
+        self.assertAlmostEqual(percentile(list(range(1, 11)), 95), 9.55)
+        self.assertAlmostEqual(percentile([1, 2], 50), 1.5)
+
+    def test_summary(self):
+        tracer = Tracer()
+        for i in range(1, 11):
+            tracer.record("plan", 100.0, 100.0 + i/10.0)
+        tracer.record("scene", 100.0, 100.5)
+        stats = tracer.summary()
+        count, p50, p95, total = stats["plan"]
+        self.assertEqual(count, 10)
+        self.assertAlmostEqual(p50, 0.55)
+        self.assertAlmostEqual(p95, 0.955)
+        self.assertAlmostEqual(total, 5.5)
+        self.assertEqual(stats["scene"], (1, 0.5, 0.5, 0.5))
+        # slowest total first
+        self.assertTrue(tracer.summary_text().startswith("plan: n=10 p50=550.0 ms p95=955.0 ms"))
+
+    def test_chrome_trace(self):
+        tracer = Tracer()
+        with tracer.tags(cup="Cup_3", step=2):
+            tracer.record("plan", 10.0, 10.25, "cartesian", hand="left_gripper")
+        worker = threading.Thread(target=tracer.record, args=("wait", 11.0, 11.5), name="gripper")
+        worker.start()
+        worker.join()
+        trace = tracer.chrome_trace()
+        self.assertEqual(trace["displayTimeUnit"], "ms")
+        meta = [e for e in trace["traceEvents"] if e["ph"] == "M"]
+        spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertIn("gripper", [e["args"]["name"] for e in meta])
+        plan, wait = spans
+        self.assertEqual((plan["name"], plan["cat"], plan["pid"]), ("cartesian", "plan", os.getpid()))
+        self.assertAlmostEqual(plan["ts"], 10.0e6)
+        self.assertAlmostEqual(plan["dur"], 0.25e6)
+        self.assertEqual(plan["args"], {"cup": "Cup_3", "step": "2", "hand": "left_gripper"})
+        # spans of another thread are on their own track, without the tags of this one
+        self.assertEqual((wait["name"], wait["args"]), ("wait", {}))
+        self.assertNotEqual(plan["tid"], wait["tid"])
+        self.assertEqual({e["tid"] for e in meta}, {plan["tid"], wait["tid"]})
+
+        path = tempfile.mkdtemp()
+        try:
+            with open(tracer.dump(os.path.join(path, "trace", "build.json"))) as f:
+                self.assertEqual(json.load(f), trace)
+        finally:
+            shutil.rmtree(path)
+
+    def test_disabled(self):
+        tracer = Tracer(enabled=False)
+        with tracer.span("plan"):
+            pass
+        tracer.record("scene", 0.0, 1.0)
+        self.assertEqual(tracer.summary(), {})
+        self.assertEqual(tracer.chrome_trace()["traceEvents"], [])
+
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("tower", "Tracing", TracingNode)
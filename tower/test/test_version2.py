@@ -28,6 +28,46 @@ class HardCaseNode(unittest.TestCase):
         if hand[1]!="right_gripper" : test = False
         # (1.0, 0.05, -0.04), (1.0, -0.05, -0.04), (0, 0, 0), (1.0, 0.0, 0.04)], ['left_gripper', '
         self.assertEquals(test , True)
+
+    def test_pyramid_plan(self):
+        building_tower = BuildTower()
+        plan = building_tower.pyramid(4)
+        self.assertEqual(len(plan), 10)
+        self.assertEqual(building_tower.pyramid_rows(10), 4)
+        self.assertEqual(building_tower.pyramid_rows(7), None)
+
+        placed = set()
+        for step in plan:
+            # every cup is placed after the cups it rests on
+            self.assertTrue(all(dep in placed for dep in step.depends))
+            self.assertEqual(len(step.depends), 0 if step.level == 0 else 2)
+            placed.add(step.index)
+
+        # both hands share the work
+        self.assertEqual(len(plan.hand_steps("left_gripper")), 5)
+        self.assertEqual(len(plan.hand_steps("right_gripper")), 5)
+
+    def test_pairing(self):
+        building_tower = BuildTower()
+        for cups in (6, 10):
+            plan = building_tower.pyramid(building_tower.pyramid_rows(cups))
+            # walk the steps the way arm_control state_2 does
+            i, placed, pairs = 0, set(), []
+            while i < len(plan):
+                if plan.pairable(i):
+                    pairs.append((i, i + 1))
+                    batch = [i, i + 1]
+                else:
+                    batch = [i]
+                # a cup is only placed once the cups it rests on are already there
+                for j in batch:
+                    self.assertTrue(set(plan[j].depends) <= placed, (cups, j))
+                placed.update(batch)
+                i += len(batch)
+            self.assertEqual(len(placed), cups)
+            self.assertTrue(pairs)
+            # the top cup goes alone
+            self.assertNotIn(cups - 1, [b for a, b in pairs])
  
     
 